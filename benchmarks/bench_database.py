@@ -0,0 +1,150 @@
+"""
+数据库读取路径基准 - 对比 aiosqlite.Row + dict(row) + json.loads 与紧凑记录 + 过滤器缓存
+
+用法: python -m benchmarks.bench_database [--groups 200] [--channels 5] [--accounts 50] [--rounds 200]
+"""
+
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import aiosqlite
+
+from config.database import Database
+
+
+async def _legacy_get_forwarding_groups(connection):
+    """旧实现: 每次调用都 dict(row) 并重新解析 filters"""
+    cursor = await connection.execute('SELECT * FROM forwarding_groups ORDER BY id')
+    rows = await cursor.fetchall()
+    groups = []
+    for row in rows:
+        group = dict(row)
+        if group['filters']:
+            try:
+                group['filters'] = json.loads(group['filters'])
+            except:
+                group['filters'] = {}
+        else:
+            group['filters'] = {}
+        groups.append(group)
+    return groups
+
+
+async def _legacy_get_group_channels(connection, group_id):
+    cursor = await connection.execute(
+        'SELECT * FROM source_channels WHERE group_id = ? AND status = "active"',
+        (group_id,)
+    )
+    source_channels = [dict(row) for row in await cursor.fetchall()]
+    cursor = await connection.execute(
+        'SELECT * FROM target_channels WHERE group_id = ? AND status = "active"',
+        (group_id,)
+    )
+    target_channels = [dict(row) for row in await cursor.fetchall()]
+    return source_channels, target_channels
+
+
+async def _legacy_get_listener_accounts(connection, status='active'):
+    cursor = await connection.execute(
+        'SELECT * FROM listener_accounts WHERE status = ? ORDER BY id',
+        (status,)
+    )
+    return [dict(row) for row in await cursor.fetchall()]
+
+
+async def _populate(database: Database, groups: int, channels: int, accounts: int):
+    filters = {
+        'remove_links': True,
+        'remove_emojis': True,
+        'ad_detection': True,
+        'custom_rules': {'keywords': [f'kw{i}' for i in range(20)], 'remove_lines': ['关注', '订阅']}
+    }
+    for g in range(groups):
+        group_id = await database.create_forwarding_group(f'group{g}', 'benchmark')
+        await database.update_group_filters(group_id, filters)
+        for c in range(channels):
+            await database.add_source_channel(group_id, -100000000 - g * 100 - c, f'src{g}_{c}', f'Source {c}')
+        await database.add_target_channel(group_id, -200000000 - g, f'dst{g}', 'Target')
+        await database.update_statistics(group_id, 'system', True)
+    for a in range(accounts):
+        await database.add_listener_account(f'+1000000{a:04d}', a, f'user{a}')
+
+
+async def _timeit(func, rounds: int) -> float:
+    await func()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        await func()
+    return (time.perf_counter() - start) / rounds * 1000
+
+
+async def run(groups: int, channels: int, accounts: int, rounds: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / 'bench.db'
+        database = Database(str(db_path))
+        await database.init()
+        await _populate(database, groups, channels, accounts)
+
+        legacy = await aiosqlite.connect(db_path)
+        legacy.row_factory = aiosqlite.Row
+
+        group_ids = [group['id'] for group in await database.get_forwarding_groups()]
+
+        async def legacy_channels():
+            for group_id in group_ids:
+                await _legacy_get_group_channels(legacy, group_id)
+
+        async def new_channels():
+            for group_id in group_ids:
+                await database.get_group_channels(group_id)
+
+        async def per_group_load():
+            for group in await database.get_forwarding_groups():
+                await database.get_group_channels(group['id'])
+
+        async def per_group_stats():
+            for group_id in group_ids:
+                await database.get_group_statistics(group_id, 1)
+
+        async def grouped_stats():
+            await database.get_daily_group_statistics(datetime.now().date())
+
+        cases = [
+            ('get_forwarding_groups',
+             lambda: _legacy_get_forwarding_groups(legacy),
+             database.get_forwarding_groups),
+            (f'get_group_channels x{len(group_ids)}', legacy_channels, new_channels),
+            ('load groups + channels', per_group_load, database.get_groups_with_channels),
+            ('today stats (all groups)', per_group_stats, grouped_stats),
+            ('get_listener_accounts',
+             lambda: _legacy_get_listener_accounts(legacy),
+             database.get_listener_accounts),
+        ]
+
+        print(f"{'case':<28}{'old (ms)':>12}{'new (ms)':>12}{'speedup':>10}")
+        for name, old_func, new_func in cases:
+            old_ms = await _timeit(old_func, rounds)
+            new_ms = await _timeit(new_func, rounds)
+            print(f"{name:<28}{old_ms:>12.3f}{new_ms:>12.3f}{old_ms / new_ms:>9.2f}x")
+
+        await legacy.close()
+        await database.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='数据库读取路径基准')
+    parser.add_argument('--groups', type=int, default=200)
+    parser.add_argument('--channels', type=int, default=5)
+    parser.add_argument('--accounts', type=int, default=50)
+    parser.add_argument('--rounds', type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args.groups, args.channels, args.accounts, args.rounds))
+
+
+if __name__ == '__main__':
+    main()
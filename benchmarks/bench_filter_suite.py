@@ -0,0 +1,255 @@
+"""
+文本过滤基准套件 - 在合成语料上测量各过滤组合与自定义规则数量下的吞吐和延迟，结果输出为JSON
+
+语料为中英文混合消息（链接、表情、联系方式、广告短语），UTF-8 长度在 50B~4KB 之间；
+每个场景同时与 bench_filters 的逐步参考实现逐条比对，任何不一致都会记录并以非零状态退出；
+另外校验配置相同的不同组共享过滤判定缓存（同一文本经过多个组只过滤一次）。
+
+用法: python -m benchmarks.bench_filter_suite [--messages 2000] [--rule-counts 0,10,100,1000]
+                                             [--output results.json] [--baseline old.json]
+"""
+
+import argparse
+import itertools
+import json
+import platform
+import random
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from benchmarks.bench_filters import FILTER_KEYS, reference_filter_text
+from utils.filter_plan import DecisionCache
+from utils.filters import MessageFilter
+
+
+MIN_BYTES = 50
+MAX_BYTES = 4096
+
+_FRAGMENTS = [
+    '今天的行情分析如下，请大家注意风险。', '新版本已经发布，修复了若干问题。', '会议改到明天下午三点，',
+    '原文转载自合作频道，', '以下是本周精选内容：', '欢迎大家在评论区讨论。',
+    'The quick brown fox jumps over the lazy dog. ', 'Release notes for v2.3 are below. ',
+    'BREAKING NEWS ', 'Please read the pinned message first. ',
+    'https://example.com/article?id=42&ref=tg ', 'http://news.example.org/路径/页面 ', 't.me/somechannel ',
+    'https://t.me/joinchat/AbCdEf ', 'telegram.me/another ', '@channel_name ', '@user123 ',
+    '😀', '🎉🎉', '🔥', '✨', '❤️', '👉 ', '#话题 ', '#tag ', '❶❷❸ ',
+    '加微信 abc123456 ', '联系客服 ', 'QQ：12345678 ', '电话 13812345678 ', '免费咨询 ', '限时特价 ',
+    '点击购买 ', '优惠 ', '代理 ', '!!!', '？？', '\n', '\n\n', '\n\n\n  ', '  ', '\t',
+]
+
+
+def build_corpus(count: int, seed: int) -> List[str]:
+    """生成合成语料，UTF-8 长度在 [MIN_BYTES, MAX_BYTES] 内按对数均匀分布"""
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(count):
+        target = int(MIN_BYTES * (MAX_BYTES / MIN_BYTES) ** rng.random())
+        pieces = []
+        size = 0
+        while size < target:
+            piece = rng.choice(_FRAGMENTS)
+            pieces.append(piece)
+            size += len(piece.encode('utf-8'))
+        text = ''.join(pieces).encode('utf-8')[:MAX_BYTES].decode('utf-8', 'ignore')
+        corpus.append(text)
+    return corpus
+
+
+def build_rules(count: int, seed: int) -> List[Dict]:
+    """生成自定义规则（正则/关键词/删除行混合，正则均可通过安全检查）"""
+    rng = random.Random(seed)
+    regexes = [r'\d{5,}', r'https?://\S+', r'[A-Z]{4,}', r'#\w+', r'QQ[:：]?\s*\d+', r'[!！]{2,}']
+    words = ['优惠', '代理', '转载', '精选', 'fox', 'Release', '客服', '风险', '会议']
+    rules = []
+    for i in range(count):
+        kind = rng.random()
+        if kind < 0.3:
+            rules.append({'type': 'regex', 'pattern': rng.choice(regexes) + f'(?#{i})', 'replacement': ''})
+        elif kind < 0.8:
+            rules.append({'type': 'keyword', 'pattern': f'{rng.choice(words)}{i}' if rng.random() < 0.7
+                          else rng.choice(words), 'replacement': '*'})
+        else:
+            rules.append({'type': 'remove_line', 'pattern': f'{rng.choice(words)}{i}'})
+    return rules
+
+
+def build_scenarios(rule_counts: List[int], seed: int) -> List[Dict]:
+    """全部过滤开关组合（不含自定义规则）+ 各自定义规则数量（链接/表情/特殊符号开启）"""
+    scenarios = []
+    for values in itertools.product((False, True), repeat=len(FILTER_KEYS)):
+        filters = dict(zip(FILTER_KEYS, values))
+        enabled = [key for key, value in filters.items() if value]
+        scenarios.append({'name': '+'.join(enabled) or 'none', 'filters': filters, 'rules': 0})
+
+    base = {'remove_links': True, 'remove_emojis': True, 'remove_special_chars': True}
+    for count in rule_counts:
+        filters = dict(base, custom_rules=build_rules(count, seed + count))
+        scenarios.append({'name': f'custom_rules_{count}', 'filters': filters, 'rules': count})
+    return scenarios
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_scenario(message_filter: MessageFilter, corpus: List[str], scenario: Dict,
+                 verify: bool = True) -> Dict:
+    """测量一个场景，返回吞吐/延迟统计和不一致数量"""
+    filters = scenario['filters']
+    plan = message_filter.compile_filters(filters)
+
+    # 预热
+    for text in corpus[:50]:
+        message_filter.filter_text(text, plan)
+
+    latencies = []
+    outputs = []
+    perf_counter = time.perf_counter
+    started = perf_counter()
+    for text in corpus:
+        start = perf_counter()
+        outputs.append(message_filter.filter_text(text, plan))
+        latencies.append(perf_counter() - start)
+    total = perf_counter() - started
+
+    mismatches = 0
+    examples = []
+    if verify:
+        batch_outputs = message_filter.filter_batch(corpus, plan)
+        for text, actual, batch_actual in zip(corpus, outputs, batch_outputs):
+            expected = reference_filter_text(message_filter, text, filters)
+            if actual != expected or batch_actual != expected:
+                mismatches += 1
+                if len(examples) < 3:
+                    examples.append({'text': text[:200], 'expected': expected[:200], 'actual': actual[:200]})
+
+    latencies.sort()
+    total_bytes = sum(len(text.encode('utf-8')) for text in corpus)
+    return {
+        'name': scenario['name'],
+        'rules': scenario['rules'],
+        'messages': len(corpus),
+        'msgs_per_sec': round(len(corpus) / total, 1) if total else 0.0,
+        'mb_per_sec': round(total_bytes / total / 1e6, 3) if total else 0.0,
+        'mean_us': round(total / len(corpus) * 1e6, 2) if corpus else 0.0,
+        'p50_us': round(_percentile(latencies, 0.50) * 1e6, 2),
+        'p99_us': round(_percentile(latencies, 0.99) * 1e6, 2),
+        'max_us': round(latencies[-1] * 1e6, 2) if latencies else 0.0,
+        'mismatches': mismatches,
+        'mismatch_examples': examples
+    }
+
+
+def check_cross_group_cache(corpus: List[str]) -> Dict:
+    """配置相同的两个组应共享判定缓存，配置不同的组不共享，返回命中统计和失败数"""
+    message_filter = MessageFilter(None)
+    texts = list(dict.fromkeys(text for text in corpus if text))[:500]
+    message_filter.decision_cache = DecisionCache(len(texts) * 4)
+    filters = {'remove_links': True, 'remove_emojis': True, 'ad_detection': True}
+
+    first = message_filter.get_plan(1, 'v1', filters)
+    same = message_filter.get_plan(2, 'v1', dict(filters))
+    other = message_filter.get_plan(3, 'v1', dict(filters, remove_links=False))
+
+    cache = message_filter.decision_cache
+    for text in texts:
+        message_filter.filter_text(text, first)
+    hits_before = cache.hits
+    for text in texts:
+        message_filter.filter_text(text, same)
+    same_hits = cache.hits - hits_before
+    hits_before = cache.hits
+    for text in texts:
+        message_filter.filter_text(text, other)
+    other_hits = cache.hits - hits_before
+
+    failures = (same_hits != len(texts)) + (other_hits != 0)
+    print(f"cross-group cache: {len(texts)} texts, same filters {same_hits} hits, "
+          f"different filters {other_hits} hits, {failures} failures")
+    return {'texts': len(texts), 'same_filters_hits': same_hits, 'other_filters_hits': other_hits,
+            'failures': failures}
+
+
+def compare(results: Dict, baseline: Dict):
+    """与之前的结果文件对比吞吐和 p99"""
+    previous = {item['name']: item for item in baseline.get('scenarios', [])}
+    print(f"\n{'scenario':<76}{'msgs/s':>12}{'vs base':>10}{'p99 vs base':>13}")
+    for item in results['scenarios']:
+        old = previous.get(item['name'])
+        if not old:
+            continue
+        speed = item['msgs_per_sec'] / old['msgs_per_sec'] if old['msgs_per_sec'] else 0.0
+        p99 = item['p99_us'] / old['p99_us'] if old['p99_us'] else 0.0
+        print(f"{item['name']:<76}{item['msgs_per_sec']:>12.0f}{speed:>9.2f}x{p99:>12.2f}x")
+
+
+def run_suite(messages: int, rule_counts: List[int], seed: int, verify: bool = True) -> Dict:
+    message_filter = MessageFilter(None)
+    corpus = build_corpus(messages, seed)
+    scenarios = build_scenarios(rule_counts, seed)
+
+    results = []
+    print(f"{'scenario':<76}{'msgs/s':>12}{'p50 (us)':>11}{'p99 (us)':>11}{'diff':>6}")
+    for scenario in scenarios:
+        result = run_scenario(message_filter, corpus, scenario, verify)
+        results.append(result)
+        print(f"{result['name']:<76}{result['msgs_per_sec']:>12.0f}{result['p50_us']:>11.1f}"
+              f"{result['p99_us']:>11.1f}{result['mismatches']:>6}")
+    message_filter.shutdown()
+
+    cross_group = check_cross_group_cache(corpus)
+
+    return {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'messages': messages,
+            'seed': seed,
+            'min_bytes': MIN_BYTES,
+            'max_bytes': MAX_BYTES,
+            'corpus_bytes': sum(len(text.encode('utf-8')) for text in corpus),
+            'verified': verify
+        },
+        'scenarios': results,
+        'cross_group_cache': cross_group,
+        'mismatches': sum(item['mismatches'] for item in results) + cross_group['failures']
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='文本过滤基准套件')
+    parser.add_argument('--messages', type=int, default=2000, help='语料消息数')
+    parser.add_argument('--rule-counts', default='0,10,100,1000', help='自定义规则数量，逗号分隔')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='结果JSON文件（默认输出到标准输出）')
+    parser.add_argument('--baseline', help='之前的结果JSON文件，用于对比')
+    parser.add_argument('--no-verify', action='store_true', help='跳过与参考实现的一致性校验')
+    args = parser.parse_args(argv)
+
+    rule_counts = [int(value) for value in args.rule_counts.split(',') if value.strip()]
+    results = run_suite(args.messages, rule_counts, args.seed, verify=not args.no_verify)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            compare(results, json.load(f))
+
+    payload = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(payload)
+        print(f"\nresults written to {args.output}")
+    else:
+        print(payload)
+
+    print(f"mismatches: {results['mismatches']}")
+    sys.exit(1 if results['mismatches'] else 0)
+
+
+if __name__ == '__main__':
+    main()
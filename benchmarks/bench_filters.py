@@ -0,0 +1,229 @@
+"""
+文本过滤基准 - 对比逐步执行的参考实现与 MessageFilter.filter_text，并校验输出完全一致
+
+参考实现即优化前的处理流程（链接三次替换、逐字符查表删除表情/特殊符号、re.sub 自定义规则、逐行清理空白），
+作为黄金结果；任何不一致都会打印出来并以非零状态退出。
+
+用法: python -m benchmarks.bench_filters [--cases 20000] [--rounds 2000] [--seed 1]
+"""
+
+import argparse
+import random
+import re
+import sys
+import time
+from typing import Dict, List
+
+from utils.char_table import strip_emojis_scan, strip_special_chars_scan
+from utils.filters import MessageFilter
+
+
+FILTER_KEYS = ['ad_detection', 'smart_filter', 'remove_links', 'remove_emojis', 'remove_special_chars']
+
+# 固定样例：覆盖链接互相嵌套、提及与链接相邻、空白行折叠等边界情况
+GOLDEN_TEXTS = [
+    '',
+    '   \n\n  ',
+    '普通消息，没有任何需要过滤的内容',
+    '详情见 https://example.com/a?b=1&c=2 ，关注 @channel 获取更多',
+    't.me/http://x t.me/abc T.ME/Abc telegram.me/x www.t.me/y',
+    '@abhttp://x中文 @ab t.me/x @abt.me/x',
+    'HTTPS://Example.COM/路径 http://a.b/c{d}',
+    '第一行  \n\n\n\n  第二行\r\n\t第三行\x0b\n　\n',
+    '😀😃 表情 🎉 #话题 #tag ✨❤️ ❶❷',
+    '键帽 1\ufe0f\u20e3 #\ufe0f\u20e3 *\ufe0f\u20e3 👨\u200d👩\u200d👧',
+    '加微信 abc123456 免费领取 13812345678 QQ：12345678',
+    '!!!!!!????? 重复重复重复重复重复重复重复',
+    'AAAAAAAAAAAA BBBBBBBBBB 全大写',
+]
+
+FILTER_SETS: List[Dict] = [
+    {},
+    {'remove_links': True},
+    {'remove_links': True, 'remove_emojis': True, 'remove_special_chars': True},
+    {'remove_emojis': True},
+    {'remove_special_chars': True},
+    {'ad_detection': True, 'smart_filter': True},
+    {'remove_links': True, 'custom_rules': [
+        {'type': 'regex', 'pattern': r'\d{5,}', 'replacement': '***'},
+        {'type': 'keyword', 'pattern': '关注', 'replacement': ''},
+        {'type': 'remove_line', 'pattern': '第二行'},
+    ]},
+]
+
+# 优化前的 Telegram 链接正则
+REFERENCE_TELEGRAM_LINK_PATTERN = re.compile(
+    r'(?:https?://)?(?:www\.)?(?:t\.me|telegram\.me)/\S+',
+    re.IGNORECASE
+)
+
+
+def reference_is_advertisement(message_filter: MessageFilter, text: str) -> bool:
+    """优化前的广告判断（逐个关键词检查）"""
+    text_lower = text.lower()
+    ad_count = sum(1 for keyword in message_filter.ad_keywords if keyword in text_lower)
+    if ad_count >= 2:
+        return True
+
+    contact_patterns = [message_filter.phone_pattern, message_filter.qq_pattern, message_filter.wechat_pattern]
+    contact_count = sum(1 for pattern in contact_patterns if pattern.search(text))
+    if contact_count > 0 and ad_count > 0:
+        return True
+
+    phrase_count = sum(1 for phrase in message_filter.ad_phrases if phrase in text)
+    return phrase_count >= 2
+
+
+def reference_is_spam_content(text: str) -> bool:
+    """优化前的垃圾内容判断"""
+    try:
+        if len(set(text)) / len(text) < 0.3 and len(text) > 10:
+            return True
+        if text.count('!') + text.count('！') + text.count('?') + text.count('？') > len(text) * 0.2:
+            return True
+        english_chars = re.findall(r'[a-zA-Z]', text)
+        if len(english_chars) > 10:
+            upper_ratio = sum(1 for c in english_chars if c.isupper()) / len(english_chars)
+            if upper_ratio > 0.8:
+                return True
+        return False
+    except Exception:
+        return False
+
+
+def reference_filter_text(message_filter: MessageFilter, text: str, filters: Dict) -> str:
+    """优化前的逐步处理流程"""
+    if not text:
+        return ""
+
+    try:
+        if filters.get('ad_detection', False) and reference_is_advertisement(message_filter, text):
+            return ""
+        if filters.get('smart_filter', False) and reference_is_spam_content(text):
+            return ""
+
+        if filters.get('remove_links', False):
+            text = message_filter.url_pattern.sub('', text)
+            text = REFERENCE_TELEGRAM_LINK_PATTERN.sub('', text)
+            text = message_filter.mention_pattern.sub('', text)
+        if filters.get('remove_emojis', False):
+            text = strip_emojis_scan(text)
+        if filters.get('remove_special_chars', False):
+            text = strip_special_chars_scan(text)
+
+        custom_rules = filters.get('custom_rules', [])
+        if custom_rules:
+            try:
+                for rule in custom_rules:
+                    rule_type = rule.get('type')
+                    pattern = rule.get('pattern')
+                    replacement = rule.get('replacement', '')
+                    if not pattern:
+                        continue
+                    if rule_type == 'regex':
+                        text = re.sub(pattern, replacement, text)
+                    elif rule_type == 'keyword':
+                        text = text.replace(pattern, replacement)
+                    elif rule_type == 'remove_line':
+                        text = '\n'.join(line for line in text.split('\n') if pattern not in line)
+            except Exception:
+                pass
+
+        cleaned_lines = []
+        for line in text.split('\n'):
+            line = line.strip()
+            if line or (cleaned_lines and cleaned_lines[-1]):
+                cleaned_lines.append(line)
+        while cleaned_lines and not cleaned_lines[-1]:
+            cleaned_lines.pop()
+        return '\n'.join(cleaned_lines).strip()
+
+    except Exception:
+        return text
+
+
+def _random_text(rng: random.Random) -> str:
+    pieces = [
+        'a', 'B', 'ABCDEFGHIJKL', 'ÄÖ', 'ǅ', ' ', '  ', '\n', '\n\n', '\t', '\r\n', '　', '中文', '广告', '加微信',
+        '免费咨询', '联系客服', 'VX', 'aaaaaaaa', '!!!!',
+        '\u200d', '\ufe0f', '\u20e3', '\U0001F3FD', '\u0301', '\U0001F1E8', '©', '\U000E0067', 'न\u093f',
+        'http://', 'https://', 'x.com/', 't.me/', 'T.ME/', '.me/', 'www.', 'telegram.me/',
+        '@', '@u', '_', '#', '!', '？', '😀', '🎉', '❶', '✨', '{', '%2F', '13812345678', 'QQ:123456',
+    ]
+    return ''.join(rng.choice(pieces) for _ in range(rng.randint(0, 30)))
+
+
+def _random_filters(rng: random.Random) -> Dict:
+    filters = {key: rng.random() < 0.5 for key in FILTER_KEYS}
+    if rng.random() < 0.5:
+        filters['custom_rules'] = [
+            {
+                'type': rng.choice(['regex', 'keyword', 'remove_line']),
+                'pattern': rng.choice(['a', '中文', r'\d+', 'B', '\n', '[ab]+', '#']),
+                'replacement': rng.choice(['', 'Z', '\\g<0>']),
+            }
+            for _ in range(rng.randint(1, 5))
+        ]
+    return filters
+
+
+def check(message_filter: MessageFilter, cases: int, seed: int) -> int:
+    """校验输出与参考实现一致，返回不一致数量"""
+    rng = random.Random(seed)
+    samples = [(text, filters) for text in GOLDEN_TEXTS for filters in FILTER_SETS]
+    samples += [(_random_text(rng), _random_filters(rng)) for _ in range(cases)]
+
+    mismatches = 0
+    for text, filters in samples:
+        expected = reference_filter_text(message_filter, text, filters)
+        plan = message_filter.compile_filters(filters)
+        for actual in (message_filter.filter_text(text, filters), message_filter.filter_text(text, plan)):
+            if actual != expected:
+                mismatches += 1
+                if mismatches <= 10:
+                    print(f"❌ 不一致: text={text!r} filters={filters!r}\n   expected={expected!r}\n   actual={actual!r}")
+                break
+
+    print(f"golden check: {len(samples)} cases, {mismatches} mismatches")
+    return mismatches
+
+
+def bench(message_filter: MessageFilter, rounds: int):
+    texts = {
+        'plain': '这是一条测试消息 hello world 没有链接的普通消息，内容较长一些。\n第二行 #tag\n' * 5,
+        'links': ('这是一条测试消息 hello world 😀 详情 https://example.com/a?b=1 关注 @channel t.me/xyz'
+                  '  \n\n\n  第二行 #tag ✨\n') * 5,
+    }
+    filters = {'remove_links': True, 'remove_emojis': True, 'remove_special_chars': True}
+    plan = message_filter.compile_filters(filters)
+
+    print(f"{'case':<12}{'old (us)':>12}{'new (us)':>12}{'speedup':>10}")
+    for name, text in texts.items():
+        start = time.perf_counter()
+        for _ in range(rounds):
+            reference_filter_text(message_filter, text, filters)
+        old_us = (time.perf_counter() - start) / rounds * 1e6
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            message_filter.filter_text(text, plan)
+        new_us = (time.perf_counter() - start) / rounds * 1e6
+
+        print(f"{name:<12}{old_us:>12.2f}{new_us:>12.2f}{old_us / new_us:>9.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='文本过滤基准')
+    parser.add_argument('--cases', type=int, default=20000, help='随机校验样例数')
+    parser.add_argument('--rounds', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    message_filter = MessageFilter(None)
+    mismatches = check(message_filter, args.cases, args.seed)
+    bench(message_filter, args.rounds)
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+表情/特殊符号删除基准 - 对比原字符类正则与字符分类表实现
+
+1. 一致性: 正则实现（strip_emojis / strip_special_chars）与逐字符查表实现结果完全一致，固定样例（如键帽）结果符合预期
+2. 行为差异: 统计与原正则结果不同的样例（表情的 ZWJ 序列、变体选择符等，属于预期的修正；特殊符号应为 0）
+3. 性能: 原正则、新实现、逐字符查表在合成语料 / 纯ASCII / 含组合序列文本上的耗时（取多次重复的最小值）
+
+用法: python -m benchmarks.bench_normalizer [--cases 20000] [--messages 2000] [--rounds 20] [--seed 1]
+"""
+
+import argparse
+import random
+import re
+import sys
+import time
+from typing import Callable, Dict, List
+
+from benchmarks.bench_filter_suite import build_corpus
+from utils.char_table import strip_emojis, strip_emojis_scan, strip_special_chars, strip_special_chars_scan
+
+
+# 原实现的字符类正则
+OLD_EMOJI_PATTERN = re.compile(
+    r'[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F1E0-\U0001F1FF\U00002600-\U000027BF\U0001f900-\U0001f9ff\U0001f600-\U0001f64f\U0001f680-\U0001f6ff\u2600-\u27bf]',
+    re.UNICODE
+)
+OLD_SPECIAL_CHARS_PATTERN = re.compile(r'[^\w\s\u4e00-\u9fff#]', re.UNICODE)
+
+_PIECES = [
+    'a', 'Z', '1', '#', '_', ' ', '\n', '中', '文', '，', '!', '©', '™', '↔', '☺', '❤', '♀', '⭐',
+    '😀', '👍', '👨', '👩', '🏴', '🇨', '🇳', '\u200d', '\u200c', '\ufe0f', '\ufe0e', '\u20e3',
+    '\U0001F3FB', '\U0001F3FD', '\U000E0067', '\U000E007F', '\u0301', 'न', '\u093f', '\u094d', '\U000E0100',
+]
+
+_GRAPHEME_TEXT = ('👨\u200d👩\u200d👧 家庭合照 👍\U0001F3FD 点赞 🇨🇳🇺🇸 国旗 1\ufe0f\u20e3 2\ufe0f\u20e3 #\ufe0f\u20e3 编号 ©\ufe0f ™ café नमस\u094dत\u0947 '
+                  '🏴\U000E0067\U000E0062\U000E0073\U000E0063\U000E0074\U000E007F ❤\ufe0f\u200d🔥 🧑\U0001F3FB\u200d💻 普通文字 #话题 ') * 10
+
+
+# 固定样例: (函数, 输入, 期望输出)
+GOLDEN_CASES = [
+    (strip_special_chars, '1\ufe0f\u20e3 2\ufe0f\u20e3 #\ufe0f\u20e3 编号', '1 2 # 编号'),
+    (strip_special_chars, 'cafe\u0301 नमस\u094dते', 'cafe नमसत'),
+    (strip_emojis, '1\ufe0f\u20e3 #\ufe0f\u20e3 *\ufe0f\u20e3 编号', '1 # * 编号'),
+    (strip_emojis, '👨\u200d👩\u200d👧 👍\U0001F3FD ©\ufe0f ™', '   ™'),
+]
+
+
+def _random_text(rng: random.Random) -> str:
+    return ''.join(rng.choice(_PIECES) for _ in range(rng.randint(0, 24)))
+
+
+def check(cases: int, corpus: List[str], seed: int) -> int:
+    """正则实现与逐字符查表实现一致性，返回不一致数量"""
+    rng = random.Random(seed)
+    samples = [_random_text(rng) for _ in range(cases)] + corpus + [_GRAPHEME_TEXT]
+    mismatches = 0
+    for text in samples:
+        for fast, scan in ((strip_emojis, strip_emojis_scan), (strip_special_chars, strip_special_chars_scan)):
+            if fast(text) != scan(text):
+                mismatches += 1
+                if mismatches <= 10:
+                    print(f"❌ 不一致 {fast.__name__}: {text!r}\n   regex={fast(text)!r}\n   scan={scan(text)!r}")
+    for func, text, expected in GOLDEN_CASES:
+        if func(text) != expected:
+            mismatches += 1
+            print(f"❌ 固定样例不符 {func.__name__}: {text!r}\n   expected={expected!r}\n   actual={func(text)!r}")
+    print(f"consistency: {len(samples)} texts + {len(GOLDEN_CASES)} golden cases, {mismatches} mismatches")
+    return mismatches
+
+
+def behaviour_changes(corpus: List[str]):
+    """与原正则结果不同的样例数（预期的修正）"""
+    texts = corpus + [_GRAPHEME_TEXT]
+    emoji_changed = [text for text in texts if OLD_EMOJI_PATTERN.sub('', text) != strip_emojis(text)]
+    special_changed = [text for text in texts if OLD_SPECIAL_CHARS_PATTERN.sub('', text) != strip_special_chars(text)]
+    print(f"changed vs old regex: emojis {len(emoji_changed)}/{len(texts)}, special {len(special_changed)}/{len(texts)}")
+    sample = _GRAPHEME_TEXT[:60]
+    print(f"  sample        {sample!r}")
+    print(f"  old emojis    {OLD_EMOJI_PATTERN.sub('', sample)!r}")
+    print(f"  new emojis    {strip_emojis(sample)!r}")
+    print(f"  old special   {OLD_SPECIAL_CHARS_PATTERN.sub('', sample)!r}")
+    print(f"  new special   {strip_special_chars(sample)!r}")
+
+
+def _time(func: Callable[[str], str], texts: List[str], rounds: int, repeat: int = 5) -> float:
+    """每条耗时（微秒），取 repeat 次测量的最小值以减少噪声"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for text in texts:
+                func(text)
+        best = min(best, time.perf_counter() - start)
+    return best / (rounds * len(texts)) * 1e6
+
+
+def bench(corpus: List[str], rounds: int):
+    ascii_texts = [text.encode('ascii', 'ignore').decode('ascii') for text in corpus]
+    datasets: Dict[str, List[str]] = {
+        'corpus': corpus,
+        'ascii': [text for text in ascii_texts if text] or ['plain ascii text'],
+        'graphemes': [_GRAPHEME_TEXT],
+    }
+    implementations = [
+        ('emoji old regex', lambda text: OLD_EMOJI_PATTERN.sub('', text)),
+        ('emoji table', strip_emojis),
+        ('emoji scan', strip_emojis_scan),
+        ('special old regex', lambda text: OLD_SPECIAL_CHARS_PATTERN.sub('', text)),
+        ('special table', strip_special_chars),
+        ('special scan', strip_special_chars_scan),
+    ]
+
+    print(f"\n{'implementation':<20}" + ''.join(f"{name + ' (us)':>18}" for name in datasets))
+    for name, func in implementations:
+        scan = name.endswith('scan')
+        row = [_time(func, texts, max(1, rounds // 10) if scan else rounds) for texts in datasets.values()]
+        print(f"{name:<20}" + ''.join(f"{value:>18.2f}" for value in row))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='表情/特殊符号删除基准')
+    parser.add_argument('--cases', type=int, default=20000, help='随机一致性校验样例数')
+    parser.add_argument('--messages', type=int, default=2000, help='合成语料消息数')
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.messages, args.seed)
+    mismatches = check(args.cases, corpus, args.seed)
+    behaviour_changes(corpus)
+    bench(corpus, args.rounds)
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
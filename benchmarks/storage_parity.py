@@ -0,0 +1,206 @@
+"""
+存储后端一致性校验 - 在 Database（SQLite）和 SQLAlchemyDatabase 上执行同一组调用，逐个比较返回值
+
+覆盖 StorageBackend 的全部异步接口（init/close 除外），未覆盖的接口也计为失败。
+返回值统一转换为普通的 dict/list 后比较，值的类型也必须一致；
+时间戳只比较格式（'YYYY-MM-DD HH:MM:SS'），不比较具体时间。
+
+用法: python -m benchmarks.storage_parity [--url sqlite+aiosqlite:///parity.db]
+      --url 可以指向 PostgreSQL / MySQL 的空数据库，默认使用临时 SQLite 文件
+"""
+
+import argparse
+import asyncio
+import inspect
+import logging
+import re
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, List, Tuple
+
+from config.database import Database
+from config.sqlalchemy_database import SQLAlchemyDatabase
+from config.storage import StorageBackend
+
+
+_TIMESTAMP = re.compile(r'^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}(?:\.\d+)?$')
+
+
+def _steps() -> List[Tuple[str, tuple]]:
+    """按顺序执行的 (方法名, 参数)"""
+    today = datetime.now().date()
+    tomorrow = today + timedelta(days=1)
+    return [
+        # API池
+        ('add_api', ('app1', 'hash1', 2)),
+        ('add_api', ('app2', 'hash2')),
+        ('add_api', ('app1', 'hash1')),
+        ('get_available_api', ()),
+        ('assign_api_to_account', ('app1', '+100')),
+        ('get_account_api', ('+100',)),
+        ('get_api_status', ('app1',)),
+        ('get_api_status', ('missing',)),
+        ('get_api_pool_status', ()),
+        ('release_api_from_account', ('+100',)),
+        ('apply_api_assignments', ({'app2': ['+200', '+300']},)),
+        ('get_api_pool_status', ()),
+        ('remove_api', ('app1',)),
+
+        # 监听账号和发送机器人
+        ('add_listener_account', ('+100', 11, 'user1')),
+        ('add_listener_account', ('+200',)),
+        ('get_listener_accounts', ()),
+        ('update_account_status', ('+200', 'error', 3)),
+        ('update_account_status', ('+100', 'active')),
+        ('get_listener_accounts', ('error',)),
+        ('delete_listener_account', ('+200',)),
+        ('add_sender_bot', ('token1', 'bot1')),
+        ('update_bot_error_count', ('token1', 2)),
+        ('get_sender_bots', ()),
+
+        # 搬运组
+        ('create_forwarding_group', ('group1', 'first')),
+        ('create_forwarding_group', ('group2',)),
+        ('create_forwarding_group', ('group1',)),
+        ('update_group_filters', (1, {'remove_links': True, 'custom_rules': [{'type': 'keyword', 'pattern': 'x'}]})),
+        ('update_group_status', (2, 'paused')),
+        ('set_group_schedule', (1, '09:00', '18:00')),
+        ('set_group_windows', (1, [('09:00', '12:00'), ('14:00', '18:00')], 'UTC+8')),
+        ('set_group_priority', (1, 5)),
+        ('set_group_digest', (1, 60, 10)),
+        ('get_forwarding_group', (1,)),
+        ('get_forwarding_group', (99,)),
+        ('get_forwarding_groups', ()),
+
+        # 频道
+        ('add_source_channel', (1, -100, 'source', 'Source')),
+        ('add_source_channel', (2, -100)),
+        ('add_target_channel', (1, -200, 'target', 'Target')),
+        ('update_last_message_id', (1, -100, 5)),
+        ('update_channel_last_message_id', (-100, 7, [1, 2])),
+        ('get_group_channels', (1,)),
+        ('get_group_channels', (2,)),
+        ('get_groups_with_channels', ()),
+
+        # 消息记录
+        ('add_message_record', (1, 5, 50, -100, -200, 'hash1')),
+        ('add_message_record', (1, 6, 51, -100, -200, 'hash2')),
+        ('is_message_forwarded', ('hash1',)),
+        ('is_message_forwarded', ('missing',)),
+        ('is_delivered', (-200, 'hash1')),
+        ('is_delivered', (-201, 'hash1')),
+        ('get_recent_deliveries', (10,)),
+        ('get_message_records_before', (tomorrow, 10)),
+        ('get_message_records_before', (today - timedelta(days=1), 10)),
+        ('delete_message_records', (1, 1, tomorrow)),
+        ('get_recent_deliveries', (10,)),
+
+        # 统计和清理
+        ('update_statistics', (1, '+100', True)),
+        ('update_statistics', (1, '+100', False)),
+        ('update_statistics', (2, '+100', True)),
+        ('get_group_statistics', (1,)),
+        ('get_daily_group_statistics', (today,)),
+        ('get_account_statistics', ('+100',)),
+        ('cleanup_old_data', (30,)),
+        ('get_group_statistics', (1,)),
+    ]
+
+
+def _interface_methods() -> List[str]:
+    """StorageBackend 的全部异步接口（init/close 除外）"""
+    return sorted(
+        name for name, member in inspect.getmembers(StorageBackend)
+        if inspect.iscoroutinefunction(member) and not name.startswith('_') and name not in ('init', 'close')
+    )
+
+
+def _normalize(value: Any) -> Any:
+    """转换为普通容器；时间戳字符串只保留格式，其它值保留类型"""
+    if hasattr(value, 'keys') and not isinstance(value, dict):
+        value = {key: value[key] for key in value.keys()}
+    if isinstance(value, dict):
+        return {key: _normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    if isinstance(value, str) and _TIMESTAMP.match(value):
+        return '<timestamp>'
+    return value
+
+
+def _same(left: Any, right: Any) -> bool:
+    """值相等且类型相同（1 与 1.0、True 与 1 视为不同）"""
+    if type(left) is not type(right):
+        return False
+    if isinstance(left, dict):
+        return left.keys() == right.keys() and all(_same(left[key], right[key]) for key in left)
+    if isinstance(left, list):
+        return len(left) == len(right) and all(_same(a, b) for a, b in zip(left, right))
+    return left == right
+
+
+def _describe(value: Any) -> str:
+    if isinstance(value, dict):
+        return '{' + ', '.join(f'{key!r}: {_describe(item)}' for key, item in value.items()) + '}'
+    if isinstance(value, list):
+        return '[' + ', '.join(_describe(item) for item in value) + ']'
+    return f'{value!r} ({type(value).__name__})'
+
+
+async def _run(database: StorageBackend) -> List[Any]:
+    await database.init()
+    results = []
+    try:
+        for name, args in _steps():
+            try:
+                results.append(_normalize(await getattr(database, name)(*args)))
+            except Exception as e:
+                results.append(f'<error {type(e).__name__}: {e}>')
+    finally:
+        await database.close()
+    return results
+
+
+async def check(url: str = None) -> int:
+    """执行校验，返回不一致（含未覆盖接口）的数量"""
+    workdir = Path(tempfile.mkdtemp(prefix='storage_parity_'))
+    url = url or f"sqlite+aiosqlite:///{workdir / 'sqlalchemy.db'}"
+
+    # 重复添加等步骤预期会失败，后端记录的错误日志不输出
+    logging.disable(logging.ERROR)
+    try:
+        expected = await _run(Database(str(workdir / 'sqlite.db')))
+        actual = await _run(SQLAlchemyDatabase(url))
+    finally:
+        logging.disable(logging.NOTSET)
+
+    failures = 0
+    for (name, args), left, right in zip(_steps(), expected, actual):
+        if not _same(left, right):
+            failures += 1
+            print(f"❌ {name}{args!r}\n   Database:           {_describe(left)}\n"
+                  f"   SQLAlchemyDatabase: {_describe(right)}")
+
+    covered = {name for name, _ in _steps()}
+    missing = [name for name in _interface_methods() if name not in covered]
+    for name in missing:
+        failures += 1
+        print(f"❌ 未覆盖的接口: {name}")
+
+    print(f"storage parity ({url.split('://')[0]}): {len(expected)} calls, "
+          f"{len(_interface_methods())} methods, {failures} failures")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='存储后端一致性校验')
+    parser.add_argument('--url', help='SQLAlchemy 数据库URL（空库），默认使用临时 SQLite 文件')
+    args = parser.parse_args()
+    failures = asyncio.run(check(args.url))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
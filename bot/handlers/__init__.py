@@ -57,10 +57,13 @@ def setup_handlers(app: Application, settings, database, account_manager,
     app.add_handler(CommandHandler("set_filter", group_handler.set_filter))
     app.add_handler(CommandHandler("toggle_filter", group_handler.toggle_filter))
     app.add_handler(CommandHandler("filter_test", group_handler.filter_test))
+    app.add_handler(CommandHandler("enable_regex", group_handler.enable_regex))
     
     # 调度管理
     app.add_handler(CommandHandler("set_schedule", group_handler.set_schedule))
     app.add_handler(CommandHandler("remove_schedule", group_handler.remove_schedule))
+    app.add_handler(CommandHandler("set_priority", group_handler.set_priority))
+    app.add_handler(CommandHandler("set_digest", group_handler.set_digest))
     app.add_handler(CommandHandler("schedule_status", monitor_handler.schedule_status))
     
     # 历史消息
@@ -76,6 +79,7 @@ def setup_handlers(app: Application, settings, database, account_manager,
     # 系统管理
     app.add_handler(CommandHandler("system_info", monitor_handler.system_info))
     app.add_handler(CommandHandler("logs", monitor_handler.logs))
+    app.add_handler(CommandHandler("dbstats", monitor_handler.dbstats))
     app.add_handler(CommandHandler("backup", admin_handler.backup))
     app.add_handler(CommandHandler("restart", admin_handler.restart))
     
@@ -25,7 +25,7 @@ class AdminHandlers:
 
 📋 **搬运组管理**
 • `/create_group <组名> [描述]` - 创建搬运组
-• `/list_groups` - 查看所有组
+• `/list_groups [页码]` - 查看所有组
 • `/group_info <组ID>` - 查看组详情
 • `/delete_group <组ID>` - 删除组
 • `/add_source <组ID> <频道链接>` - 添加源频道
@@ -49,10 +49,14 @@ class AdminHandlers:
 • `/set_filter <组ID> <类型> <规则>` - 设置过滤规则
 • `/toggle_filter <组ID> <类型>` - 开关过滤功能
 • `/filter_test <组ID> <测试文本>` - 测试过滤效果
+• `/enable_regex <正则|all>` - 重新启用超时停用的正则
 
 ⏰ **调度管理**
 • `/set_schedule <组ID> <开始时间> <结束时间>` - 设置定时运行
+• `/set_schedule <组ID> <开始-结束> [开始-结束...] [时区]` - 多个时间窗/指定时区
 • `/remove_schedule <组ID>` - 移除定时调度
+• `/set_priority <组ID> <优先级>` - 设置发送优先级(1-100)
+• `/set_digest <组ID> <秒数> [条数]` - 合并发送(0为关闭)
 • `/schedule_status [组ID]` - 查看调度状态
 
 📝 **历史消息**
@@ -68,6 +72,7 @@ class AdminHandlers:
 🖥️ **系统管理**
 • `/system_info` - 查看系统信息
 • `/logs [行数]` - 查看日志
+• `/dbstats [数量]` - 查看数据库查询统计
 • `/backup` - 手动备份
 • `/restart` - 重启系统
 • `/status` - 查看运行状态
@@ -99,6 +104,7 @@ class AdminHandlers:
 **⏰ 设置定时调度:**
 • `/set_schedule 1 09:00 18:00` - 工作时间运行
 • `/set_schedule 1 22:00 08:00` - 夜间运行（跨天）
+• `/set_schedule 1 09:00-12:00 14:00-18:00 Asia/Tokyo` - 按东京时间分两段运行
 
 **🔧 配置过滤器:**
 • `/toggle_filter 1 remove_links` - 开启/关闭链接过滤
@@ -13,6 +13,9 @@ from ..middleware import admin_required, error_handler
 class GroupHandlers:
     """搬运组管理处理器"""
     
+    # /list_groups 每页显示的组数（Telegram 单条消息最长 4096 字符）
+    GROUPS_PER_PAGE = 20
+    
     def __init__(self, settings, database, group_processor):
         self.settings = settings
         self.database = database
@@ -56,15 +59,18 @@ class GroupHandlers:
     @admin_required
     @error_handler
     async def list_groups(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """查看所有搬运组"""
+        """查看所有搬运组（分页）"""
         try:
-            groups = await self.group_processor.get_group_list()
+            args = context.args
+            page = int(args[0]) if args and args[0].isdigit() else 1
+            result = await self.group_processor.get_group_page(page, self.GROUPS_PER_PAGE)
+            groups = result['groups']
             
             if not groups:
                 await update.message.reply_text("📋 暂无搬运组")
                 return
             
-            groups_text = "📋 **搬运组列表**\n\n"
+            groups_text = f"📋 **搬运组列表** (共{result['total']}个)\n\n"
             
             for group in groups:
                 status_emoji = "🟢" if group['status'] == 'active' else "🔴"
@@ -82,6 +88,11 @@ class GroupHandlers:
                 stats = group['today_stats']
                 groups_text += f"   📊 今日: {stats['messages']}条消息, {stats['success_rate']}%成功率\n\n"
             
+            if result['pages'] > 1:
+                groups_text += f"第 {result['page']}/{result['pages']} 页"
+                if result['page'] < result['pages']:
+                    groups_text += f"，下一页: `/list_groups {result['page'] + 1}`"
+            
             await update.message.reply_text(groups_text, parse_mode='Markdown')
             
         except Exception as e:
@@ -113,6 +124,14 @@ class GroupHandlers:
             info_text += f"• 组名: {group_info['name']}\n"
             info_text += f"• 组ID: {group_info['id']}\n"
             info_text += f"• 状态: {group_info['status']}\n"
+            info_text += f"• 优先级: {group_info['priority']}\n"
+            
+            digest = group_info.get('digest') or {}
+            if digest.get('window'):
+                info_text += f"• 合并发送: {digest['window']}秒"
+                if digest.get('max_messages'):
+                    info_text += f"/最多{digest['max_messages']}条"
+                info_text += f" (缓冲中 {digest['buffered']} 条)\n"
             
             if group_info['description']:
                 info_text += f"• 描述: {group_info['description']}\n"
@@ -307,32 +326,78 @@ class GroupHandlers:
             self.logger.error(f"切换过滤器失败: {e}")
             await update.message.reply_text(f"❌ 切换失败: {str(e)}")
 
+    @admin_required
+    @error_handler
+    async def enable_regex(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """重新启用因超时被自动停用的自定义正则"""
+        # 正则本身可能含空格，取命令后的完整文本
+        parts = update.message.text.split(maxsplit=1)
+        pattern = parts[1].strip() if len(parts) > 1 else ''
+        if not pattern:
+            disabled = self.group_processor.get_disabled_regex_rules()
+            listing = '\n'.join(f"• `{rule}`" for rule in disabled) if disabled else '（无）'
+            await update.message.reply_text(
+                "❌ 请提供要启用的正则\n\n"
+                "用法: `/enable_regex <正则>` 或 `/enable_regex all`\n\n"
+                f"已停用的规则:\n{listing}",
+                parse_mode='Markdown'
+            )
+            return
+        
+        try:
+            result = await self.group_processor.enable_regex_rule(None if pattern == 'all' else pattern)
+            
+            if result['status'] == 'success':
+                await update.message.reply_text(f"✅ {result['message']}")
+            else:
+                await update.message.reply_text(f"❌ {result['message']}")
+                
+        except Exception as e:
+            self.logger.error(f"启用正则规则失败: {e}")
+            await update.message.reply_text(f"❌ 启用失败: {str(e)}")
+
     @admin_required
     @error_handler
     async def set_schedule(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """设置组调度"""
         args = context.args
-        if len(args) < 3:
+        if len(args) < 2 or (len(args) < 3 and '-' not in args[1]):
             await update.message.reply_text(
                 "❌ 请提供组ID、开始时间和结束时间\n\n"
                 "用法: `/set_schedule 1 09:00 18:00`\n"
-                "跨天: `/set_schedule 1 22:00 08:00`",
+                "跨天: `/set_schedule 1 22:00 08:00`\n"
+                "多个时间窗/时区: `/set_schedule 1 09:00-12:00 14:00-18:00 Asia/Tokyo`",
                 parse_mode='Markdown'
             )
             return
         
         try:
             group_id = int(args[0])
-            start_time = args[1]
-            end_time = args[2]
-            
-            # 验证时间格式
             time_pattern = re.compile(r'^([01]?[0-9]|2[0-3]):[0-5][0-9]$')
-            if not time_pattern.match(start_time) or not time_pattern.match(end_time):
-                await update.message.reply_text("❌ 时间格式错误，请使用 HH:MM 格式")
-                return
             
-            result = await self.group_processor.set_group_schedule(group_id, start_time, end_time)
+            if '-' not in args[1]:
+                start_time = args[1]
+                end_time = args[2]
+                
+                # 验证时间格式
+                if not time_pattern.match(start_time) or not time_pattern.match(end_time):
+                    await update.message.reply_text("❌ 时间格式错误，请使用 HH:MM 格式")
+                    return
+                
+                result = await self.group_processor.set_group_schedule(group_id, start_time, end_time)
+            else:
+                # 开始-结束 形式的多个时间窗，最后一个参数不是时间窗时作为时区
+                windows = [arg for arg in args[1:] if '-' in arg and ':' in arg]
+                rest = [arg for arg in args[1:] if arg not in windows]
+                timezone = rest[0] if rest else None
+                
+                for window in windows:
+                    start_time, _, end_time = window.partition('-')
+                    if not time_pattern.match(start_time) or not time_pattern.match(end_time):
+                        await update.message.reply_text("❌ 时间窗格式错误，请使用 HH:MM-HH:MM 格式")
+                        return
+                
+                result = await self.group_processor.set_group_windows(group_id, windows, timezone)
             
             if result['status'] == 'success':
                 await update.message.reply_text(f"✅ {result['message']}")
@@ -345,6 +410,69 @@ class GroupHandlers:
             self.logger.error(f"设置调度失败: {e}")
             await update.message.reply_text(f"❌ 设置失败: {str(e)}")
 
+    @admin_required
+    @error_handler
+    async def set_priority(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """设置组的发送优先级"""
+        args = context.args
+        if len(args) < 2:
+            await update.message.reply_text(
+                "❌ 请提供组ID和优先级\n\n"
+                "用法: `/set_priority 1 5`\n"
+                "发送队列拥堵时按优先级比例分配发送机会，默认为1",
+                parse_mode='Markdown'
+            )
+            return
+        
+        try:
+            group_id = int(args[0])
+            priority = int(args[1])
+            
+            result = await self.group_processor.set_group_priority(group_id, priority)
+            
+            if result['status'] == 'success':
+                await update.message.reply_text(f"✅ {result['message']}")
+            else:
+                await update.message.reply_text(f"❌ {result['message']}")
+                
+        except ValueError:
+            await update.message.reply_text("❌ 组ID和优先级必须是数字")
+        except Exception as e:
+            self.logger.error(f"设置优先级失败: {e}")
+            await update.message.reply_text(f"❌ 设置失败: {str(e)}")
+
+    @admin_required
+    @error_handler
+    async def set_digest(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """设置组的合并发送"""
+        args = context.args
+        if len(args) < 2:
+            await update.message.reply_text(
+                "❌ 请提供组ID和时间窗\n\n"
+                "用法: `/set_digest 1 60 [20]`\n"
+                "60秒内过滤后的消息合并为一条发送，可选最多条数，时间窗为0时关闭",
+                parse_mode='Markdown'
+            )
+            return
+        
+        try:
+            group_id = int(args[0])
+            window = int(args[1])
+            max_messages = int(args[2]) if len(args) > 2 else 0
+            
+            result = await self.group_processor.set_group_digest(group_id, window, max_messages)
+            
+            if result['status'] == 'success':
+                await update.message.reply_text(f"✅ {result['message']}")
+            else:
+                await update.message.reply_text(f"❌ {result['message']}")
+                
+        except ValueError:
+            await update.message.reply_text("❌ 组ID、时间窗和条数必须是数字")
+        except Exception as e:
+            self.logger.error(f"设置合并发送失败: {e}")
+            await update.message.reply_text(f"❌ 设置失败: {str(e)}")
+
     def _parse_channel_link(self, link: str) -> tuple:
         """解析频道链接"""
         try:
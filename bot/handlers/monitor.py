@@ -11,6 +11,8 @@ from telegram.ext import ContextTypes
 
 from ..middleware import admin_required, error_handler
 from utils.logger import get_log_stats, get_recent_logs
+from config.query_stats import format_statements
+from core.pipeline import DROP_REASONS
 
 
 class MonitorHandlers:
@@ -142,6 +144,15 @@ class MonitorHandlers:
             except:
                 pass
             
+            # 处理流水线各阶段耗时和丢弃原因
+            pipeline_text = ""
+            for stage in group_stats.get('pipeline', []):
+                drops = '，'.join(
+                    f"{DROP_REASONS.get(reason, reason)} {count}" for reason, count in stage['drops'].items()
+                )
+                pipeline_text += f"• {stage['stage']}: {stage['count']}条 平均{stage['avg_ms']}ms 最大{stage['max_ms']}ms"
+                pipeline_text += f" (丢弃: {drops})\n" if drops else "\n"
+            
             global_status = f"""
 📊 **全局状态详情**
 
@@ -168,6 +179,8 @@ class MonitorHandlers:
 • 重试次数: {self.settings.retry_attempts}次
 • 轮换策略: {self.settings.rotation_strategy}
 
+**处理流水线**
+{pipeline_text or '• 暂无数据'}
 **系统健康**
 • 内存使用: {psutil.virtual_memory().percent:.1f}%
 • CPU使用: {psutil.cpu_percent():.1f}%
@@ -234,6 +247,49 @@ class MonitorHandlers:
             self.logger.error(f"获取日志失败: {e}")
             await update.message.reply_text(f"❌ 获取日志失败: {str(e)}")
 
+    @admin_required
+    @error_handler
+    async def dbstats(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """查看数据库查询统计"""
+        try:
+            top = int(context.args[0]) if context.args else 10
+            
+            if top > 30:
+                await update.message.reply_text("❌ 最多显示30条语句")
+                return
+            
+            stats = self.database.get_query_stats(top=top)
+            uptime = datetime.now() - datetime.fromtimestamp(stats['since'])
+            
+            stats_text = f"""
+🗄️ **数据库查询统计**
+
+• 统计时长: {str(uptime).split('.')[0]}
+• 语句种类: {stats['statements_tracked']}
+• 总调用: {stats['total_calls']}
+• 错误次数: {stats['total_errors']}
+• 总耗时: {stats['total_ms']:.1f}ms
+• 慢查询阈值: {stats['slow_query_ms']}ms
+
+**耗时最多的 {len(stats['statements'])} 条语句**
+"""
+            
+            if stats['statements']:
+                stats_text += "```\n" + "\n".join(format_statements(stats['statements'])) + "\n```"
+            else:
+                stats_text += "\n暂无查询记录"
+            
+            if len(stats_text) > 4000:
+                stats_text = stats_text[:3990] + "...\n```"
+            
+            await update.message.reply_text(stats_text, parse_mode='Markdown')
+            
+        except ValueError:
+            await update.message.reply_text("❌ 数量必须是数字")
+        except Exception as e:
+            self.logger.error(f"获取数据库统计失败: {e}")
+            await update.message.reply_text(f"❌ 获取统计失败: {str(e)}")
+
     @admin_required
     @error_handler
     async def schedule_status(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -250,8 +306,8 @@ class MonitorHandlers:
 ⏰ **组{group_id} 调度状态**
 
 • 调度状态: ✅ 已设置
-• 开始时间: {schedule_status['start_time']}
-• 结束时间: {schedule_status['end_time']}
+• 时间窗: {', '.join(schedule_status['windows'])}
+• 时区: {schedule_status['timezone']}
 • 当前状态: {schedule_status['current_status']}
 • 最后更新: {schedule_status.get('last_updated', '未知')}
                     """
@@ -273,7 +329,7 @@ class MonitorHandlers:
                 for schedule in schedules:
                     status_text += f"""
 • **组{schedule['group_id']}**
-  时间: {schedule['start_time']}-{schedule['end_time']}
+  时间: {', '.join(schedule['windows'])} ({schedule['timezone']})
   状态: {schedule['current_status']}
                     """
                 
@@ -10,19 +10,25 @@ from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional, Tuple
 from pathlib import Path
 
+from config.query_stats import InstrumentedConnection
+from config.records import record_factory
+from config.storage import StorageBackend
 
-class Database:
-    """数据库管理类"""
+
+class Database(StorageBackend):
+    """数据库管理类（SQLite / aiosqlite 后端）"""
     
-    def __init__(self, db_path: str = "data/forwarder.db"):
+    def __init__(self, db_path: str = "data/forwarder.db", slow_query_ms: float = 100):
+        super().__init__(slow_query_ms)
         self.db_path = Path(db_path)
-        self.db_path.parent.mkdir(exist_ok=True)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
         self._connection = None
         
     async def init(self):
         """初始化数据库"""
-        self._connection = await aiosqlite.connect(self.db_path)
-        self._connection.row_factory = aiosqlite.Row
+        connection = await aiosqlite.connect(self.db_path, cached_statements=256)
+        connection.row_factory = record_factory
+        self._connection = InstrumentedConnection(connection, self.query_stats)
         await self._create_tables()
         logging.info(f"数据库初始化完成: {self.db_path}")
 
@@ -87,6 +93,11 @@ class Database:
                 status TEXT DEFAULT 'active',
                 schedule_start TEXT,
                 schedule_end TEXT,
+                schedule_windows TEXT,
+                schedule_timezone TEXT,
+                priority INTEGER DEFAULT 1,
+                digest_window INTEGER,
+                digest_size INTEGER,
                 filters TEXT,
                 footer TEXT,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -154,13 +165,34 @@ class Database:
             )
         ''')
 
+        # 旧版本数据库补充新增的列
+        await self._add_missing_columns('forwarding_groups', [
+            ('schedule_windows', 'TEXT'),
+            ('schedule_timezone', 'TEXT'),
+            ('priority', 'INTEGER DEFAULT 1'),
+            ('digest_window', 'INTEGER'),
+            ('digest_size', 'INTEGER')
+        ])
+
         # 创建索引
         await self._connection.execute('CREATE INDEX IF NOT EXISTS idx_message_history_hash ON message_history(content_hash)')
         await self._connection.execute('CREATE INDEX IF NOT EXISTS idx_message_history_group ON message_history(group_id)')
+        await self._connection.execute(
+            'CREATE INDEX IF NOT EXISTS idx_message_history_target_hash ON message_history(target_channel_id, content_hash)'
+        )
         await self._connection.execute('CREATE INDEX IF NOT EXISTS idx_statistics_date ON statistics(date)')
 
         await self._connection.commit()
 
+    async def _add_missing_columns(self, table: str, columns: List[Tuple[str, str]]):
+        """为已有的表补充缺少的列（SQLite 的 CREATE TABLE IF NOT EXISTS 不会修改旧表）"""
+        rows = await self._connection.execute_fetchall(f'PRAGMA table_info({table})')
+        existing = {row['name'] for row in rows}
+        for name, column_type in columns:
+            if name not in existing:
+                await self._connection.execute(f'ALTER TABLE {table} ADD COLUMN {name} {column_type}')
+                logging.info(f"数据库迁移: {table} 新增列 {name}")
+
     # API池管理
     async def add_api(self, app_id: str, app_hash: str, max_accounts: int = 3) -> bool:
         """添加API ID到池中"""
@@ -175,6 +207,19 @@ class Database:
             logging.error(f"添加API失败: {e}")
             return False
 
+    async def remove_api(self, app_id: str) -> bool:
+        """从池中删除API ID"""
+        try:
+            await self._connection.execute(
+                'DELETE FROM api_pool WHERE app_id = ?',
+                (app_id,)
+            )
+            await self._connection.commit()
+            return True
+        except Exception as e:
+            logging.error(f"删除API失败: {e}")
+            return False
+
     async def get_available_api(self) -> Optional[Dict[str, Any]]:
         """获取可用的API ID"""
         cursor = await self._connection.execute('''
@@ -255,6 +300,65 @@ class Database:
             result.append(data)
         return result
 
+    async def get_api_status(self, app_id: str) -> Optional[Dict[str, Any]]:
+        """获取指定API状态"""
+        cursor = await self._connection.execute('''
+            SELECT
+                ap.*,
+                GROUP_CONCAT(la.phone) as assigned_accounts
+            FROM api_pool ap
+            LEFT JOIN listener_accounts la ON ap.app_id = la.api_id
+            WHERE ap.app_id = ?
+            GROUP BY ap.id
+        ''', (app_id,))
+        row = await cursor.fetchone()
+        if row:
+            data = dict(row)
+            data['assigned_accounts'] = data['assigned_accounts'].split(',') if data['assigned_accounts'] else []
+            return data
+        return None
+
+    async def get_account_api(self, phone: str) -> Optional[Dict[str, Any]]:
+        """获取账号分配的API"""
+        cursor = await self._connection.execute('''
+            SELECT ap.* FROM api_pool ap
+            JOIN listener_accounts la ON ap.app_id = la.api_id
+            WHERE la.phone = ?
+        ''', (phone,))
+        row = await cursor.fetchone()
+        return dict(row) if row else None
+
+    async def apply_api_assignments(self, assignments: Dict[str, List[str]]) -> bool:
+        """按 app_id -> 账号列表 重新分配API并重算使用计数"""
+        try:
+            for app_id, phones in assignments.items():
+                # 清除当前分配
+                await self._connection.execute(
+                    'UPDATE listener_accounts SET api_id = NULL WHERE api_id = ?',
+                    (app_id,)
+                )
+                for phone in phones:
+                    await self._connection.execute(
+                        'UPDATE listener_accounts SET api_id = ? WHERE phone = ?',
+                        (app_id, phone)
+                    )
+
+            # 更新API使用计数
+            for app_id in assignments:
+                await self._connection.execute(
+                    '''UPDATE api_pool SET current_accounts = (
+                           SELECT COUNT(*) FROM listener_accounts WHERE api_id = ?
+                       ), updated_at = CURRENT_TIMESTAMP WHERE app_id = ?''',
+                    (app_id, app_id)
+                )
+
+            await self._connection.commit()
+            return True
+        except Exception as e:
+            logging.error(f"重新分配API失败: {e}")
+            await self._connection.rollback()
+            return False
+
     # 账号管理
     async def add_listener_account(self, phone: str, user_id: int = None, username: str = None) -> bool:
         """添加监听账号"""
@@ -270,13 +374,11 @@ class Database:
             return False
 
     async def get_listener_accounts(self, status: str = 'active') -> List[Dict[str, Any]]:
-        """获取监听账号列表"""
-        cursor = await self._connection.execute(
+        """获取监听账号列表（只读记录，需要修改时先 dict(row)）"""
+        return list(await self._connection.execute_fetchall(
             'SELECT * FROM listener_accounts WHERE status = ? ORDER BY id',
             (status,)
-        )
-        rows = await cursor.fetchall()
-        return [dict(row) for row in rows]
+        ))
 
     async def update_account_status(self, phone: str, status: str, error_count: int = None) -> bool:
         """更新账号状态"""
@@ -297,6 +399,53 @@ class Database:
             logging.error(f"更新账号状态失败: {e}")
             return False
 
+    async def delete_listener_account(self, phone: str) -> bool:
+        """删除监听账号"""
+        try:
+            await self._connection.execute(
+                'DELETE FROM listener_accounts WHERE phone = ?',
+                (phone,)
+            )
+            await self._connection.commit()
+            return True
+        except Exception as e:
+            logging.error(f"删除监听账号失败: {e}")
+            return False
+
+    # 发送Bot管理
+    async def get_sender_bots(self, status: str = 'active') -> List[Dict[str, Any]]:
+        """获取发送Bot列表"""
+        return list(await self._connection.execute_fetchall(
+            'SELECT * FROM sender_bots WHERE status = ? ORDER BY id',
+            (status,)
+        ))
+
+    async def add_sender_bot(self, token: str, username: str = None) -> bool:
+        """添加发送Bot"""
+        try:
+            await self._connection.execute(
+                'INSERT OR REPLACE INTO sender_bots (token, username) VALUES (?, ?)',
+                (token, username)
+            )
+            await self._connection.commit()
+            return True
+        except Exception as e:
+            logging.error(f"添加发送Bot失败: {e}")
+            return False
+
+    async def update_bot_error_count(self, token: str, error_count: int) -> bool:
+        """更新Bot错误次数"""
+        try:
+            await self._connection.execute(
+                'UPDATE sender_bots SET error_count = ? WHERE token = ?',
+                (error_count, token)
+            )
+            await self._connection.commit()
+            return True
+        except Exception as e:
+            logging.error(f"更新Bot错误次数失败: {e}")
+            return False
+
     # 搬运组管理
     async def create_forwarding_group(self, name: str, description: str = None) -> Optional[int]:
         """创建搬运组"""
@@ -306,6 +455,7 @@ class Database:
                 (name, description)
             )
             await self._connection.commit()
+            self._notify_group_changed(cursor.lastrowid)
             return cursor.lastrowid
         except Exception as e:
             logging.error(f"创建搬运组失败: {e}")
@@ -313,23 +463,27 @@ class Database:
 
     async def get_forwarding_groups(self) -> List[Dict[str, Any]]:
         """获取所有搬运组"""
-        cursor = await self._connection.execute(
+        rows = await self._connection.execute_fetchall(
             'SELECT * FROM forwarding_groups ORDER BY id'
         )
-        rows = await cursor.fetchall()
-        groups = []
-        for row in rows:
-            group = dict(row)
-            # 解析过滤器JSON
-            if group['filters']:
-                try:
-                    group['filters'] = json.loads(group['filters'])
-                except:
-                    group['filters'] = {}
-            else:
-                group['filters'] = {}
-            groups.append(group)
-        return groups
+        decode = self._decode_group
+        return [decode(row) for row in rows]
+
+    async def get_groups_with_channels(self) -> List[Tuple[Dict[str, Any], List[Dict], List[Dict]]]:
+        """获取所有搬运组及其活跃源/目标频道（组一次查询，两张频道表 UNION ALL 一次查询）"""
+        groups = await self.get_forwarding_groups()
+        rows = await self._connection.execute_fetchall('''
+            SELECT 'source' AS role, id, group_id, channel_id, channel_username, channel_title,
+                   last_message_id, status, created_at
+            FROM source_channels WHERE status = 'active'
+            UNION ALL
+            SELECT 'target', id, group_id, channel_id, channel_username, channel_title,
+                   NULL, status, created_at
+            FROM target_channels WHERE status = 'active'
+            ORDER BY group_id, id
+        ''')
+        channels = self._split_channel_rows(rows)
+        return [(group, *(channels.get(group['id']) or ([], []))) for group in groups]
 
     async def get_forwarding_group(self, group_id: int) -> Optional[Dict[str, Any]]:
         """获取单个搬运组"""
@@ -339,15 +493,7 @@ class Database:
         )
         row = await cursor.fetchone()
         if row:
-            group = dict(row)
-            if group['filters']:
-                try:
-                    group['filters'] = json.loads(group['filters'])
-                except:
-                    group['filters'] = {}
-            else:
-                group['filters'] = {}
-            return group
+            return self._decode_group(row)
         return None
 
     async def update_group_filters(self, group_id: int, filters: Dict[str, Any]) -> bool:
@@ -358,24 +504,86 @@ class Database:
                 (json.dumps(filters), group_id)
             )
             await self._connection.commit()
+            self._notify_group_changed(group_id)
             return True
         except Exception as e:
             logging.error(f"更新组过滤器失败: {e}")
             return False
 
+    async def update_group_status(self, group_id: int, status: str) -> bool:
+        """更新组状态"""
+        try:
+            await self._connection.execute(
+                'UPDATE forwarding_groups SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+                (status, group_id)
+            )
+            await self._connection.commit()
+            self._notify_group_changed(group_id)
+            return True
+        except Exception as e:
+            logging.error(f"更新组状态失败: {e}")
+            return False
+
     async def set_group_schedule(self, group_id: int, start_time: str, end_time: str) -> bool:
-        """设置组调度"""
+        """设置组调度（单个时间窗，清除多时间窗设置）"""
         try:
             await self._connection.execute(
-                'UPDATE forwarding_groups SET schedule_start = ?, schedule_end = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+                'UPDATE forwarding_groups SET schedule_start = ?, schedule_end = ?, schedule_windows = NULL, '
+                'updated_at = CURRENT_TIMESTAMP WHERE id = ?',
                 (start_time, end_time, group_id)
             )
             await self._connection.commit()
+            self._notify_group_changed(group_id)
             return True
         except Exception as e:
             logging.error(f"设置组调度失败: {e}")
             return False
 
+    async def set_group_windows(self, group_id: int, windows: List[Tuple[str, str]], timezone: str = None) -> bool:
+        """设置组的多个调度时间窗和时区（schedule_start/end 同步为第一个时间窗）"""
+        try:
+            first = windows[0] if windows else (None, None)
+            await self._connection.execute(
+                'UPDATE forwarding_groups SET schedule_start = ?, schedule_end = ?, schedule_windows = ?, '
+                'schedule_timezone = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+                (first[0], first[1], json.dumps([list(window) for window in windows]) if windows else None,
+                 timezone, group_id)
+            )
+            await self._connection.commit()
+            self._notify_group_changed(group_id)
+            return True
+        except Exception as e:
+            logging.error(f"设置组调度时间窗失败: {e}")
+            return False
+
+    async def set_group_priority(self, group_id: int, priority: int) -> bool:
+        """设置组的发送优先级（加权公平队列中的权重）"""
+        try:
+            await self._connection.execute(
+                'UPDATE forwarding_groups SET priority = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+                (priority, group_id)
+            )
+            await self._connection.commit()
+            self._notify_group_changed(group_id)
+            return True
+        except Exception as e:
+            logging.error(f"设置组优先级失败: {e}")
+            return False
+
+    async def set_group_digest(self, group_id: int, window: int, max_messages: int) -> bool:
+        """设置组的合并发送（时间窗秒数，0为关闭；每条合并消息最多包含的消息数，0为不限）"""
+        try:
+            await self._connection.execute(
+                'UPDATE forwarding_groups SET digest_window = ?, digest_size = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+                (window or None, max_messages or None, group_id)
+            )
+            await self._connection.commit()
+            self._notify_group_changed(group_id)
+            return True
+        except Exception as e:
+            logging.error(f"设置组合并发送失败: {e}")
+            return False
+
     # 频道管理
     async def add_source_channel(self, group_id: int, channel_id: int, channel_username: str = None, channel_title: str = None) -> bool:
         """添加源频道"""
@@ -385,6 +593,7 @@ class Database:
                 (group_id, channel_id, channel_username, channel_title)
             )
             await self._connection.commit()
+            self._notify_group_changed(group_id)
             return True
         except Exception as e:
             logging.error(f"添加源频道失败: {e}")
@@ -398,6 +607,7 @@ class Database:
                 (group_id, channel_id, channel_username, channel_title)
             )
             await self._connection.commit()
+            self._notify_group_changed(group_id)
             return True
         except Exception as e:
             logging.error(f"添加目标频道失败: {e}")
@@ -406,18 +616,16 @@ class Database:
     async def get_group_channels(self, group_id: int) -> Tuple[List[Dict], List[Dict]]:
         """获取组的源频道和目标频道"""
         # 获取源频道
-        cursor = await self._connection.execute(
-            'SELECT * FROM source_channels WHERE group_id = ? AND status = "active"',
+        source_channels = list(await self._connection.execute_fetchall(
+            "SELECT * FROM source_channels WHERE group_id = ? AND status = 'active'",
             (group_id,)
-        )
-        source_channels = [dict(row) for row in await cursor.fetchall()]
+        ))
 
         # 获取目标频道
-        cursor = await self._connection.execute(
-            'SELECT * FROM target_channels WHERE group_id = ? AND status = "active"',
+        target_channels = list(await self._connection.execute_fetchall(
+            "SELECT * FROM target_channels WHERE group_id = ? AND status = 'active'",
             (group_id,)
-        )
-        target_channels = [dict(row) for row in await cursor.fetchall()]
+        ))
 
         return source_channels, target_channels
 
@@ -434,6 +642,22 @@ class Database:
             logging.error(f"更新最后消息ID失败: {e}")
             return False
 
+    async def update_channel_last_message_id(self, channel_id: int, message_id: int, group_ids: List[int]) -> bool:
+        """一次更新多个组中同一源频道最后处理的消息ID"""
+        if not group_ids:
+            return True
+        try:
+            placeholders = ', '.join('?' * len(group_ids))
+            await self._connection.execute(
+                f'UPDATE source_channels SET last_message_id = ? WHERE channel_id = ? AND group_id IN ({placeholders})',
+                (message_id, channel_id, *group_ids)
+            )
+            await self._connection.commit()
+            return True
+        except Exception as e:
+            logging.error(f"更新最后消息ID失败: {e}")
+            return False
+
     # 消息记录
     async def is_message_forwarded(self, content_hash: str) -> bool:
         """检查消息是否已转发"""
@@ -444,6 +668,24 @@ class Database:
         row = await cursor.fetchone()
         return row is not None
 
+    async def is_delivered(self, target_channel_id: int, content_hash: str) -> bool:
+        """检查内容是否已发送到目标频道"""
+        cursor = await self._connection.execute(
+            'SELECT 1 FROM message_history WHERE target_channel_id = ? AND content_hash = ? LIMIT 1',
+            (target_channel_id, content_hash)
+        )
+        row = await cursor.fetchone()
+        return row is not None
+
+    async def get_recent_deliveries(self, limit: int) -> List[Tuple[int, str]]:
+        """最近的投递记录 (目标频道, 内容哈希)，按新到旧"""
+        cursor = await self._connection.execute(
+            'SELECT target_channel_id, content_hash FROM message_history ORDER BY id DESC LIMIT ?',
+            (limit,)
+        )
+        rows = await cursor.fetchall()
+        return [(row[0], row[1]) for row in rows]
+
     async def add_message_record(self, group_id: int, source_message_id: int, target_message_id: int,
                                source_channel_id: int, target_channel_id: int, content_hash: str) -> bool:
         """添加消息记录"""
@@ -460,6 +702,28 @@ class Database:
             logging.error(f"添加消息记录失败: {e}")
             return False
 
+    async def get_message_records_before(self, cutoff_date, limit: int = 10000) -> List[Dict[str, Any]]:
+        """按ID顺序获取早于指定日期的消息记录（用于归档）"""
+        cursor = await self._connection.execute(
+            'SELECT * FROM message_history WHERE sent_at < ? ORDER BY id LIMIT ?',
+            (cutoff_date, limit)
+        )
+        rows = await cursor.fetchall()
+        return [dict(row) for row in rows]
+
+    async def delete_message_records(self, first_id: int, last_id: int, cutoff_date) -> int:
+        """删除已归档的消息记录"""
+        try:
+            cursor = await self._connection.execute(
+                'DELETE FROM message_history WHERE id BETWEEN ? AND ? AND sent_at < ?',
+                (first_id, last_id, cutoff_date)
+            )
+            await self._connection.commit()
+            return cursor.rowcount
+        except Exception as e:
+            logging.error(f"删除已归档消息记录失败: {e}")
+            return 0
+
     # 统计
     async def update_statistics(self, group_id: int, account_phone: str, success: bool = True) -> bool:
         """更新统计信息"""
@@ -519,6 +783,23 @@ class Database:
         rows = await cursor.fetchall()
         return [dict(row) for row in rows]
 
+    async def get_daily_group_statistics(self, day) -> Dict[int, Dict[str, Any]]:
+        """一次查询所有组某一天的统计，返回 组ID -> 统计"""
+        cursor = await self._connection.execute(
+            '''SELECT 
+                group_id,
+                SUM(message_count) as total_messages,
+                SUM(success_count) as total_success,
+                SUM(error_count) as total_errors,
+                ROUND(SUM(success_count) * 100.0 / SUM(message_count), 2) as success_rate
+               FROM statistics 
+               WHERE date = ?
+               GROUP BY group_id''',
+            (day,)
+        )
+        rows = await cursor.fetchall()
+        return {row['group_id']: dict(row) for row in rows}
+
     async def get_account_statistics(self, account_phone: str, days: int = 7) -> List[Dict[str, Any]]:
         """获取账号统计信息"""
         start_date = (datetime.now() - timedelta(days=days)).date()
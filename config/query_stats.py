@@ -0,0 +1,267 @@
+"""
+查询统计 - 为数据库连接记录每条语句的耗时直方图、调用次数、返回行数和慢查询日志
+"""
+
+import logging
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+
+# 延迟直方图桶上界(毫秒)，最后一个桶收集超出部分
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_STRING_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL_RE = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)+\s*\)', re.IGNORECASE)
+
+slow_query_logger = logging.getLogger('slow_query')
+
+
+class StatementStats:
+    """单条规范化语句的累计统计"""
+
+    __slots__ = ('sql', 'calls', 'errors', 'rows', 'total_ms', 'max_ms', 'buckets')
+
+    def __init__(self, sql: str):
+        self.sql = sql
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def observe(self, elapsed_ms: float):
+        self.calls += 1
+        self.total_ms += elapsed_ms
+        if elapsed_ms > self.max_ms:
+            self.max_ms = elapsed_ms
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if elapsed_ms <= bound:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+
+    def percentile(self, fraction: float) -> float:
+        """按直方图估算分位数（返回所在桶的上界）"""
+        if not self.calls:
+            return 0.0
+        target = self.calls * fraction
+        seen = 0
+        for i, count in enumerate(self.buckets[:-1]):
+            seen += count
+            if seen >= target:
+                return float(LATENCY_BUCKETS_MS[i])
+        return self.max_ms
+
+    def to_dict(self) -> Dict[str, Any]:
+        histogram = {f'<={bound}ms': count for bound, count in zip(LATENCY_BUCKETS_MS, self.buckets)}
+        histogram[f'>{LATENCY_BUCKETS_MS[-1]}ms'] = self.buckets[-1]
+        return {
+            'sql': self.sql,
+            'calls': self.calls,
+            'errors': self.errors,
+            'rows': self.rows,
+            'total_ms': round(self.total_ms, 3),
+            'avg_ms': round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+            'max_ms': round(self.max_ms, 3),
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'histogram': histogram
+        }
+
+
+class QueryStats:
+    """查询统计收集器"""
+
+    def __init__(self, slow_query_ms: float = 100):
+        self.slow_query_ms = slow_query_ms
+        self.started_at = time.time()
+        self._statements: Dict[str, StatementStats] = {}
+        self._normalized: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def normalize(self, sql: str) -> str:
+        """规范化SQL: 合并空白，字面量替换为?，IN列表折叠"""
+        normalized = self._normalized.get(sql)
+        if normalized is None:
+            text = _WHITESPACE_RE.sub(' ', sql).strip()
+            text = _STRING_LITERAL_RE.sub('?', text)
+            text = _NUMBER_LITERAL_RE.sub('?', text)
+            text = _IN_LIST_RE.sub('IN (?...)', text)
+            if len(self._normalized) < 10000:
+                self._normalized[sql] = text
+            normalized = text
+        return normalized
+
+    def _get(self, sql: str) -> StatementStats:
+        key = self.normalize(sql)
+        stats = self._statements.get(key)
+        if stats is None:
+            with self._lock:
+                stats = self._statements.setdefault(key, StatementStats(key))
+        return stats
+
+    def record(self, sql: str, elapsed_ms: float, rows: int = 0, error: bool = False,
+               parameters: Any = None) -> StatementStats:
+        """记录一次语句执行"""
+        stats = self._get(sql)
+        stats.observe(elapsed_ms)
+        stats.rows += rows
+        if error:
+            stats.errors += 1
+
+        if self.slow_query_ms and elapsed_ms >= self.slow_query_ms:
+            slow_query_logger.warning(
+                f"🐢 慢查询 {elapsed_ms:.1f}ms (阈值 {self.slow_query_ms}ms): {stats.sql}"
+                + (f" | 参数数量: {len(parameters)}" if parameters else "")
+            )
+        return stats
+
+    def add_rows(self, stats: StatementStats, rows: int, elapsed_ms: float):
+        """游标读取时补充返回行数和读取耗时"""
+        stats.rows += rows
+        stats.total_ms += elapsed_ms
+
+    def reset(self):
+        with self._lock:
+            self._statements.clear()
+        self.started_at = time.time()
+
+    def snapshot(self, top: Optional[int] = None, order_by: str = 'total_ms') -> Dict[str, Any]:
+        """导出统计快照，按指定字段降序"""
+        with self._lock:
+            statements = [stats.to_dict() for stats in list(self._statements.values())]
+        statements.sort(key=lambda item: item[order_by], reverse=True)
+
+        return {
+            'since': self.started_at,
+            'slow_query_ms': self.slow_query_ms,
+            'statements_tracked': len(statements),
+            'total_calls': sum(item['calls'] for item in statements),
+            'total_errors': sum(item['errors'] for item in statements),
+            'total_ms': round(sum(item['total_ms'] for item in statements), 3),
+            'statements': statements[:top] if top else statements
+        }
+
+
+class InstrumentedCursor:
+    """游标包装: 统计 fetch 返回的行数"""
+
+    def __init__(self, cursor, query_stats: QueryStats, stats: StatementStats):
+        self._cursor = cursor
+        self._query_stats = query_stats
+        self._stats = stats
+
+    async def fetchone(self):
+        start = time.perf_counter()
+        row = await self._cursor.fetchone()
+        self._query_stats.add_rows(self._stats, 1 if row is not None else 0,
+                                   (time.perf_counter() - start) * 1000)
+        return row
+
+    async def fetchmany(self, size: int = None):
+        start = time.perf_counter()
+        rows = await (self._cursor.fetchmany(size) if size is not None else self._cursor.fetchmany())
+        self._query_stats.add_rows(self._stats, len(rows), (time.perf_counter() - start) * 1000)
+        return rows
+
+    async def fetchall(self):
+        start = time.perf_counter()
+        rows = await self._cursor.fetchall()
+        self._query_stats.add_rows(self._stats, len(rows), (time.perf_counter() - start) * 1000)
+        return rows
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        async for row in self._cursor:
+            self._stats.rows += 1
+            yield row
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class InstrumentedConnection:
+    """aiosqlite连接包装: 所有 execute 调用都经过统计
+
+    Database 内部的 self._connection 即该包装对象（其它模块通过 Database 的方法访问数据库），
+    未覆盖的属性与方法透传给底层连接。
+    """
+
+    def __init__(self, connection, query_stats: QueryStats):
+        object.__setattr__(self, '_raw', connection)
+        object.__setattr__(self, 'query_stats', query_stats)
+
+    async def execute(self, sql: str, parameters=None):
+        start = time.perf_counter()
+        try:
+            if parameters is None:
+                cursor = await self._raw.execute(sql)
+            else:
+                cursor = await self._raw.execute(sql, parameters)
+        except Exception:
+            self.query_stats.record(sql, (time.perf_counter() - start) * 1000, error=True)
+            raise
+        stats = self.query_stats.record(sql, (time.perf_counter() - start) * 1000, parameters=parameters)
+        return InstrumentedCursor(cursor, self.query_stats, stats)
+
+    async def execute_fetchall(self, sql: str, parameters=None):
+        start = time.perf_counter()
+        try:
+            if parameters is None:
+                rows = await self._raw.execute_fetchall(sql)
+            else:
+                rows = await self._raw.execute_fetchall(sql, parameters)
+        except Exception:
+            self.query_stats.record(sql, (time.perf_counter() - start) * 1000, error=True)
+            raise
+        self.query_stats.record(sql, (time.perf_counter() - start) * 1000, rows=len(rows),
+                                parameters=parameters)
+        return rows
+
+    async def executemany(self, sql: str, parameters):
+        start = time.perf_counter()
+        try:
+            cursor = await self._raw.executemany(sql, parameters)
+        except Exception:
+            self.query_stats.record(sql, (time.perf_counter() - start) * 1000, error=True)
+            raise
+        self.query_stats.record(sql, (time.perf_counter() - start) * 1000)
+        return cursor
+
+    async def commit(self):
+        start = time.perf_counter()
+        try:
+            await self._raw.commit()
+        except Exception:
+            self.query_stats.record('COMMIT', (time.perf_counter() - start) * 1000, error=True)
+            raise
+        self.query_stats.record('COMMIT', (time.perf_counter() - start) * 1000)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._raw, name, value)
+
+
+def format_statements(statements: List[Dict[str, Any]], sql_width: int = 80) -> List[str]:
+    """把统计条目格式化为简短的文本行"""
+    lines = []
+    for item in statements:
+        sql = item['sql']
+        if len(sql) > sql_width:
+            sql = sql[:sql_width] + '...'
+        lines.append(
+            f"{item['calls']}次 avg {item['avg_ms']}ms p95≤{item['p95_ms']}ms "
+            f"max {item['max_ms']}ms 行{item['rows']}\n  {sql}"
+        )
+    return lines
@@ -0,0 +1,94 @@
+"""
+数据库行对象 - 紧凑的只读记录类型，替代 aiosqlite.Row + dict(row)
+"""
+
+from collections import namedtuple
+from typing import Any, Dict, Iterable, Tuple
+
+
+_tuple_new = tuple.__new__
+_tuple_getitem = tuple.__getitem__
+
+
+class RecordMixin:
+    """为namedtuple行对象提供按列名访问的映射接口
+
+    支持 row['col']、row.get('col')、row.col、dict(row)；
+    记录不可变，需要修改字段时使用 replace_field 生成新记录。
+    """
+
+    __slots__ = ()
+    _columns: Tuple[str, ...] = ()
+    _index: Dict[str, int] = {}
+
+    def __getitem__(self, key):
+        if key.__class__ is str:
+            try:
+                return _tuple_getitem(self, self._index[key])
+            except KeyError:
+                raise KeyError(key) from None
+        return _tuple_getitem(self, key)
+
+    def __contains__(self, key) -> bool:
+        return key in self._index
+
+    def get(self, key: str, default: Any = None) -> Any:
+        index = self._index.get(key)
+        if index is None:
+            return default
+        return _tuple_getitem(self, index)
+
+    def keys(self) -> Tuple[str, ...]:
+        return self._columns
+
+    def values(self) -> Tuple[Any, ...]:
+        return tuple(self)
+
+    def items(self) -> Iterable[Tuple[str, Any]]:
+        return zip(self._columns, self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(zip(self._columns, self))
+
+
+# 列名元组 -> 记录类型
+_record_types: Dict[Tuple[str, ...], type] = {}
+
+# 最近一次使用的 (cursor.description, 记录类型)，同一查询的后续行直接复用
+_last_description = (None, None)
+
+
+def record_type(columns: Tuple[str, ...]) -> type:
+    """获取（或创建）指定列集合的记录类型"""
+    cls = _record_types.get(columns)
+    if cls is None:
+        # SQLAlchemy 结果集的列名是 str 的子类，统一转为 str，dict(row) 才能按列名取值
+        names = tuple(map(str, columns))
+        base = namedtuple('Record', names, rename=True)
+        cls = type('Record', (RecordMixin, base), {
+            '__slots__': (),
+            '_columns': names,
+            '_index': {name: i for i, name in enumerate(names)}
+        })
+        _record_types[columns] = cls
+    return cls
+
+
+def record_factory(cursor, row):
+    """sqlite3 row_factory: 生成紧凑记录对象"""
+    global _last_description
+    description = cursor.description
+    last = _last_description
+    if last[0] is description:
+        cls = last[1]
+    else:
+        cls = record_type(tuple(column[0] for column in description))
+        _last_description = (description, cls)
+    return _tuple_new(cls, row)
+
+
+def replace_field(record, name: str, value: Any):
+    """返回替换了指定字段的新记录"""
+    values = list(record)
+    values[record._index[name]] = value
+    return _tuple_new(type(record), values)
@@ -168,6 +168,10 @@ class Settings:
             return int(env_val)
         return self.get('global_settings.hourly_limit', 50)
 
+    @property
+    def schedule_timezone(self) -> str:
+        return self.get('global_settings.timezone', 'Asia/Shanghai')
+
     @property
     def retry_attempts(self) -> int:
         return self.get('global_settings.retry_attempts', 3)
@@ -214,6 +218,43 @@ class Settings:
     def smart_filter(self) -> bool:
         return self.get('filters.smart_filter', True)
 
+    @property
+    def filter_pool_workers(self) -> int:
+        return self.get('filters.pool_workers', 2)
+
+    @property
+    def filter_pool_min_batch(self) -> int:
+        return self.get('filters.pool_min_batch', 500)
+
+    @property
+    def pipeline_trace_size(self) -> int:
+        return self.get('filters.pipeline_trace_size', 200)
+
+    @property
+    def filter_use_entities(self) -> bool:
+        return self.get('filters.use_entities', True)
+
+    @property
+    def spam_model(self) -> str:
+        return self.get('filters.spam_model', '')
+
+    @property
+    def filter_cache_size(self) -> int:
+        return self.get('filters.cache_size', 4096)
+
+    @property
+    def regex_timeout_ms(self) -> float:
+        return self.get('filters.regex_timeout_ms', 50)
+
+    @property
+    def regex_max_timeouts(self) -> int:
+        return self.get('filters.regex_max_timeouts', 3)
+
+    # 监听设置
+    @property
+    def catch_up_limit(self) -> int:
+        return self.get('listener.catch_up_limit', 500)
+
     # 安全设置
     @property
     def session_encryption(self) -> bool:
@@ -230,6 +271,96 @@ class Settings:
     def log_retention_days(self) -> int:
         return self.get('security.log_retention_days', 30)
 
+    # 数据库设置
+    @property
+    def max_backup_files(self) -> int:
+        return self.get('database.max_backup_files', 7)
+
+    @property
+    def backup_pages_per_step(self) -> int:
+        return self.get('database.backup_pages_per_step', 256)
+
+    @property
+    def backup_step_sleep(self) -> float:
+        return self.get('database.backup_step_sleep', 0.05)
+
+    @property
+    def backup_compression(self) -> str:
+        return self.get('database.backup_compression', 'gzip')
+
+    @property
+    def slow_query_ms(self) -> float:
+        env_val = os.getenv('SLOW_QUERY_MS')
+        if env_val:
+            return float(env_val)
+        return self.get('database.slow_query_ms', 100)
+
+    @property
+    def slow_query_log(self) -> str:
+        return self.get('database.slow_query_log', 'logs/slow_query.log')
+
+    @property
+    def database_pool_size(self) -> int:
+        return self.get('database.pool_size', 5)
+
+    @property
+    def database_echo(self) -> bool:
+        return self.get('database.echo', False)
+
+    @property
+    def group_refresh_interval(self) -> int:
+        return self.get('database.group_refresh_interval', 300)
+
+    @property
+    def delivery_index_size(self) -> int:
+        return self.get('database.delivery_index_size', 100000)
+
+    @property
+    def stats_cache_ttl(self) -> float:
+        return self.get('database.stats_cache_ttl', 5)
+
+    # 分片设置
+    @property
+    def shard_workers(self) -> int:
+        return self.get('sharding.workers', 0)
+
+    @property
+    def shard_stop_timeout(self) -> float:
+        return self.get('sharding.stop_timeout', 30)
+
+    @property
+    def shard_max_in_flight(self) -> int:
+        return self.get('sharding.max_in_flight', 100)
+
+    # 归档设置
+    @property
+    def archive_enabled(self) -> bool:
+        return self.get('archive.enabled', True)
+
+    @property
+    def archive_dir(self) -> str:
+        return self.get('archive.dir', 'data/archive')
+
+    @property
+    def archive_after_days(self) -> int:
+        return self.get('archive.after_days', 7)
+
+    @property
+    def archive_batch_size(self) -> int:
+        return self.get('archive.batch_size', 50000)
+
+    @property
+    def archive_block_rows(self) -> int:
+        return self.get('archive.block_rows', 1000)
+
+    @property
+    def archive_bloom_error_rate(self) -> float:
+        return self.get('archive.bloom_error_rate', 0.01)
+
+    @property
+    def archive_dedup(self) -> bool:
+        return self.get('archive.check_dedup', True)
+
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
         return {
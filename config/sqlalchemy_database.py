@@ -0,0 +1,836 @@
+"""
+SQLAlchemy 异步存储后端 - 支持 PostgreSQL / MySQL 等服务端数据库
+"""
+
+import json
+import logging
+import time
+from datetime import date, datetime, timedelta
+from typing import List, Dict, Any, Optional, Tuple
+
+from sqlalchemy import (
+    inspect, text, MetaData, Table, Column, Integer, BigInteger, Float, String, Text, Date, DateTime,
+    ForeignKey, Index, event, select, insert, update, delete, func, and_, literal_column,
+    literal, null, cast, union_all
+)
+from sqlalchemy.types import TypeDecorator
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from config.records import record_type
+from config.storage import StorageBackend
+
+
+metadata = MetaData()
+
+
+class Timestamp(TypeDecorator):
+    """时间戳列: 读出时转为与 SQLite 后端相同的字符串（'YYYY-MM-DD HH:MM:SS'），写入时也接受该字符串"""
+
+    impl = DateTime
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if isinstance(value, str):
+            return datetime.fromisoformat(value)
+        return value
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else str(value)
+
+
+class DateText(TypeDecorator):
+    """日期列: 读出时转为与 SQLite 后端相同的字符串（'YYYY-MM-DD'）"""
+
+    impl = Date
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if isinstance(value, str):
+            return date.fromisoformat(value)
+        return value
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else str(value)
+
+api_pool = Table(
+    'api_pool', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('app_id', String(64), unique=True, nullable=False),
+    Column('app_hash', String(128), nullable=False),
+    Column('max_accounts', Integer, server_default='3'),
+    Column('current_accounts', Integer, server_default='0'),
+    Column('status', String(32), server_default='active'),
+    Column('created_at', Timestamp, server_default=func.current_timestamp()),
+    Column('updated_at', Timestamp, server_default=func.current_timestamp())
+)
+
+listener_accounts = Table(
+    'listener_accounts', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('phone', String(32), unique=True, nullable=False),
+    Column('user_id', BigInteger),
+    Column('username', String(255)),
+    Column('api_id', String(64), ForeignKey('api_pool.app_id')),
+    Column('status', String(32), server_default='active'),
+    Column('last_active', Timestamp),
+    Column('error_count', Integer, server_default='0'),
+    Column('created_at', Timestamp, server_default=func.current_timestamp())
+)
+
+sender_bots = Table(
+    'sender_bots', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('token', String(255), unique=True, nullable=False),
+    Column('username', String(255)),
+    Column('status', String(32), server_default='active'),
+    Column('last_used', Timestamp),
+    Column('error_count', Integer, server_default='0'),
+    Column('created_at', Timestamp, server_default=func.current_timestamp())
+)
+
+forwarding_groups = Table(
+    'forwarding_groups', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('name', String(255), unique=True, nullable=False),
+    Column('description', Text),
+    Column('status', String(32), server_default='active'),
+    Column('schedule_start', String(16)),
+    Column('schedule_end', String(16)),
+    Column('schedule_windows', Text),
+    Column('schedule_timezone', String(64)),
+    Column('priority', Integer, server_default='1'),
+    Column('digest_window', Integer),
+    Column('digest_size', Integer),
+    Column('filters', Text),
+    Column('footer', Text),
+    Column('created_at', Timestamp, server_default=func.current_timestamp()),
+    Column('updated_at', Timestamp, server_default=func.current_timestamp())
+)
+
+source_channels = Table(
+    'source_channels', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('group_id', Integer, ForeignKey('forwarding_groups.id', ondelete='CASCADE'), nullable=False),
+    Column('channel_id', BigInteger, nullable=False),
+    Column('channel_username', String(255)),
+    Column('channel_title', String(255)),
+    Column('last_message_id', BigInteger, server_default='0'),
+    Column('status', String(32), server_default='active'),
+    Column('created_at', Timestamp, server_default=func.current_timestamp())
+)
+
+target_channels = Table(
+    'target_channels', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('group_id', Integer, ForeignKey('forwarding_groups.id', ondelete='CASCADE'), nullable=False),
+    Column('channel_id', BigInteger, nullable=False),
+    Column('channel_username', String(255)),
+    Column('channel_title', String(255)),
+    Column('status', String(32), server_default='active'),
+    Column('created_at', Timestamp, server_default=func.current_timestamp())
+)
+
+message_history = Table(
+    'message_history', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('group_id', Integer, ForeignKey('forwarding_groups.id'), nullable=False),
+    Column('source_message_id', BigInteger, nullable=False),
+    Column('target_message_id', BigInteger),
+    Column('source_channel_id', BigInteger, nullable=False),
+    Column('target_channel_id', BigInteger, nullable=False),
+    Column('content_hash', String(64)),
+    Column('status', String(32), server_default='sent'),
+    Column('sent_at', Timestamp, server_default=func.current_timestamp()),
+    Index('idx_message_history_hash', 'content_hash'),
+    Index('idx_message_history_group', 'group_id'),
+    Index('idx_message_history_target_hash', 'target_channel_id', 'content_hash')
+)
+
+statistics = Table(
+    'statistics', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('group_id', Integer, ForeignKey('forwarding_groups.id')),
+    Column('account_phone', String(32)),
+    Column('message_count', Integer, server_default='0'),
+    Column('success_count', Integer, server_default='0'),
+    Column('error_count', Integer, server_default='0'),
+    Column('date', DateText, server_default=func.current_date()),
+    Column('created_at', Timestamp, server_default=func.current_timestamp()),
+    Index('idx_statistics_date', 'date')
+)
+
+
+def _statistics_totals() -> Tuple[Any, ...]:
+    """统计汇总列；服务端数据库的 SUM/ROUND 可能返回 Decimal，转换为与 SQLite 后端相同的 int/float"""
+    total = func.sum(statistics.c.message_count)
+    success = func.sum(statistics.c.success_count)
+    return (
+        cast(total, Integer).label('total_messages'),
+        cast(success, Integer).label('total_success'),
+        cast(func.sum(statistics.c.error_count), Integer).label('total_errors'),
+        cast(func.round(success * 100.0 / func.nullif(total, 0), 2), Float).label('success_rate')
+    )
+
+
+def _records(result) -> List[Any]:
+    """把结果集转换为与 SQLite 后端一致的紧凑记录"""
+    cls = record_type(tuple(result.keys()))
+    new = tuple.__new__
+    return [new(cls, row) for row in result]
+
+
+def _add_missing_columns(sync_conn):
+    """为已有的表补充新增的可空列（create_all 不会修改旧表）
+
+    只补充没有默认值或默认值为常量的列，ALTER TABLE 不支持 CURRENT_TIMESTAMP 之类的默认值。
+    """
+    inspector = inspect(sync_conn)
+    existing_tables = set(inspector.get_table_names())
+    for table in metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            default = column.server_default
+            if default is not None and not isinstance(getattr(default, 'arg', None), str):
+                continue
+            column_type = column.type.compile(dialect=sync_conn.dialect)
+            if default is not None:
+                column_type += " DEFAULT '{}'".format(default.arg.replace("'", "''"))
+            sync_conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+            logging.info(f"数据库迁移: {table.name} 新增列 {column.name}")
+
+
+def _add_missing_indexes(sync_conn):
+    """为已有的表补充新增的索引（create_all 只在建表时创建索引）"""
+    inspector = inspect(sync_conn)
+    existing_tables = set(inspector.get_table_names())
+    for table in metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(sync_conn)
+                logging.info(f"数据库迁移: {table.name} 新增索引 {index.name}")
+
+
+class SQLAlchemyDatabase(StorageBackend):
+    """SQLAlchemy Core 异步后端"""
+
+    def __init__(self, url: str, slow_query_ms: float = 100, pool_size: int = 5, echo: bool = False):
+        super().__init__(slow_query_ms)
+        self.url = url
+        self.pool_size = pool_size
+        self.echo = echo
+        self.engine = None
+
+    async def init(self):
+        """初始化连接池并创建表"""
+        options = {'echo': self.echo, 'pool_pre_ping': True}
+        if not self.url.startswith('sqlite'):
+            options['pool_size'] = self.pool_size
+        self.engine = create_async_engine(self.url, **options)
+        self._install_instrumentation()
+
+        async with self.engine.begin() as conn:
+            await conn.run_sync(metadata.create_all)
+            await conn.run_sync(_add_missing_columns)
+            await conn.run_sync(_add_missing_indexes)
+
+        logging.info(f"数据库初始化完成: {self.engine.url.render_as_string(hide_password=True)}")
+
+    async def close(self):
+        """关闭连接池"""
+        if self.engine:
+            await self.engine.dispose()
+            self.engine = None
+
+    def _install_instrumentation(self):
+        """通过引擎事件把语句耗时记录到查询统计"""
+        query_stats = self.query_stats
+        sync_engine = self.engine.sync_engine
+
+        @event.listens_for(sync_engine, 'before_cursor_execute')
+        def _before(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+        @event.listens_for(sync_engine, 'after_cursor_execute')
+        def _after(conn, cursor, statement, parameters, context, executemany):
+            start = conn.info['query_start'].pop()
+            rowcount = getattr(cursor, 'rowcount', 0) or 0
+            query_stats.record(statement, (time.perf_counter() - start) * 1000,
+                               rows=max(rowcount, 0), parameters=parameters)
+
+        @event.listens_for(sync_engine, 'handle_error')
+        def _error(context):
+            conn = context.connection
+            if conn is not None and conn.info.get('query_start'):
+                start = conn.info['query_start'].pop()
+                query_stats.record(context.statement or '', (time.perf_counter() - start) * 1000, error=True)
+
+    async def _fetch_all(self, statement) -> List[Any]:
+        async with self.engine.connect() as conn:
+            return _records(await conn.execute(statement))
+
+    async def _fetch_one(self, statement) -> Optional[Any]:
+        rows = await self._fetch_all(statement)
+        return rows[0] if rows else None
+
+    async def _write(self, *statements) -> int:
+        """在单个事务中执行写语句，返回最后一条语句影响的行数"""
+        rowcount = 0
+        async with self.engine.begin() as conn:
+            for statement in statements:
+                result = await conn.execute(statement)
+                rowcount = result.rowcount
+        return rowcount
+
+    async def _api_assignments(self, app_id: str = None) -> Dict[str, List[str]]:
+        """获取 app_id -> 已分配账号列表"""
+        statement = select(listener_accounts.c.api_id, listener_accounts.c.phone).where(
+            listener_accounts.c.api_id.isnot(None)
+        ).order_by(listener_accounts.c.id)
+        if app_id is not None:
+            statement = statement.where(listener_accounts.c.api_id == app_id)
+
+        assigned: Dict[str, List[str]] = {}
+        for row in await self._fetch_all(statement):
+            assigned.setdefault(row['api_id'], []).append(row['phone'])
+        return assigned
+
+    # API池管理
+    async def add_api(self, app_id: str, app_hash: str, max_accounts: int = 3) -> bool:
+        """添加API ID到池中"""
+        try:
+            await self._write(insert(api_pool).values(app_id=app_id, app_hash=app_hash, max_accounts=max_accounts))
+            return True
+        except Exception as e:
+            logging.error(f"添加API失败: {e}")
+            return False
+
+    async def remove_api(self, app_id: str) -> bool:
+        """从池中删除API ID"""
+        try:
+            await self._write(delete(api_pool).where(api_pool.c.app_id == app_id))
+            return True
+        except Exception as e:
+            logging.error(f"删除API失败: {e}")
+            return False
+
+    async def get_available_api(self) -> Optional[Dict[str, Any]]:
+        """获取可用的API ID"""
+        return await self._fetch_one(
+            select(api_pool)
+            .where(and_(api_pool.c.status == 'active', api_pool.c.current_accounts < api_pool.c.max_accounts))
+            .order_by(api_pool.c.current_accounts.asc(), api_pool.c.id.asc())
+            .limit(1)
+        )
+
+    async def assign_api_to_account(self, app_id: str, phone: str) -> bool:
+        """将API分配给账号"""
+        try:
+            await self._write(
+                update(api_pool).where(api_pool.c.app_id == app_id).values(
+                    current_accounts=api_pool.c.current_accounts + 1,
+                    updated_at=func.current_timestamp()
+                ),
+                update(listener_accounts).where(listener_accounts.c.phone == phone).values(api_id=app_id)
+            )
+            return True
+        except Exception as e:
+            logging.error(f"分配API失败: {e}")
+            return False
+
+    async def release_api_from_account(self, phone: str) -> bool:
+        """释放账号的API"""
+        try:
+            async with self.engine.begin() as conn:
+                result = await conn.execute(
+                    select(listener_accounts.c.api_id).where(listener_accounts.c.phone == phone)
+                )
+                row = result.first()
+
+                if row and row.api_id:
+                    await conn.execute(
+                        update(api_pool).where(api_pool.c.app_id == row.api_id).values(
+                            current_accounts=api_pool.c.current_accounts - 1,
+                            updated_at=func.current_timestamp()
+                        )
+                    )
+                    await conn.execute(
+                        update(listener_accounts).where(listener_accounts.c.phone == phone).values(api_id=None)
+                    )
+            return True
+        except Exception as e:
+            logging.error(f"释放API失败: {e}")
+            return False
+
+    async def get_api_pool_status(self) -> List[Dict[str, Any]]:
+        """获取API池状态"""
+        # GROUP_CONCAT / string_agg 因数据库而异，已分配账号在Python侧汇总
+        apis = await self._fetch_all(select(api_pool).order_by(api_pool.c.id))
+        assigned = await self._api_assignments()
+
+        result = []
+        for api in apis:
+            data = dict(api)
+            data['assigned_accounts'] = assigned.get(api['app_id'], [])
+            result.append(data)
+        return result
+
+    async def get_api_status(self, app_id: str) -> Optional[Dict[str, Any]]:
+        """获取指定API状态"""
+        api = await self._fetch_one(select(api_pool).where(api_pool.c.app_id == app_id))
+        if api:
+            data = dict(api)
+            data['assigned_accounts'] = (await self._api_assignments(app_id)).get(app_id, [])
+            return data
+        return None
+
+    async def get_account_api(self, phone: str) -> Optional[Dict[str, Any]]:
+        """获取账号分配的API"""
+        row = await self._fetch_one(
+            select(api_pool)
+            .select_from(api_pool.join(listener_accounts, api_pool.c.app_id == listener_accounts.c.api_id))
+            .where(listener_accounts.c.phone == phone)
+        )
+        return dict(row) if row else None
+
+    async def apply_api_assignments(self, assignments: Dict[str, List[str]]) -> bool:
+        """按 app_id -> 账号列表 重新分配API并重算使用计数"""
+        try:
+            statements = []
+            for app_id, phones in assignments.items():
+                statements.append(
+                    update(listener_accounts).where(listener_accounts.c.api_id == app_id).values(api_id=None)
+                )
+                if phones:
+                    statements.append(
+                        update(listener_accounts).where(listener_accounts.c.phone.in_(phones)).values(api_id=app_id)
+                    )
+
+            for app_id in assignments:
+                count = (
+                    select(func.count())
+                    .select_from(listener_accounts)
+                    .where(listener_accounts.c.api_id == app_id)
+                    .scalar_subquery()
+                )
+                statements.append(
+                    update(api_pool).where(api_pool.c.app_id == app_id).values(
+                        current_accounts=count,
+                        updated_at=func.current_timestamp()
+                    )
+                )
+
+            await self._write(*statements)
+            return True
+        except Exception as e:
+            logging.error(f"重新分配API失败: {e}")
+            return False
+
+    # 账号管理
+    async def add_listener_account(self, phone: str, user_id: int = None, username: str = None) -> bool:
+        """添加监听账号（与 SQLite 的 INSERT OR REPLACE 语义一致: 整行替换）"""
+        try:
+            await self._write(
+                delete(listener_accounts).where(listener_accounts.c.phone == phone),
+                insert(listener_accounts).values(
+                    phone=phone, user_id=user_id, username=username, last_active=func.current_timestamp()
+                )
+            )
+            return True
+        except Exception as e:
+            logging.error(f"添加监听账号失败: {e}")
+            return False
+
+    async def get_listener_accounts(self, status: str = 'active') -> List[Dict[str, Any]]:
+        """获取监听账号列表（只读记录，需要修改时先 dict(row)）"""
+        return await self._fetch_all(
+            select(listener_accounts).where(listener_accounts.c.status == status).order_by(listener_accounts.c.id)
+        )
+
+    async def update_account_status(self, phone: str, status: str, error_count: int = None) -> bool:
+        """更新账号状态"""
+        try:
+            values = {'status': status, 'last_active': func.current_timestamp()}
+            if error_count is not None:
+                values['error_count'] = error_count
+            await self._write(update(listener_accounts).where(listener_accounts.c.phone == phone).values(**values))
+            return True
+        except Exception as e:
+            logging.error(f"更新账号状态失败: {e}")
+            return False
+
+    async def delete_listener_account(self, phone: str) -> bool:
+        """删除监听账号"""
+        try:
+            await self._write(delete(listener_accounts).where(listener_accounts.c.phone == phone))
+            return True
+        except Exception as e:
+            logging.error(f"删除监听账号失败: {e}")
+            return False
+
+    # 发送Bot管理
+    async def get_sender_bots(self, status: str = 'active') -> List[Dict[str, Any]]:
+        """获取发送Bot列表"""
+        return await self._fetch_all(
+            select(sender_bots).where(sender_bots.c.status == status).order_by(sender_bots.c.id)
+        )
+
+    async def add_sender_bot(self, token: str, username: str = None) -> bool:
+        """添加发送Bot"""
+        try:
+            await self._write(
+                delete(sender_bots).where(sender_bots.c.token == token),
+                insert(sender_bots).values(token=token, username=username)
+            )
+            return True
+        except Exception as e:
+            logging.error(f"添加发送Bot失败: {e}")
+            return False
+
+    async def update_bot_error_count(self, token: str, error_count: int) -> bool:
+        """更新Bot错误次数"""
+        try:
+            await self._write(update(sender_bots).where(sender_bots.c.token == token).values(error_count=error_count))
+            return True
+        except Exception as e:
+            logging.error(f"更新Bot错误次数失败: {e}")
+            return False
+
+    # 搬运组管理
+    async def create_forwarding_group(self, name: str, description: str = None) -> Optional[int]:
+        """创建搬运组"""
+        try:
+            async with self.engine.begin() as conn:
+                result = await conn.execute(insert(forwarding_groups).values(name=name, description=description))
+                group_id = result.inserted_primary_key[0]
+            self._notify_group_changed(group_id)
+            return group_id
+        except Exception as e:
+            logging.error(f"创建搬运组失败: {e}")
+            return None
+
+    async def get_forwarding_groups(self) -> List[Dict[str, Any]]:
+        """获取所有搬运组"""
+        rows = await self._fetch_all(select(forwarding_groups).order_by(forwarding_groups.c.id))
+        decode = self._decode_group
+        return [decode(row) for row in rows]
+
+    async def get_groups_with_channels(self) -> List[Tuple[Dict[str, Any], List[Dict], List[Dict]]]:
+        """获取所有搬运组及其活跃源/目标频道（组一次查询，两张频道表 UNION ALL 一次查询）"""
+        groups = await self.get_forwarding_groups()
+        sc, tc = source_channels.c, target_channels.c
+        statement = union_all(
+            select(literal('source').label('role'), sc.id, sc.group_id, sc.channel_id, sc.channel_username,
+                   sc.channel_title, sc.last_message_id, sc.status, sc.created_at).where(sc.status == 'active'),
+            select(literal('target'), tc.id, tc.group_id, tc.channel_id, tc.channel_username,
+                   tc.channel_title, cast(null(), BigInteger), tc.status, tc.created_at).where(tc.status == 'active')
+        ).order_by(literal_column('group_id'), literal_column('id'))
+        channels = self._split_channel_rows(await self._fetch_all(statement))
+        return [(group, *(channels.get(group['id']) or ([], []))) for group in groups]
+
+    async def get_forwarding_group(self, group_id: int) -> Optional[Dict[str, Any]]:
+        """获取单个搬运组"""
+        row = await self._fetch_one(select(forwarding_groups).where(forwarding_groups.c.id == group_id))
+        if row:
+            return self._decode_group(row)
+        return None
+
+    async def update_group_filters(self, group_id: int, filters: Dict[str, Any]) -> bool:
+        """更新组过滤器"""
+        try:
+            await self._write(
+                update(forwarding_groups).where(forwarding_groups.c.id == group_id).values(
+                    filters=json.dumps(filters), updated_at=func.current_timestamp()
+                )
+            )
+            self._notify_group_changed(group_id)
+            return True
+        except Exception as e:
+            logging.error(f"更新组过滤器失败: {e}")
+            return False
+
+    async def update_group_status(self, group_id: int, status: str) -> bool:
+        """更新组状态"""
+        try:
+            await self._write(
+                update(forwarding_groups).where(forwarding_groups.c.id == group_id).values(
+                    status=status, updated_at=func.current_timestamp()
+                )
+            )
+            self._notify_group_changed(group_id)
+            return True
+        except Exception as e:
+            logging.error(f"更新组状态失败: {e}")
+            return False
+
+    async def set_group_schedule(self, group_id: int, start_time: str, end_time: str) -> bool:
+        """设置组调度（单个时间窗，清除多时间窗设置）"""
+        try:
+            await self._write(
+                update(forwarding_groups).where(forwarding_groups.c.id == group_id).values(
+                    schedule_start=start_time, schedule_end=end_time, schedule_windows=None,
+                    updated_at=func.current_timestamp()
+                )
+            )
+            self._notify_group_changed(group_id)
+            return True
+        except Exception as e:
+            logging.error(f"设置组调度失败: {e}")
+            return False
+
+    async def set_group_windows(self, group_id: int, windows: List[Tuple[str, str]], timezone: str = None) -> bool:
+        """设置组的多个调度时间窗和时区（schedule_start/end 同步为第一个时间窗）"""
+        try:
+            first = windows[0] if windows else (None, None)
+            await self._write(
+                update(forwarding_groups).where(forwarding_groups.c.id == group_id).values(
+                    schedule_start=first[0], schedule_end=first[1],
+                    schedule_windows=json.dumps([list(window) for window in windows]) if windows else None,
+                    schedule_timezone=timezone, updated_at=func.current_timestamp()
+                )
+            )
+            self._notify_group_changed(group_id)
+            return True
+        except Exception as e:
+            logging.error(f"设置组调度时间窗失败: {e}")
+            return False
+
+    async def set_group_priority(self, group_id: int, priority: int) -> bool:
+        """设置组的发送优先级（加权公平队列中的权重）"""
+        try:
+            await self._write(
+                update(forwarding_groups).where(forwarding_groups.c.id == group_id).values(
+                    priority=priority, updated_at=func.current_timestamp()
+                )
+            )
+            self._notify_group_changed(group_id)
+            return True
+        except Exception as e:
+            logging.error(f"设置组优先级失败: {e}")
+            return False
+
+    async def set_group_digest(self, group_id: int, window: int, max_messages: int) -> bool:
+        """设置组的合并发送（时间窗秒数，0为关闭；每条合并消息最多包含的消息数，0为不限）"""
+        try:
+            await self._write(
+                update(forwarding_groups).where(forwarding_groups.c.id == group_id).values(
+                    digest_window=window or None, digest_size=max_messages or None,
+                    updated_at=func.current_timestamp()
+                )
+            )
+            self._notify_group_changed(group_id)
+            return True
+        except Exception as e:
+            logging.error(f"设置组合并发送失败: {e}")
+            return False
+
+    # 频道管理
+    async def add_source_channel(self, group_id: int, channel_id: int, channel_username: str = None, channel_title: str = None) -> bool:
+        """添加源频道"""
+        try:
+            await self._write(insert(source_channels).values(
+                group_id=group_id, channel_id=channel_id,
+                channel_username=channel_username, channel_title=channel_title
+            ))
+            self._notify_group_changed(group_id)
+            return True
+        except Exception as e:
+            logging.error(f"添加源频道失败: {e}")
+            return False
+
+    async def add_target_channel(self, group_id: int, channel_id: int, channel_username: str = None, channel_title: str = None) -> bool:
+        """添加目标频道"""
+        try:
+            await self._write(insert(target_channels).values(
+                group_id=group_id, channel_id=channel_id,
+                channel_username=channel_username, channel_title=channel_title
+            ))
+            self._notify_group_changed(group_id)
+            return True
+        except Exception as e:
+            logging.error(f"添加目标频道失败: {e}")
+            return False
+
+    async def get_group_channels(self, group_id: int) -> Tuple[List[Dict], List[Dict]]:
+        """获取组的源频道和目标频道"""
+        async with self.engine.connect() as conn:
+            source = _records(await conn.execute(
+                select(source_channels).where(and_(
+                    source_channels.c.group_id == group_id, source_channels.c.status == 'active'
+                ))
+            ))
+            target = _records(await conn.execute(
+                select(target_channels).where(and_(
+                    target_channels.c.group_id == group_id, target_channels.c.status == 'active'
+                ))
+            ))
+        return source, target
+
+    async def update_last_message_id(self, group_id: int, channel_id: int, message_id: int) -> bool:
+        """更新最后处理的消息ID"""
+        try:
+            await self._write(
+                update(source_channels).where(and_(
+                    source_channels.c.group_id == group_id, source_channels.c.channel_id == channel_id
+                )).values(last_message_id=message_id)
+            )
+            return True
+        except Exception as e:
+            logging.error(f"更新最后消息ID失败: {e}")
+            return False
+
+    async def update_channel_last_message_id(self, channel_id: int, message_id: int, group_ids: List[int]) -> bool:
+        """一次更新多个组中同一源频道最后处理的消息ID"""
+        if not group_ids:
+            return True
+        try:
+            await self._write(
+                update(source_channels).where(and_(
+                    source_channels.c.channel_id == channel_id, source_channels.c.group_id.in_(list(group_ids))
+                )).values(last_message_id=message_id)
+            )
+            return True
+        except Exception as e:
+            logging.error(f"更新最后消息ID失败: {e}")
+            return False
+
+    # 消息记录
+    async def is_message_forwarded(self, content_hash: str) -> bool:
+        """检查消息是否已转发"""
+        row = await self._fetch_one(
+            select(literal_column('1')).select_from(message_history)
+            .where(message_history.c.content_hash == content_hash).limit(1)
+        )
+        return row is not None
+
+    async def is_delivered(self, target_channel_id: int, content_hash: str) -> bool:
+        """检查内容是否已发送到目标频道"""
+        row = await self._fetch_one(
+            select(literal_column('1')).select_from(message_history)
+            .where(and_(
+                message_history.c.target_channel_id == target_channel_id,
+                message_history.c.content_hash == content_hash
+            )).limit(1)
+        )
+        return row is not None
+
+    async def get_recent_deliveries(self, limit: int) -> List[Tuple[int, str]]:
+        """最近的投递记录 (目标频道, 内容哈希)，按新到旧"""
+        rows = await self._fetch_all(
+            select(message_history.c.target_channel_id, message_history.c.content_hash)
+            .order_by(message_history.c.id.desc()).limit(limit)
+        )
+        return [(row[0], row[1]) for row in rows]
+
+    async def add_message_record(self, group_id: int, source_message_id: int, target_message_id: int,
+                               source_channel_id: int, target_channel_id: int, content_hash: str) -> bool:
+        """添加消息记录"""
+        try:
+            await self._write(insert(message_history).values(
+                group_id=group_id, source_message_id=source_message_id, target_message_id=target_message_id,
+                source_channel_id=source_channel_id, target_channel_id=target_channel_id, content_hash=content_hash
+            ))
+            return True
+        except Exception as e:
+            logging.error(f"添加消息记录失败: {e}")
+            return False
+
+    async def get_message_records_before(self, cutoff_date, limit: int = 10000) -> List[Dict[str, Any]]:
+        """按ID顺序获取早于指定日期的消息记录（用于归档）"""
+        return await self._fetch_all(
+            select(message_history).where(message_history.c.sent_at < cutoff_date)
+            .order_by(message_history.c.id).limit(limit)
+        )
+
+    async def delete_message_records(self, first_id: int, last_id: int, cutoff_date) -> int:
+        """删除已归档的消息记录"""
+        try:
+            return await self._write(
+                delete(message_history).where(and_(
+                    message_history.c.id.between(first_id, last_id),
+                    message_history.c.sent_at < cutoff_date
+                ))
+            )
+        except Exception as e:
+            logging.error(f"删除已归档消息记录失败: {e}")
+            return 0
+
+    # 统计
+    async def update_statistics(self, group_id: int, account_phone: str, success: bool = True) -> bool:
+        """更新统计信息"""
+        try:
+            today = datetime.now().date()
+            match = and_(
+                statistics.c.group_id == group_id,
+                statistics.c.account_phone == account_phone,
+                statistics.c.date == today
+            )
+            counter = statistics.c.success_count if success else statistics.c.error_count
+
+            async with self.engine.begin() as conn:
+                result = await conn.execute(
+                    update(statistics).where(match).values({
+                        statistics.c.message_count: statistics.c.message_count + 1,
+                        counter: counter + 1
+                    })
+                )
+                if result.rowcount == 0:
+                    await conn.execute(insert(statistics).values(
+                        group_id=group_id, account_phone=account_phone, message_count=1,
+                        success_count=1 if success else 0, error_count=0 if success else 1, date=today
+                    ))
+            return True
+        except Exception as e:
+            logging.error(f"更新统计失败: {e}")
+            return False
+
+    async def get_group_statistics(self, group_id: int, days: int = 7) -> List[Dict[str, Any]]:
+        """获取组统计信息"""
+        start_date = (datetime.now() - timedelta(days=days)).date()
+        return await self._fetch_all(
+            select(statistics.c.date, *_statistics_totals())
+            .where(and_(statistics.c.group_id == group_id, statistics.c.date >= start_date))
+            .group_by(statistics.c.date)
+            .order_by(statistics.c.date.desc())
+        )
+
+    async def get_daily_group_statistics(self, day) -> Dict[int, Dict[str, Any]]:
+        """一次查询所有组某一天的统计，返回 组ID -> 统计"""
+        rows = await self._fetch_all(
+            select(statistics.c.group_id, *_statistics_totals())
+            .where(statistics.c.date == day)
+            .group_by(statistics.c.group_id)
+        )
+        return {row['group_id']: dict(row) for row in rows}
+
+    async def get_account_statistics(self, account_phone: str, days: int = 7) -> List[Dict[str, Any]]:
+        """获取账号统计信息"""
+        start_date = (datetime.now() - timedelta(days=days)).date()
+        totals = _statistics_totals()
+        return await self._fetch_all(
+            select(forwarding_groups.c.name.label('group_name'), *totals)
+            .select_from(statistics.outerjoin(forwarding_groups, statistics.c.group_id == forwarding_groups.c.id))
+            .where(and_(statistics.c.account_phone == account_phone, statistics.c.date >= start_date))
+            .group_by(statistics.c.group_id, forwarding_groups.c.name)
+            .order_by(totals[0].desc())
+        )
+
+    # 清理
+    async def cleanup_old_data(self, days: int = 30) -> bool:
+        """清理旧数据"""
+        try:
+            cutoff_date = (datetime.now() - timedelta(days=days)).date()
+            await self._write(
+                delete(message_history).where(message_history.c.sent_at < cutoff_date),
+                delete(statistics).where(statistics.c.date < cutoff_date)
+            )
+            return True
+        except Exception as e:
+            logging.error(f"清理旧数据失败: {e}")
+            return False
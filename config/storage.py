@@ -0,0 +1,311 @@
+"""
+存储后端接口 - 所有模块通过该接口访问数据，不再直接使用底层连接
+"""
+
+import json
+import logging
+from abc import ABC, abstractmethod
+from datetime import date
+from pathlib import Path
+from typing import Callable, List, Dict, Any, Optional, Tuple
+
+from config.query_stats import QueryStats
+from config.records import record_type, replace_field
+
+
+# 全量加载频道时的列（与两张频道表的列顺序一致），查询结果前面多一列角色 'source'/'target'，
+# 目标频道没有 last_message_id（查询中为 NULL）
+SOURCE_CHANNEL_COLUMNS = ('id', 'group_id', 'channel_id', 'channel_username', 'channel_title',
+                          'last_message_id', 'status', 'created_at')
+TARGET_CHANNEL_COLUMNS = ('id', 'group_id', 'channel_id', 'channel_username', 'channel_title',
+                          'status', 'created_at')
+
+
+class StorageBackend(ABC):
+    """存储后端基类
+
+    SQLite 实现见 config.database.Database，
+    SQLAlchemy 异步实现见 config.sqlalchemy_database.SQLAlchemyDatabase。
+    """
+
+    # 本地数据库文件路径，非文件型后端为 None（用于在线备份）
+    db_path: Optional[Path] = None
+
+    def __init__(self, slow_query_ms: float = 100):
+        # 语句级耗时统计
+        self.query_stats = QueryStats(slow_query_ms)
+
+        # 过滤器JSON解析缓存: group_id -> (updated_at, 原始JSON, 解析结果)
+        self._filters_cache: Dict[int, Tuple[Any, Optional[str], Dict[str, Any]]] = {}
+
+        # 搬运组变更回调: callback(group_id)
+        self._group_listeners: List[Callable[[int], None]] = []
+
+    @abstractmethod
+    async def init(self):
+        """初始化连接并创建表"""
+
+    @abstractmethod
+    async def close(self):
+        """关闭连接"""
+
+    def get_query_stats(self, top: int = None) -> Dict[str, Any]:
+        """获取查询统计快照"""
+        return self.query_stats.snapshot(top)
+
+    def _parse_filters(self, row) -> Dict[str, Any]:
+        """解析组过滤器JSON，按 updated_at 和原始文本缓存解析结果"""
+        group_id = row['id']
+        raw = row['filters']
+        updated_at = row['updated_at']
+
+        cached = self._filters_cache.get(group_id)
+        if cached is not None and cached[0] == updated_at and cached[1] == raw:
+            return cached[2]
+
+        filters = {}
+        if raw:
+            try:
+                filters = json.loads(raw)
+            except:
+                filters = {}
+
+        self._filters_cache[group_id] = (updated_at, raw, filters)
+        return filters
+
+    def _decode_group(self, row):
+        """把 filters 字段替换为解析后的字典（该字典为共享缓存，修改前需复制）"""
+        return replace_field(row, 'filters', self._parse_filters(row))
+
+    def add_group_listener(self, callback: Callable[[int], None]):
+        """注册搬运组变更回调，组配置或频道写入成功后以组ID调用"""
+        if callback not in self._group_listeners:
+            self._group_listeners.append(callback)
+
+    def remove_group_listener(self, callback: Callable[[int], None]):
+        """移除搬运组变更回调"""
+        if callback in self._group_listeners:
+            self._group_listeners.remove(callback)
+
+    def _notify_group_changed(self, group_id: int):
+        for callback in list(self._group_listeners):
+            try:
+                callback(group_id)
+            except Exception as e:
+                logging.error(f"搬运组变更回调失败: {e}")
+
+    @staticmethod
+    def _split_channel_rows(rows) -> Dict[int, Tuple[List, List]]:
+        """把 (角色, 源频道列...) 行按组拆分为源频道和目标频道记录（与 get_group_channels 的记录相同）"""
+        source_type = record_type(SOURCE_CHANNEL_COLUMNS)
+        target_type = record_type(TARGET_CHANNEL_COLUMNS)
+        new = tuple.__new__
+        channels: Dict[int, Tuple[List, List]] = {}
+        for row in rows:
+            group_id = row[2]
+            entry = channels.get(group_id)
+            if entry is None:
+                entry = channels[group_id] = ([], [])
+            if row[0] == 'source':
+                entry[0].append(new(source_type, row[1:]))
+            else:
+                entry[1].append(new(target_type, row[1:6] + row[7:]))
+        return channels
+
+    # API池管理
+    @abstractmethod
+    async def add_api(self, app_id: str, app_hash: str, max_accounts: int = 3) -> bool:
+        """添加API ID到池中"""
+
+    @abstractmethod
+    async def remove_api(self, app_id: str) -> bool:
+        """从池中删除API ID"""
+
+    @abstractmethod
+    async def get_available_api(self) -> Optional[Dict[str, Any]]:
+        """获取可用的API ID"""
+
+    @abstractmethod
+    async def assign_api_to_account(self, app_id: str, phone: str) -> bool:
+        """将API分配给账号"""
+
+    @abstractmethod
+    async def release_api_from_account(self, phone: str) -> bool:
+        """释放账号的API"""
+
+    @abstractmethod
+    async def get_api_pool_status(self) -> List[Dict[str, Any]]:
+        """获取API池状态（含已分配账号列表）"""
+
+    @abstractmethod
+    async def get_api_status(self, app_id: str) -> Optional[Dict[str, Any]]:
+        """获取指定API状态（含已分配账号列表）"""
+
+    @abstractmethod
+    async def get_account_api(self, phone: str) -> Optional[Dict[str, Any]]:
+        """获取账号分配的API"""
+
+    @abstractmethod
+    async def apply_api_assignments(self, assignments: Dict[str, List[str]]) -> bool:
+        """按 app_id -> 账号列表 重新分配API并重算使用计数（单个事务）"""
+
+    # 账号管理
+    @abstractmethod
+    async def add_listener_account(self, phone: str, user_id: int = None, username: str = None) -> bool:
+        """添加监听账号"""
+
+    @abstractmethod
+    async def get_listener_accounts(self, status: str = 'active') -> List[Dict[str, Any]]:
+        """获取监听账号列表"""
+
+    @abstractmethod
+    async def update_account_status(self, phone: str, status: str, error_count: int = None) -> bool:
+        """更新账号状态"""
+
+    @abstractmethod
+    async def delete_listener_account(self, phone: str) -> bool:
+        """删除监听账号"""
+
+    # 发送Bot管理
+    @abstractmethod
+    async def get_sender_bots(self, status: str = 'active') -> List[Dict[str, Any]]:
+        """获取发送Bot列表"""
+
+    @abstractmethod
+    async def add_sender_bot(self, token: str, username: str = None) -> bool:
+        """添加发送Bot"""
+
+    @abstractmethod
+    async def update_bot_error_count(self, token: str, error_count: int) -> bool:
+        """更新Bot错误次数"""
+
+    # 搬运组管理
+    @abstractmethod
+    async def create_forwarding_group(self, name: str, description: str = None) -> Optional[int]:
+        """创建搬运组"""
+
+    @abstractmethod
+    async def get_forwarding_groups(self) -> List[Dict[str, Any]]:
+        """获取所有搬运组"""
+
+    @abstractmethod
+    async def get_groups_with_channels(self) -> List[Tuple[Dict[str, Any], List[Dict], List[Dict]]]:
+        """获取所有搬运组及其活跃源/目标频道（查询次数固定，不随组数增长）"""
+
+    @abstractmethod
+    async def get_forwarding_group(self, group_id: int) -> Optional[Dict[str, Any]]:
+        """获取单个搬运组"""
+
+    @abstractmethod
+    async def update_group_filters(self, group_id: int, filters: Dict[str, Any]) -> bool:
+        """更新组过滤器"""
+
+    @abstractmethod
+    async def update_group_status(self, group_id: int, status: str) -> bool:
+        """更新组状态"""
+
+    @abstractmethod
+    async def set_group_schedule(self, group_id: int, start_time: str, end_time: str) -> bool:
+        """设置组调度（单个时间窗，清除多时间窗设置）"""
+
+    @abstractmethod
+    async def set_group_windows(self, group_id: int, windows: List[Tuple[str, str]], timezone: str = None) -> bool:
+        """设置组的多个调度时间窗和时区（schedule_start/end 同步为第一个时间窗）"""
+
+    @abstractmethod
+    async def set_group_priority(self, group_id: int, priority: int) -> bool:
+        """设置组的发送优先级（加权公平队列中的权重）"""
+
+    @abstractmethod
+    async def set_group_digest(self, group_id: int, window: int, max_messages: int) -> bool:
+        """设置组的合并发送（时间窗秒数，0为关闭；每条合并消息最多包含的消息数，0为不限）"""
+
+    # 频道管理
+    @abstractmethod
+    async def add_source_channel(self, group_id: int, channel_id: int, channel_username: str = None, channel_title: str = None) -> bool:
+        """添加源频道"""
+
+    @abstractmethod
+    async def add_target_channel(self, group_id: int, channel_id: int, channel_username: str = None, channel_title: str = None) -> bool:
+        """添加目标频道"""
+
+    @abstractmethod
+    async def get_group_channels(self, group_id: int) -> Tuple[List[Dict], List[Dict]]:
+        """获取组的源频道和目标频道"""
+
+    @abstractmethod
+    async def update_last_message_id(self, group_id: int, channel_id: int, message_id: int) -> bool:
+        """更新最后处理的消息ID"""
+
+    @abstractmethod
+    async def update_channel_last_message_id(self, channel_id: int, message_id: int, group_ids: List[int]) -> bool:
+        """一次更新多个组中同一源频道最后处理的消息ID"""
+
+    # 消息记录
+    @abstractmethod
+    async def is_message_forwarded(self, content_hash: str) -> bool:
+        """检查消息是否已转发"""
+
+    @abstractmethod
+    async def is_delivered(self, target_channel_id: int, content_hash: str) -> bool:
+        """检查内容是否已发送到目标频道"""
+
+    @abstractmethod
+    async def get_recent_deliveries(self, limit: int) -> List[Tuple[int, str]]:
+        """最近的投递记录 (目标频道, 内容哈希)，按新到旧"""
+
+    @abstractmethod
+    async def add_message_record(self, group_id: int, source_message_id: int, target_message_id: int,
+                               source_channel_id: int, target_channel_id: int, content_hash: str) -> bool:
+        """添加消息记录"""
+
+    @abstractmethod
+    async def get_message_records_before(self, cutoff_date: date, limit: int = 10000) -> List[Dict[str, Any]]:
+        """按ID顺序获取早于指定日期的消息记录（用于归档）"""
+
+    @abstractmethod
+    async def delete_message_records(self, first_id: int, last_id: int, cutoff_date: date) -> int:
+        """删除已归档的消息记录"""
+
+    # 统计
+    @abstractmethod
+    async def update_statistics(self, group_id: int, account_phone: str, success: bool = True) -> bool:
+        """更新统计信息"""
+
+    @abstractmethod
+    async def get_group_statistics(self, group_id: int, days: int = 7) -> List[Dict[str, Any]]:
+        """获取组统计信息"""
+
+    @abstractmethod
+    async def get_daily_group_statistics(self, day: date) -> Dict[int, Dict[str, Any]]:
+        """一次查询所有组某一天的统计，返回 组ID -> 统计"""
+
+    @abstractmethod
+    async def get_account_statistics(self, account_phone: str, days: int = 7) -> List[Dict[str, Any]]:
+        """获取账号统计信息"""
+
+    # 清理
+    @abstractmethod
+    async def cleanup_old_data(self, days: int = 30) -> bool:
+        """清理旧数据"""
+
+
+def create_database(settings) -> StorageBackend:
+    """根据 DATABASE_URL 创建存储后端
+
+    sqlite:///path 使用内置的 aiosqlite 实现；
+    其它 URL（如 postgresql+asyncpg://、mysql+aiomysql://、sqlite+aiosqlite://）使用 SQLAlchemy 实现。
+    """
+    url = settings.database_url
+
+    if url.startswith('sqlite:///'):
+        from config.database import Database
+        return Database(url[len('sqlite:///'):], slow_query_ms=settings.slow_query_ms)
+
+    from config.sqlalchemy_database import SQLAlchemyDatabase
+    return SQLAlchemyDatabase(
+        url,
+        slow_query_ms=settings.slow_query_ms,
+        pool_size=settings.database_pool_size,
+        echo=settings.database_echo
+    )
@@ -302,12 +302,8 @@ class AccountManager:
             await self.api_pool_manager.release_api_from_account(phone)
             
             # 从数据库删除
-            await self.database._connection.execute(
-                'DELETE FROM listener_accounts WHERE phone = ?',
-                (phone,)
-            )
-            await self.database._connection.commit()
-            
+            await self.database.delete_listener_account(phone)
+
             # 删除会话文件
             session_file = Path(f"sessions/{phone}.session")
             if session_file.exists():
@@ -443,7 +439,7 @@ class AccountManager:
     async def get_account_list(self) -> List[Dict[str, Any]]:
         """获取账号列表"""
         try:
-            accounts = await self.database.get_listener_accounts()
+            accounts = [dict(account) for account in await self.database.get_listener_accounts()]
             
             # 添加实时状态信息
             for account in accounts:
@@ -74,11 +74,8 @@ class APIPoolManager:
                     return False
                 
                 # 从数据库删除
-                await self.database._connection.execute(
-                    'DELETE FROM api_pool WHERE app_id = ?',
-                    (app_id,)
-                )
-                await self.database._connection.commit()
+                if not await self.database.remove_api(app_id):
+                    return False
                 
                 self.logger.info(f"✅ 成功移除API ID: {app_id}")
                 return True
@@ -153,14 +150,7 @@ class APIPoolManager:
     async def get_account_api(self, phone: str) -> Optional[Dict[str, Any]]:
         """获取账号分配的API"""
         try:
-            cursor = await self.database._connection.execute('''
-                SELECT ap.* FROM api_pool ap
-                JOIN listener_accounts la ON ap.app_id = la.api_id
-                WHERE la.phone = ?
-            ''', (phone,))
-            
-            row = await cursor.fetchone()
-            return dict(row) if row else None
+            return await self.database.get_account_api(phone)
             
         except Exception as e:
             self.logger.error(f"❌ 获取账号API异常: {e}")
@@ -169,22 +159,7 @@ class APIPoolManager:
     async def get_api_status(self, app_id: str) -> Optional[Dict[str, Any]]:
         """获取指定API状态"""
         try:
-            cursor = await self.database._connection.execute('''
-                SELECT 
-                    ap.*,
-                    GROUP_CONCAT(la.phone) as assigned_accounts
-                FROM api_pool ap
-                LEFT JOIN listener_accounts la ON ap.app_id = la.api_id
-                WHERE ap.app_id = ?
-                GROUP BY ap.id
-            ''', (app_id,))
-            
-            row = await cursor.fetchone()
-            if row:
-                data = dict(row)
-                data['assigned_accounts'] = data['assigned_accounts'].split(',') if data['assigned_accounts'] else []
-                return data
-            return None
+            return await self.database.get_api_status(app_id)
             
         except Exception as e:
             self.logger.error(f"❌ 获取API状态异常: {e}")
@@ -218,39 +193,24 @@ class APIPoolManager:
                 extra_accounts = total_accounts % len(apis)
                 
                 # 重新分配
+                assignments = {}
                 account_index = 0
                 for i, api in enumerate(apis):
                     # 计算这个API应该分配的账号数
                     target_count = accounts_per_api + (1 if i < extra_accounts else 0)
-                    
-                    # 清除当前分配
-                    await self.database._connection.execute(
-                        'UPDATE listener_accounts SET api_id = NULL WHERE api_id = ?',
-                        (api['app_id'],)
-                    )
-                    
-                    # 重新分配账号
+
+                    phones = []
                     for j in range(target_count):
                         if account_index < total_accounts:
-                            account = accounts[account_index]
-                            await self.database.assign_api_to_account(api['app_id'], account['phone'])
+                            phones.append(accounts[account_index]['phone'])
                             account_index += 1
-                
-                # 更新API使用计数
-                for api in apis:
-                    cursor = await self.database._connection.execute(
-                        'SELECT COUNT(*) as count FROM listener_accounts WHERE api_id = ?',
-                        (api['app_id'],)
-                    )
-                    row = await cursor.fetchone()
-                    count = row['count'] if row else 0
-                    
-                    await self.database._connection.execute(
-                        'UPDATE api_pool SET current_accounts = ?, updated_at = CURRENT_TIMESTAMP WHERE app_id = ?',
-                        (count, api['app_id'])
-                    )
-                
-                await self.database._connection.commit()
+                    assignments[api['app_id']] = phones
+
+                # 写入新分配并更新API使用计数
+                if not await self.database.apply_api_assignments(assignments):
+                    self.logger.error("❌ API重新平衡写入失败")
+                    return False
+
                 self.logger.info("✅ API重新平衡完成")
                 return True
                 
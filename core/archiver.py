@@ -0,0 +1,343 @@
+"""
+消息历史归档器 - 将过期的 message_history 记录移入压缩的只追加分段文件
+"""
+
+import asyncio
+import base64
+import gzip
+import hashlib
+import io
+import json
+import logging
+import math
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Any, Optional, Iterator
+
+
+# 分段文件中每行记录的字段顺序
+ARCHIVE_FIELDS = (
+    'id', 'group_id', 'source_message_id', 'target_message_id',
+    'source_channel_id', 'target_channel_id', 'content_hash', 'status', 'sent_at'
+)
+
+
+class BloomFilter:
+    """content_hash 布隆过滤器（双重哈希）"""
+
+    def __init__(self, size_bits: int, hash_count: int, bits: bytearray = None):
+        self.size_bits = max(size_bits, 8)
+        self.hash_count = max(hash_count, 1)
+        self.bits = bits if bits is not None else bytearray((self.size_bits + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, capacity: int, error_rate: float = 0.01) -> 'BloomFilter':
+        """按预期元素数量和误判率创建"""
+        capacity = max(capacity, 1)
+        size_bits = int(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+        hash_count = int(round(size_bits / capacity * math.log(2)))
+        return cls(size_bits, hash_count)
+
+    def _positions(self, value: str):
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size_bits
+
+    def add(self, value: str):
+        for pos in self._positions(value):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, value: str) -> bool:
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(value))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'size_bits': self.size_bits,
+            'hash_count': self.hash_count,
+            'bits': base64.b64encode(bytes(self.bits)).decode('ascii')
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'BloomFilter':
+        return cls(data['size_bits'], data['hash_count'], bytearray(base64.b64decode(data['bits'])))
+
+
+class ArchiveSegment:
+    """单个归档分段: 数据文件 + 稀疏索引"""
+
+    def __init__(self, data_path: Path, index: Dict[str, Any]):
+        self.data_path = data_path
+        self.index = index
+        self.bloom = BloomFilter.from_dict(index['bloom'])
+
+    @property
+    def name(self) -> str:
+        return self.data_path.name
+
+    def might_contain(self, content_hash: str) -> bool:
+        return content_hash in self.bloom
+
+    def iter_rows(self, since: str = None, until: str = None, group_id: int = None) -> Iterator[Dict[str, Any]]:
+        """按条件读取记录，利用块级稀疏索引跳过无关的块"""
+        with open(self.data_path, 'rb') as f:
+            for block in self.index['blocks']:
+                if since and block['last_sent_at'] < since:
+                    continue
+                if until and block['first_sent_at'] > until:
+                    continue
+                if group_id is not None and group_id not in block['group_ids']:
+                    continue
+
+                f.seek(block['offset'])
+                raw = gzip.decompress(f.read(block['length']))
+                for line in raw.splitlines():
+                    row = dict(zip(ARCHIVE_FIELDS, json.loads(line)))
+                    if since and row['sent_at'] < since:
+                        continue
+                    if until and row['sent_at'] > until:
+                        continue
+                    if group_id is not None and row['group_id'] != group_id:
+                        continue
+                    yield row
+
+    def contains(self, content_hash: str) -> bool:
+        """精确检查（先查布隆过滤器，命中后扫描数据块确认）"""
+        if not self.might_contain(content_hash):
+            return False
+        return any(row['content_hash'] == content_hash for row in self.iter_rows())
+
+
+class MessageArchiver:
+    """消息历史冷归档管理器"""
+
+    def __init__(self, settings, database):
+        self.settings = settings
+        self.database = database
+        self.logger = logging.getLogger(__name__)
+
+        self.archive_dir = Path(settings.archive_dir)
+        self.segments: List[ArchiveSegment] = []
+
+        # 已确认存在于归档中的哈希（避免重复扫描分段）
+        self._confirmed_hashes: Dict[str, str] = {}
+        self._lock = asyncio.Lock()
+
+        self.is_running = False
+
+    async def start(self):
+        """加载已有分段索引"""
+        self.logger.info("🔄 启动消息归档器...")
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+
+        loop = asyncio.get_running_loop()
+        self.segments = await loop.run_in_executor(None, self._load_segments)
+
+        self.is_running = True
+        self.logger.info(f"✅ 消息归档器启动完成，已加载 {len(self.segments)} 个归档分段")
+
+    async def stop(self):
+        """停止归档器"""
+        self.is_running = False
+        self.segments.clear()
+        self._confirmed_hashes.clear()
+        self.logger.info("✅ 消息归档器已停止")
+
+    def _load_segments(self) -> List[ArchiveSegment]:
+        """读取归档目录下所有完整的分段（索引文件最后写入，缺索引的分段视为未完成）"""
+        segments = []
+        for index_file in sorted(self.archive_dir.glob('message_history_*.idx.json')):
+            data_file = index_file.with_name(index_file.name.replace('.idx.json', '.jsonl.gz'))
+            if not data_file.exists():
+                self.logger.warning(f"⚠️ 归档分段缺少数据文件: {data_file}")
+                continue
+            try:
+                with open(index_file, 'r', encoding='utf-8') as f:
+                    segments.append(ArchiveSegment(data_file, json.load(f)))
+            except Exception as e:
+                self.logger.error(f"❌ 加载归档索引失败 {index_file}: {e}")
+        return segments
+
+    async def archive_old_messages(self, days: int = None) -> int:
+        """把超过指定天数的消息记录移入归档，返回归档条数"""
+        days = days if days is not None else self.settings.archive_after_days
+        cutoff = (datetime.now() - timedelta(days=days)).date()
+        batch_size = self.settings.archive_batch_size
+        loop = asyncio.get_running_loop()
+        total = 0
+
+        async with self._lock:
+            try:
+                while True:
+                    rows = await self.database.get_message_records_before(cutoff, batch_size)
+                    if not rows:
+                        break
+
+                    # 先写入并落盘分段，再从数据库删除
+                    segment = await loop.run_in_executor(None, self._write_segment, rows)
+                    deleted = await self.database.delete_message_records(
+                        rows[0]['id'], rows[-1]['id'], cutoff
+                    )
+                    if deleted == 0:
+                        # 一条都没删掉：撤销分段，记录仍在数据库中，避免下一轮重复归档同一批
+                        await loop.run_in_executor(None, self._remove_segment, segment)
+                        self.logger.error(f"❌ 删除已归档记录失败，撤销分段 {segment.name} 并停止归档")
+                        break
+
+                    # 删除已提交后才登记分段
+                    self.segments.append(segment)
+                    total += deleted
+                    if deleted != len(rows):
+                        self.logger.error(
+                            f"❌ 归档分段 {segment.name} 写入 {len(rows)} 条，但只删除了 {deleted} 条，停止归档"
+                        )
+                        break
+
+                    self.logger.info(f"📦 归档消息记录 {len(rows)} 条 -> {segment.name} (删除 {deleted} 条)")
+
+                    if len(rows) < batch_size:
+                        break
+
+                if total:
+                    self.logger.info(f"✅ 消息归档完成，共归档 {total} 条记录")
+                return total
+
+            except Exception as e:
+                self.logger.error(f"❌ 归档消息记录失败: {e}")
+                return total
+
+    def _write_segment(self, rows: List[Dict[str, Any]]) -> ArchiveSegment:
+        """写入一个只追加分段: 每个块为独立的gzip成员，便于按偏移定位"""
+        block_rows = self.settings.archive_block_rows
+        first_id, last_id = rows[0]['id'], rows[-1]['id']
+        base_name = f"message_history_{first_id:012d}_{last_id:012d}"
+        data_path = self.archive_dir / f"{base_name}.jsonl.gz"
+        index_path = self.archive_dir / f"{base_name}.idx.json"
+
+        bloom = BloomFilter.for_capacity(len(rows), self.settings.archive_bloom_error_rate)
+        blocks = []
+        offset = 0
+
+        tmp_path = data_path.with_name(data_path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            for start in range(0, len(rows), block_rows):
+                chunk = rows[start:start + block_rows]
+                buffer = io.StringIO()
+                for row in chunk:
+                    buffer.write(json.dumps([row[field] for field in ARCHIVE_FIELDS], ensure_ascii=False, default=str))
+                    buffer.write('\n')
+                    if row['content_hash']:
+                        bloom.add(row['content_hash'])
+
+                payload = gzip.compress(buffer.getvalue().encode('utf-8'), compresslevel=6)
+                f.write(payload)
+
+                sent_times = [str(row['sent_at']) for row in chunk]
+                blocks.append({
+                    'offset': offset,
+                    'length': len(payload),
+                    'rows': len(chunk),
+                    'first_id': chunk[0]['id'],
+                    'last_id': chunk[-1]['id'],
+                    'first_sent_at': min(sent_times),
+                    'last_sent_at': max(sent_times),
+                    'group_ids': sorted({row['group_id'] for row in chunk})
+                })
+                offset += len(payload)
+
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, data_path)
+
+        index = {
+            'version': 1,
+            'fields': list(ARCHIVE_FIELDS),
+            'rows': len(rows),
+            'min_id': first_id,
+            'max_id': last_id,
+            'min_sent_at': min(block['first_sent_at'] for block in blocks),
+            'max_sent_at': max(block['last_sent_at'] for block in blocks),
+            'created_at': datetime.now().isoformat(),
+            'blocks': blocks,
+            'bloom': bloom.to_dict()
+        }
+
+        tmp_index = index_path.with_name(index_path.name + '.tmp')
+        with open(tmp_index, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_index, index_path)
+
+        return ArchiveSegment(data_path, index)
+
+    def _remove_segment(self, segment: ArchiveSegment):
+        """删除未登记的分段文件（先删索引，缺索引的分段不会被加载）"""
+        index_path = segment.data_path.with_name(segment.data_path.name.replace('.jsonl.gz', '.idx.json'))
+        for path in (index_path, segment.data_path):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def might_contain(self, content_hash: str) -> bool:
+        """仅查布隆过滤器，可能误判为存在"""
+        return any(segment.might_contain(content_hash) for segment in self.segments)
+
+    async def contains(self, content_hash: str) -> bool:
+        """检查归档中是否存在该内容哈希（布隆过滤器命中时才读取分段确认）"""
+        if content_hash in self._confirmed_hashes:
+            return True
+
+        candidates = [segment for segment in self.segments if segment.might_contain(content_hash)]
+        if not candidates:
+            return False
+
+        loop = asyncio.get_running_loop()
+        for segment in candidates:
+            found = await loop.run_in_executor(None, segment.contains, content_hash)
+            if found:
+                if len(self._confirmed_hashes) >= 10000:
+                    self._confirmed_hashes.pop(next(iter(self._confirmed_hashes)))
+                self._confirmed_hashes[content_hash] = segment.name
+                return True
+        return False
+
+    async def query(self, since: str = None, until: str = None, group_id: int = None,
+                    limit: int = 1000) -> List[Dict[str, Any]]:
+        """查询归档记录"""
+        def _run():
+            results = []
+            for segment in self.segments:
+                index = segment.index
+                if since and index['max_sent_at'] < since:
+                    continue
+                if until and index['min_sent_at'] > until:
+                    continue
+                for row in segment.iter_rows(since, until, group_id):
+                    results.append(row)
+                    if len(results) >= limit:
+                        return results
+            return results
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, _run)
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """获取归档统计"""
+        total_bytes = 0
+        for segment in self.segments:
+            try:
+                total_bytes += segment.data_path.stat().st_size
+            except OSError:
+                pass
+
+        return {
+            'segments': len(self.segments),
+            'rows': sum(segment.index['rows'] for segment in self.segments),
+            'bytes': total_bytes,
+            'is_running': self.is_running
+        }
@@ -4,26 +4,73 @@
 
 import asyncio
 import logging
-from typing import Dict, List, Any, Optional
-from datetime import datetime, time as dt_time
+import math
+import time
+from typing import Callable, Dict, List, Any, Optional, Sequence, Set, Tuple
+from datetime import datetime
 
+from core.pipeline import DispatchStage, FilterStage, GroupStateStage, MessageContext, Pipeline
+from utils.delivery_index import DeliveryIndex
+from utils.digest import pack_digest
+from utils.entities import get_raw_text
 from utils.filters import MessageFilter
+from utils.regex_guard import check_regex
+from utils.schedule import ScheduleTable, get_timezone, parse_window_list
 
 
 class GroupProcessor:
     """搬运组处理器"""
     
-    def __init__(self, settings, database):
+    # 组优先级上限（加权公平发送队列的权重）
+    MAX_PRIORITY = 100
+    
+    # 合并发送时间窗上限（秒）
+    MAX_DIGEST_WINDOW = 3600
+    
+    def __init__(self, settings, database, group_filter: Optional[Callable[[int], bool]] = None):
         self.settings = settings
         self.database = database
         self.logger = logging.getLogger(__name__)
         
+        # 只加载满足条件的组（多进程分片时每个工作进程只持有自己分片的组）
+        self.group_filter = group_filter
+        
         # 过滤器
         self.message_filter = MessageFilter(settings)
         
-        # 组状态缓存
+        # 组状态缓存: 数据库变更通知只刷新受影响的组，后台任务定期全量校准，消息处理路径只读缓存
         self.group_cache: Dict[int, Dict] = {}
         self.cache_update_time = 0
+        self._pending_refresh: Set[int] = set()
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._reload_task: Optional[asyncio.Task] = None
+        # 全量加载期间发生变更的组（加载完成后单独刷新，避免被加载前的快照覆盖）
+        self._changed_during_load: Optional[Set[int]] = None
+        
+        # 源频道 -> 监听该频道的组ID（随组缓存更新，同一条消息一次分发给所有组）
+        self.channel_groups: Dict[int, Tuple[int, ...]] = {}
+        
+        # 目标频道投递索引（多个组共用目标频道时同一内容只发送一次）
+        self.delivery_index = DeliveryIndex(database, settings.delivery_index_size)
+        
+        # 合并发送缓冲区: 组ID -> [(过滤后文本, 内容哈希, 源消息ID)]，以及到期发送的定时任务
+        self._digests: Dict[int, List[Tuple[str, str, int]]] = {}
+        self._digest_timers: Dict[int, asyncio.Task] = {}
+        
+        # 今日统计（所有组一次查询，短时间缓存）: (过期时间, 日期, 组ID -> 统计)
+        self._today_stats: Optional[Tuple[float, Any, Dict[int, Dict]]] = None
+        
+        # 调度时间窗（随组缓存更新，消息路径上查表判断）
+        self.schedule_table = ScheduleTable(settings.schedule_timezone)
+        
+        # 消息处理流水线: 组状态/调度 -> 过滤 -> 发送，可增删阶段，记录各阶段耗时和丢弃原因
+        self.pipeline = Pipeline(
+            [GroupStateStage(self), FilterStage(self), DispatchStage(self)],
+            trace_size=settings.pipeline_trace_size
+        )
+        
+        # 正则规则重新启用的通知（多进程分片时转发给工作进程）
+        self._regex_listeners: List[Callable[[Optional[str]], None]] = []
         
         # 运行状态
         self.is_running = False
@@ -32,10 +79,17 @@ class GroupProcessor:
         """启动组处理器"""
         self.logger.info("🔄 启动组处理器...")
         
-        # 加载组配置
+        # 加载组配置，之后由变更通知增量更新
+        self.database.add_group_listener(self._on_group_changed)
         await self._load_groups()
+        await self.delivery_index.load()
         
         self.is_running = True
+        
+        interval = self.settings.group_refresh_interval
+        if interval > 0:
+            self._reload_task = asyncio.create_task(self._reload_loop(interval))
+        
         self.logger.info("✅ 组处理器启动完成")
 
     async def stop(self):
@@ -43,130 +97,215 @@ class GroupProcessor:
         self.logger.info("🛑 停止组处理器...")
         self.is_running = False
         
+        self.database.remove_group_listener(self._on_group_changed)
+        for task in (self._reload_task, self._refresh_task):
+            if task and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._reload_task = self._refresh_task = None
+        self._pending_refresh.clear()
+        
+        # 发出缓冲中的合并消息
+        for group_id in list(self._digests):
+            await self._flush_digest(group_id)
+        
+        self.message_filter.shutdown()
         self.group_cache.clear()
+        self.channel_groups.clear()
         self.logger.info("✅ 组处理器已停止")
 
     async def _load_groups(self):
-        """加载组配置"""
+        """全量加载组配置（组和频道各一次查询），加载完成后整体替换缓存"""
+        changed = self._changed_during_load = set()
         try:
-            groups = await self.database.get_forwarding_groups()
-            
-            for group in groups:
-                group_id = group['id']
-                
-                # 获取组的频道
-                source_channels, target_channels = await self.database.get_group_channels(group_id)
-                
-                self.group_cache[group_id] = {
+            rows = await self.database.get_groups_with_channels()
+            
+            group_cache = {}
+            schedule_table = ScheduleTable(self.schedule_table.default_timezone)
+            for group, source_channels, target_channels in rows:
+                if self.group_filter and not self.group_filter(group['id']):
+                    continue
+                group_cache[group['id']] = {
                     'config': group,
                     'source_channels': source_channels,
                     'target_channels': target_channels
                 }
+                schedule_table.set_group(group['id'], group)
+            self.group_cache = group_cache
+            self.channel_groups = self._build_channel_index(group_cache)
+            self.schedule_table = schedule_table
             
             self.cache_update_time = datetime.now().timestamp()
             self.logger.info(f"📋 加载 {len(self.group_cache)} 个搬运组")
             
         except Exception as e:
             self.logger.error(f"❌ 加载组配置失败: {e}")
+        finally:
+            self._changed_during_load = None
+        
+        for group_id in changed:
+            await self._refresh_group(group_id)
 
-    async def process_message(self, group_id: int, message, content_hash: str):
-        """处理单条消息"""
+    async def _refresh_group(self, group_id: int):
+        """只重新加载单个组的配置和频道"""
+        self._pending_refresh.discard(group_id)
+        if self.group_filter and not self.group_filter(group_id):
+            return
         try:
-            # 检查组是否激活且在调度时间内
-            if not await self._should_process_group(group_id):
-                return
-            
-            # 获取组配置
-            group_data = await self._get_group_data(group_id)
-            if not group_data:
-                return
-            
-            # 过滤消息
-            filtered_content = await self._filter_message(group_data, message)
-            if not filtered_content:
-                self.logger.debug(f"📋 消息被过滤，跳过: {message.id}")
+            group = await self.database.get_forwarding_group(group_id)
+            if group is None:
+                old = self.group_cache.pop(group_id, None)
+                if old:
+                    self._reindex_group(group_id, old['source_channels'], [])
+                self.schedule_table.remove_group(group_id)
                 return
             
-            # 发送到目标频道
-            await self._send_to_targets(group_data, filtered_content, content_hash, message.id)
+            source_channels, target_channels = await self.database.get_group_channels(group_id)
+            old = self.group_cache.get(group_id)
+            self._reindex_group(group_id, old['source_channels'] if old else [], source_channels)
+            self.group_cache[group_id] = {
+                'config': group,
+                'source_channels': source_channels,
+                'target_channels': target_channels
+            }
+            self.schedule_table.set_group(group_id, group)
+            self.logger.debug(f"📋 刷新搬运组缓存: {group_id}")
             
         except Exception as e:
-            self.logger.error(f"❌ 处理消息失败: {e}")
+            self.logger.error(f"❌ 刷新搬运组 {group_id} 失败: {e}")
 
-    async def process_media_group(self, group_id: int, messages: List[Dict], content_hash: str):
-        """处理媒体组消息"""
+    @staticmethod
+    def _build_channel_index(group_cache: Dict[int, Dict]) -> Dict[int, Tuple[int, ...]]:
+        """由组缓存建立 源频道 -> 组ID 索引"""
+        index: Dict[int, List[int]] = {}
+        for group_id, group_data in group_cache.items():
+            for channel in group_data['source_channels']:
+                index.setdefault(channel['channel_id'], []).append(group_id)
+        return {channel_id: tuple(group_ids) for channel_id, group_ids in index.items()}
+
+    def _reindex_group(self, group_id: int, old_sources: List[Dict], new_sources: List[Dict]):
+        """组的源频道变化时更新频道索引"""
+        index = self.channel_groups
+        old_ids = {channel['channel_id'] for channel in old_sources}
+        new_ids = {channel['channel_id'] for channel in new_sources}
+        
+        for channel_id in old_ids - new_ids:
+            remaining = tuple(gid for gid in index.get(channel_id, ()) if gid != group_id)
+            if remaining:
+                index[channel_id] = remaining
+            else:
+                index.pop(channel_id, None)
+        
+        for channel_id in new_ids - old_ids:
+            group_ids = index.get(channel_id, ())
+            if group_id not in group_ids:
+                index[channel_id] = group_ids + (group_id,)
+
+    def get_channel_groups(self, channel_id: int) -> Tuple[int, ...]:
+        """监听该源频道的组ID（含未激活的组，处理时再按状态和时间窗筛选）"""
+        return self.channel_groups.get(channel_id, ())
+
+    def _on_group_changed(self, group_id: int):
+        """数据库变更通知: 在后台刷新该组，不阻塞调用方"""
+        if self._changed_during_load is not None:
+            self._changed_during_load.add(group_id)
+        self._pending_refresh.add(group_id)
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._drain_refreshes())
+
+    async def _drain_refreshes(self):
+        """依次刷新待更新的组"""
+        while self._pending_refresh:
+            await self._refresh_group(self._pending_refresh.pop())
+
+    async def _wait_for_refresh(self):
+        """等待变更通知触发的后台刷新完成（本进程的写入也经由通知刷新，不再单独读库）"""
+        task = self._refresh_task
+        if task is not None and not task.done():
+            await asyncio.wait({task})
+
+    async def _reload_loop(self, interval: int):
+        """后台定期全量校准缓存（兜底其它进程直接写库的变更）"""
+        while self.is_running:
+            try:
+                await asyncio.sleep(interval)
+                await self._load_groups()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                self.logger.error(f"❌ 组缓存校准异常: {e}")
+
+    async def process_message(self, group_id: int, message, content_hash: str):
+        """处理单条消息（经过流水线: 组状态/调度 -> 过滤 -> 发送）"""
         try:
-            # 检查组是否激活且在调度时间内
-            if not await self._should_process_group(group_id):
-                return
-            
-            # 获取组配置
-            group_data = await self._get_group_data(group_id)
-            if not group_data:
-                return
-            
-            # 过滤媒体组
-            filtered_media = await self._filter_media_group(group_data, messages)
-            if not filtered_media:
-                self.logger.debug(f"📋 媒体组被过滤，跳过")
-                return
-            
-            # 发送到目标频道
-            source_message_id = messages[0]['message'].id
-            await self._send_media_group_to_targets(group_data, filtered_media, content_hash, source_message_id)
+            await self.pipeline.run(MessageContext(group_id, message, content_hash))
             
         except Exception as e:
-            self.logger.error(f"❌ 处理媒体组失败: {e}")
+            self.logger.error(f"❌ 处理消息失败: {e}")
+
+    async def process_source_message(self, source, group_ids: Optional[Sequence[int]] = None) -> int:
+        """把一条源消息分发给监听该频道的全部组，返回发送的组数
+
+        哈希、媒体信息和实体解析已在 source 中完成（每条消息一次），这里只按各组的过滤计划过滤和发送。
+        """
+        if group_ids is None:
+            group_ids = self.get_channel_groups(source.channel_id)
+        
+        sent_count = 0
+        for group_id in group_ids:
+            try:
+                ctx = MessageContext(group_id, source.message, source.content_hash, source)
+                if await self.pipeline.run(ctx):
+                    sent_count += 1
+                
+            except Exception as e:
+                self.logger.error(f"❌ 组{group_id} 处理消息失败: {e}")
+        
+        return sent_count
+
+    async def process_source_media_group(self, messages: List[Dict], content_hash: str, group_ids: Sequence[int]):
+        """把一个媒体组分发给监听该频道的全部组"""
+        for group_id in group_ids:
+            await self.process_media_group(group_id, messages, content_hash)
 
-    async def _should_process_group(self, group_id: int) -> bool:
-        """检查组是否应该处理"""
+    async def process_message_batch(self, group_id: int, items: List[Tuple[Any, str]]) -> int:
+        """批量处理单条消息（历史同步/补漏），items 为 (消息, 内容哈希)，返回发送的消息数"""
         try:
-            group_data = await self._get_group_data(group_id)
-            if not group_data:
-                return False
+            if not items:
+                return 0
             
-            config = group_data['config']
-            
-            # 检查组状态
-            if config['status'] != 'active':
-                return False
-            
-            # 检查调度时间
-            if config['schedule_start'] and config['schedule_end']:
-                return self._is_in_schedule_time(config['schedule_start'], config['schedule_end'])
-            
-            return True
+            # 整批逐阶段执行，过滤阶段整批使用同一个过滤计划，批量较大时在进程池中过滤
+            contexts = [MessageContext(group_id, message, content_hash) for message, content_hash in items]
+            passed = await self.pipeline.run_batch(contexts)
+            return len(passed)
             
         except Exception as e:
-            self.logger.error(f"❌ 检查组处理状态失败: {e}")
-            return False
+            self.logger.error(f"❌ 批量处理消息失败: {e}")
+            return 0
 
-    def _is_in_schedule_time(self, start_time: str, end_time: str) -> bool:
-        """检查是否在调度时间内"""
+    async def process_media_group(self, group_id: int, messages: List[Dict], content_hash: str):
+        """处理媒体组消息（与单条消息经过同一条流水线，整组作为一个上下文）"""
         try:
-            now = datetime.now().time()
-            start = dt_time.fromisoformat(start_time)
-            end = dt_time.fromisoformat(end_time)
+            if not messages:
+                return
+            
+            ctx = MessageContext(group_id, messages[0]['message'], content_hash, media=messages)
+            await self.pipeline.run(ctx)
             
-            if start <= end:
-                # 同一天的时间段
-                return start <= now <= end
-            else:
-                # 跨天的时间段
-                return now >= start or now <= end
-                
         except Exception as e:
-            self.logger.error(f"❌ 检查调度时间失败: {e}")
-            return True
+            self.logger.error(f"❌ 处理媒体组失败: {e}")
 
     async def _get_group_data(self, group_id: int) -> Optional[Dict]:
-        """获取组数据"""
-        # 检查缓存是否需要更新
-        if datetime.now().timestamp() - self.cache_update_time > 300:  # 5分钟
-            await self._load_groups()
-        
+        """获取组数据（只读缓存，不访问数据库）"""
         return self.group_cache.get(group_id)
 
+    def _get_filter_plan(self, config: Dict):
+        """获取组的已编译过滤计划（按组配置版本缓存）"""
+        return self.message_filter.get_plan(config['id'], config.get('updated_at'), config.get('filters', {}))
+
     async def _filter_message(self, group_data: Dict, message) -> Optional[str]:
         """过滤单条消息"""
         try:
@@ -174,31 +313,120 @@ class GroupProcessor:
                 return None
             
             config = group_data['config']
-            filters = config.get('filters', {})
+            plan = self._get_filter_plan(config)
             
-            # 应用过滤器
-            filtered_text = self.message_filter.filter_text(message.text, filters)
+            # 应用过滤器（小尾巴在发送阶段添加）
+            filtered_text = self._filter_content(message, message.text, plan)
             
-            # 如果过滤后为空，返回None
-            if not filtered_text.strip():
+            return filtered_text if filtered_text.strip() else None
+            
+        except Exception as e:
+            self.logger.error(f"❌ 过滤消息失败: {e}")
+            return None
+
+    def _filter_source(self, group_data: Dict, source) -> Optional[str]:
+        """按组的过滤计划过滤共享的源消息"""
+        try:
+            if not source.text:
                 return None
             
-            # 添加小尾巴
-            footer = config.get('footer', '')
-            if footer:
-                filtered_text += f"\n\n{footer}"
+            config = group_data['config']
+            plan = self._get_filter_plan(config)
+            filtered_text = self._filter_content(source.message, source.text, plan, source)
             
-            return filtered_text
+            return filtered_text if filtered_text.strip() else None
             
         except Exception as e:
             self.logger.error(f"❌ 过滤消息失败: {e}")
             return None
 
+    def _filter_content(self, message, text: str, plan, source=None) -> str:
+        """过滤消息文本；消息带实体时按实体偏移删除链接/提及并保留格式（输出 HTML）
+
+        传入 source（SourceMessage）时复用其中已解析的原始文本和实体。
+        """
+        entities = getattr(message, 'entities', None)
+        if entities and self.settings.filter_use_entities:
+            if source is not None:
+                filtered_text, _ = self.message_filter.filter_entities(source.raw_text, entities, plan, spans=source.spans)
+            else:
+                filtered_text, _ = self.message_filter.filter_entities(get_raw_text(message), entities, plan)
+            return filtered_text
+        return self.message_filter.filter_text(text, plan)
+
+    def _append_footer(self, config: Dict, filtered_text: str) -> Optional[str]:
+        """过滤后为空返回None，否则添加小尾巴"""
+        if not filtered_text.strip():
+            return None
+        
+        footer = config.get('footer', '')
+        if footer:
+            filtered_text += f"\n\n{footer}"
+        
+        return filtered_text
+
+    async def _dispatch(self, group_data: Dict, filtered_text: str, content_hash: str, source_message_id: int):
+        """发送阶段: 开启合并发送的组先进入缓冲区，否则加上小尾巴直接发送"""
+        config = group_data['config']
+        if (config.get('digest_window') or 0) > 0:
+            await self._add_to_digest(group_data, filtered_text, content_hash, source_message_id)
+            return
+        
+        content = self._append_footer(config, filtered_text)
+        if content:
+            await self._send_to_targets(group_data, content, content_hash, source_message_id)
+
+    async def _add_to_digest(self, group_data: Dict, filtered_text: str, content_hash: str, source_message_id: int):
+        """加入组的合并缓冲区；达到条数上限立即发送，否则在时间窗到期后发送"""
+        config = group_data['config']
+        group_id = config['id']
+        entries = self._digests.setdefault(group_id, [])
+        if any(entry[1] == content_hash for entry in entries):
+            return
+        entries.append((filtered_text, content_hash, source_message_id))
+        
+        max_messages = config.get('digest_size') or 0
+        if max_messages and len(entries) >= max_messages:
+            await self._flush_digest(group_id)
+        elif group_id not in self._digest_timers:
+            self._digest_timers[group_id] = asyncio.create_task(
+                self._digest_timer(group_id, config['digest_window'])
+            )
+
+    async def _digest_timer(self, group_id: int, window: float):
+        """时间窗到期后发送缓冲的消息"""
+        try:
+            await asyncio.sleep(window)
+        except asyncio.CancelledError:
+            return
+        self._digest_timers.pop(group_id, None)
+        await self._flush_digest(group_id)
+
+    async def _flush_digest(self, group_id: int):
+        """立即发送组缓冲的消息"""
+        timer = self._digest_timers.pop(group_id, None)
+        if timer and timer is not asyncio.current_task():
+            timer.cancel()
+        
+        entries = self._digests.pop(group_id, None)
+        if not entries:
+            return
+        
+        group_data = self.group_cache.get(group_id)
+        if not group_data:
+            self.logger.warning(f"⚠️ 组{group_id} 已不存在，丢弃 {len(entries)} 条待合并消息")
+            return
+        
+        try:
+            await self._send_digest_to_targets(group_data, entries)
+        except Exception as e:
+            self.logger.error(f"❌ 发送合并消息失败: 组{group_id}: {e}")
+
     async def _filter_media_group(self, group_data: Dict, messages: List[Dict]) -> Optional[List[Dict]]:
         """过滤媒体组"""
         try:
             config = group_data['config']
-            filters = config.get('filters', {})
+            plan = self._get_filter_plan(config)
             
             filtered_media = []
             
@@ -208,7 +436,7 @@ class GroupProcessor:
                 # 处理文本
                 text = message.text or message.caption or ""
                 if text:
-                    filtered_text = self.message_filter.filter_text(text, filters)
+                    filtered_text = self._filter_content(message, text, plan, msg_data.get('source'))
                 else:
                     filtered_text = ""
                 
@@ -241,10 +469,17 @@ class GroupProcessor:
             group_id = group_data['config']['id']
             
             for target in target_channels:
+                # 相同内容已发送（或正在发送）到该频道时跳过
+                if not await self.delivery_index.claim(target['channel_id'], content_hash):
+                    self.logger.debug(f"📋 目标频道已有相同内容，跳过: 组{group_id} -> 频道{target['channel_id']}")
+                    continue
+                
                 try:
                     # 通过消息发送器发送
                     # sender = ForwarderManager.instance.message_sender
-                    # result = await sender.send_message(target['channel_id'], content)
+                    # 按组优先级进入加权公平发送队列
+                    # result = await sender.send_message(target['channel_id'], content,
+                    #                                    group_id=group_id, weight=self.group_weight(group_data['config']))
                     
                     # 这里暂时模拟发送成功
                     result = {'status': 'success', 'message_id': 12345}
@@ -255,6 +490,7 @@ class GroupProcessor:
                             group_id, source_message_id, result.get('message_id'),
                             0, target['channel_id'], content_hash  # source_channel_id 暂时用0
                         )
+                        self.delivery_index.confirm(target['channel_id'], content_hash)
                         
                         # 更新统计
                         await self.database.update_statistics(group_id, "system", True)
@@ -262,16 +498,68 @@ class GroupProcessor:
                         self.logger.info(f"✅ 消息发送成功: 组{group_id} -> 频道{target['channel_id']}")
                     else:
                         # 更新失败统计
+                        self.delivery_index.release(target['channel_id'], content_hash)
                         await self.database.update_statistics(group_id, "system", False)
                         self.logger.error(f"❌ 消息发送失败: {result.get('error')}")
                         
                 except Exception as e:
+                    self.delivery_index.release(target['channel_id'], content_hash)
                     self.logger.error(f"❌ 发送到目标频道失败 {target['channel_id']}: {e}")
                     await self.database.update_statistics(group_id, "system", False)
                     
         except Exception as e:
             self.logger.error(f"❌ 发送到目标频道异常: {e}")
 
+    async def _send_digest_to_targets(self, group_data: Dict, entries: List[Tuple[str, str, int]]):
+        """把缓冲的多条消息合并后发送到目标频道（按长度上限分段，小尾巴只加一次）"""
+        config = group_data['config']
+        group_id = config['id']
+        
+        for target in group_data['target_channels']:
+            target_id = target['channel_id']
+            
+            # 逐条检查投递索引，已发送到该频道的内容不再合并进来
+            pending = []
+            for entry in entries:
+                if await self.delivery_index.claim(target_id, entry[1]):
+                    pending.append(entry)
+            if not pending:
+                continue
+            
+            # 过长的消息会被切成多段，只在最后一段所在的消息中记录（中间段的 included 为空）
+            chunks = pack_digest([entry[0] for entry in pending], config.get('footer', ''))
+            for content, start, end in chunks:
+                included = pending[start:end]
+                try:
+                    # result = await sender.send_message(target_id, content,
+                    #                                    group_id=group_id, weight=self.group_weight(config))
+                    
+                    # 这里暂时模拟发送成功
+                    result = {'status': 'success', 'message_id': 12345}
+                    
+                    if result['status'] == 'success':
+                        # 每条源消息各记录一次，去重和投递索引按原内容哈希生效
+                        for _, content_hash, source_message_id in included:
+                            await self.database.add_message_record(
+                                group_id, source_message_id, result.get('message_id'),
+                                0, target_id, content_hash
+                            )
+                            self.delivery_index.confirm(target_id, content_hash)
+                        
+                        await self.database.update_statistics(group_id, "system", True)
+                        self.logger.info(f"✅ 合并消息发送成功: 组{group_id} -> 频道{target_id} ({len(included)}条)")
+                    else:
+                        for entry in included:
+                            self.delivery_index.release(target_id, entry[1])
+                        await self.database.update_statistics(group_id, "system", False)
+                        self.logger.error(f"❌ 合并消息发送失败: {result.get('error')}")
+                        
+                except Exception as e:
+                    for entry in included:
+                        self.delivery_index.release(target_id, entry[1])
+                    self.logger.error(f"❌ 发送合并消息到目标频道失败 {target_id}: {e}")
+                    await self.database.update_statistics(group_id, "system", False)
+
     async def _send_media_group_to_targets(self, group_data: Dict, media_list: List[Dict], content_hash: str, source_message_id: int):
         """发送媒体组到目标频道"""
         try:
@@ -279,6 +567,10 @@ class GroupProcessor:
             group_id = group_data['config']['id']
             
             for target in target_channels:
+                if not await self.delivery_index.claim(target['channel_id'], content_hash):
+                    self.logger.debug(f"📋 目标频道已有相同媒体组，跳过: 组{group_id} -> 频道{target['channel_id']}")
+                    continue
+                
                 try:
                     # 准备媒体数据
                     media_data = []
@@ -297,7 +589,8 @@ class GroupProcessor:
                         pass
                     
                     # 通过消息发送器发送媒体组
-                    # result = await sender.send_media_group(target['channel_id'], media_data, caption)
+                    # result = await sender.send_media_group(target['channel_id'], media_data, caption,
+                    #                                        group_id=group_id, weight=self.group_weight(group_data['config']))
                     
                     # 暂时模拟发送成功
                     result = {'status': 'success', 'message_ids': [12345, 12346]}
@@ -310,16 +603,19 @@ class GroupProcessor:
                                 group_id, source_message_id, message_ids[0],
                                 0, target['channel_id'], content_hash
                             )
+                        self.delivery_index.confirm(target['channel_id'], content_hash)
                         
                         # 更新统计
                         await self.database.update_statistics(group_id, "system", True)
                         
                         self.logger.info(f"✅ 媒体组发送成功: 组{group_id} -> 频道{target['channel_id']}")
                     else:
+                        self.delivery_index.release(target['channel_id'], content_hash)
                         await self.database.update_statistics(group_id, "system", False)
                         self.logger.error(f"❌ 媒体组发送失败: {result.get('error')}")
                         
                 except Exception as e:
+                    self.delivery_index.release(target['channel_id'], content_hash)
                     self.logger.error(f"❌ 发送媒体组到目标频道失败 {target['channel_id']}: {e}")
                     await self.database.update_statistics(group_id, "system", False)
                     
@@ -332,8 +628,8 @@ class GroupProcessor:
             group_id = await self.database.create_forwarding_group(name, description)
             
             if group_id:
-                # 更新缓存
-                await self._load_groups()
+                # 缓存由数据库变更通知刷新，等待刷新完成
+                await self._wait_for_refresh()
                 
                 self.logger.info(f"✅ 创建搬运组成功: {name} (ID: {group_id})")
                 return {
@@ -354,8 +650,8 @@ class GroupProcessor:
             success = await self.database.add_source_channel(group_id, channel_id, channel_username, channel_title)
             
             if success:
-                # 更新缓存
-                await self._load_groups()
+                # 缓存由数据库变更通知刷新，等待刷新完成
+                await self._wait_for_refresh()
                 
                 self.logger.info(f"✅ 添加源频道成功: 组{group_id} -> 频道{channel_id}")
                 return {'status': 'success', 'message': '源频道添加成功'}
@@ -372,8 +668,8 @@ class GroupProcessor:
             success = await self.database.add_target_channel(group_id, channel_id, channel_username, channel_title)
             
             if success:
-                # 更新缓存
-                await self._load_groups()
+                # 缓存由数据库变更通知刷新，等待刷新完成
+                await self._wait_for_refresh()
                 
                 self.logger.info(f"✅ 添加目标频道成功: 组{group_id} -> 频道{channel_id}")
                 return {'status': 'success', 'message': '目标频道添加成功'}
@@ -392,7 +688,7 @@ class GroupProcessor:
                 return {'status': 'error', 'message': '搬运组不存在'}
             
             # 获取当前过滤器配置
-            current_filters = group_data['config'].get('filters', {})
+            current_filters = dict(group_data['config'].get('filters', {}))
             
             # 更新过滤器
             if filter_type == 'remove_links':
@@ -406,14 +702,21 @@ class GroupProcessor:
             elif filter_type == 'smart_filter':
                 current_filters['smart_filter'] = enabled
             elif filter_type == 'custom' and rules:
+                # 自定义正则先做安全检查，拒绝可能灾难性回溯的规则
+                for rule in rules:
+                    if isinstance(rule, dict) and rule.get('type') == 'regex' and rule.get('pattern'):
+                        reason = check_regex(rule['pattern'])
+                        if reason:
+                            return {'status': 'error', 'message': f"正则规则无效 {rule['pattern']}: {reason}"}
                 current_filters['custom_rules'] = rules
             
             # 保存到数据库
             success = await self.database.update_group_filters(group_id, current_filters)
             
             if success:
-                # 更新缓存
-                await self._load_groups()
+                # 旧的过滤计划作废，缓存由数据库变更通知刷新
+                self.message_filter.invalidate_plan(group_id)
+                await self._wait_for_refresh()
                 
                 self.logger.info(f"✅ 更新组过滤器成功: 组{group_id}, 类型{filter_type}")
                 return {'status': 'success', 'message': '过滤器设置成功'}
@@ -430,8 +733,8 @@ class GroupProcessor:
             success = await self.database.set_group_schedule(group_id, start_time, end_time)
             
             if success:
-                # 更新缓存
-                await self._load_groups()
+                # 缓存由数据库变更通知刷新，等待刷新完成
+                await self._wait_for_refresh()
                 
                 self.logger.info(f"✅ 设置组调度成功: 组{group_id}, {start_time}-{end_time}")
                 return {'status': 'success', 'message': f'调度设置成功: {start_time}-{end_time}'}
@@ -442,38 +745,172 @@ class GroupProcessor:
             self.logger.error(f"❌ 设置组调度失败: {e}")
             return {'status': 'error', 'message': f'设置失败: {str(e)}'}
 
-    async def get_group_list(self) -> List[Dict[str, Any]]:
-        """获取搬运组列表"""
+    async def set_group_priority(self, group_id: int, priority: int) -> Dict[str, Any]:
+        """设置组的发送优先级（1-100，拥堵时按优先级比例分配发送机会）"""
         try:
-            groups = []
+            if not 1 <= priority <= self.MAX_PRIORITY:
+                return {'status': 'error', 'message': f'优先级必须在 1-{self.MAX_PRIORITY} 之间'}
+            
+            success = await self.database.set_group_priority(group_id, priority)
             
-            for group_id, group_data in self.group_cache.items():
+            if success:
+                # 缓存由数据库变更通知刷新，等待刷新完成
+                await self._wait_for_refresh()
+                
+                self.logger.info(f"✅ 设置组优先级成功: 组{group_id}, {priority}")
+                return {'status': 'success', 'message': f'优先级设置成功: {priority}'}
+            else:
+                return {'status': 'error', 'message': '设置优先级失败'}
+                
+        except Exception as e:
+            self.logger.error(f"❌ 设置组优先级失败: {e}")
+            return {'status': 'error', 'message': f'设置失败: {str(e)}'}
+
+    async def set_group_digest(self, group_id: int, window: int, max_messages: int = 0) -> Dict[str, Any]:
+        """设置组的合并发送: window 秒内的消息合并为一条发送（0为关闭），max_messages 条满时提前发送（0为不限）"""
+        try:
+            if window < 0 or max_messages < 0 or window > self.MAX_DIGEST_WINDOW:
+                return {'status': 'error', 'message': f'时间窗必须在 0-{self.MAX_DIGEST_WINDOW} 秒之间，条数不能为负数'}
+            
+            success = await self.database.set_group_digest(group_id, window, max_messages)
+            
+            if success:
+                # 等待缓存刷新；关闭合并时先发出已缓冲的消息
+                await self._wait_for_refresh()
+                if not window:
+                    await self._flush_digest(group_id)
+                
+                if window:
+                    description = f'{window}秒内合并发送' + (f'，最多{max_messages}条' if max_messages else '')
+                else:
+                    description = '已关闭合并发送'
+                self.logger.info(f"✅ 设置组合并发送成功: 组{group_id}, {description}")
+                return {'status': 'success', 'message': description}
+            else:
+                return {'status': 'error', 'message': '设置合并发送失败'}
+                
+        except Exception as e:
+            self.logger.error(f"❌ 设置组合并发送失败: {e}")
+            return {'status': 'error', 'message': f'设置失败: {str(e)}'}
+
+    def add_regex_listener(self, callback: Callable[[Optional[str]], None]):
+        if callback not in self._regex_listeners:
+            self._regex_listeners.append(callback)
+
+    def remove_regex_listener(self, callback: Callable[[Optional[str]], None]):
+        if callback in self._regex_listeners:
+            self._regex_listeners.remove(callback)
+
+    def get_disabled_regex_rules(self) -> List[str]:
+        """因超时被自动停用的正则规则"""
+        return self.message_filter.regex_guard.disabled_patterns()
+
+    async def enable_regex_rule(self, pattern: Optional[str] = None) -> Dict[str, Any]:
+        """重新启用因超时被自动停用的正则规则（不指定时启用全部并重置统计）"""
+        try:
+            self.message_filter.regex_guard.enable(pattern)
+            for callback in list(self._regex_listeners):
+                callback(pattern)
+            
+            description = f'已重新启用正则规则: {pattern}' if pattern else '已重新启用全部正则规则'
+            self.logger.info(f"✅ {description}")
+            return {'status': 'success', 'message': description}
+            
+        except Exception as e:
+            self.logger.error(f"❌ 启用正则规则失败: {e}")
+            return {'status': 'error', 'message': f'启用失败: {str(e)}'}
+
+    async def set_group_windows(self, group_id: int, windows: List, timezone: str = None) -> Dict[str, Any]:
+        """设置组的多个调度时间窗（如 ["09:00-12:00", "14:00-18:00"]）和时区（IANA 名称或 UTC+8），空列表为取消调度"""
+        try:
+            try:
+                parsed = parse_window_list(windows)
+            except (ValueError, TypeError):
+                return {'status': 'error', 'message': '时间窗格式错误，请使用 HH:MM-HH:MM 格式'}
+            
+            if timezone and get_timezone(timezone) is None:
+                return {'status': 'error', 'message': f'无效的时区: {timezone}'}
+            
+            success = await self.database.set_group_windows(group_id, parsed, timezone)
+            
+            if success:
+                # 缓存由数据库变更通知刷新，等待刷新完成
+                await self._wait_for_refresh()
+                
+                description = ', '.join(f'{start}-{end}' for start, end in parsed) or '全天'
+                if timezone:
+                    description += f' ({timezone})'
+                self.logger.info(f"✅ 设置组调度成功: 组{group_id}, {description}")
+                return {'status': 'success', 'message': f'调度设置成功: {description}'}
+            else:
+                return {'status': 'error', 'message': '设置调度失败'}
+                
+        except Exception as e:
+            self.logger.error(f"❌ 设置组调度失败: {e}")
+            return {'status': 'error', 'message': f'设置失败: {str(e)}'}
+
+    def _describe_schedule(self, group_id: int, config: Dict) -> Dict[str, Any]:
+        schedule = self.schedule_table.get(group_id)
+        return {
+            'start': config.get('schedule_start'),
+            'end': config.get('schedule_end'),
+            'windows': schedule.describe() if schedule else [],
+            'timezone': schedule.timezone_name if schedule else None,
+            'in_window': self.schedule_table.is_open(group_id)
+        }
+
+    @staticmethod
+    def group_weight(config: Dict) -> int:
+        """组在加权公平发送队列中的权重（优先级，未设置为1）"""
+        return config.get('priority') or 1
+
+    async def _get_today_statistics(self) -> Dict[int, Dict]:
+        """所有组的今日统计（一次分组查询，缓存 stats_cache_ttl 秒）"""
+        now = time.monotonic()
+        today = datetime.now().date()
+        cached = self._today_stats
+        if cached is not None and cached[0] > now and cached[1] == today:
+            return cached[2]
+        
+        stats = await self.database.get_daily_group_statistics(today)
+        self._today_stats = (now + self.settings.stats_cache_ttl, today, stats)
+        return stats
+
+    async def get_group_list(self, offset: int = 0, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """获取搬运组列表（按组ID排序，可分页），统计只查询一次"""
+        try:
+            groups = []
+            group_ids = sorted(self.group_cache)
+            if offset or limit is not None:
+                group_ids = group_ids[offset:None if limit is None else offset + limit]
+            all_stats = await self._get_today_statistics() if group_ids else {}
+            
+            for group_id in group_ids:
+                group_data = self.group_cache.get(group_id)
+                if not group_data:
+                    continue
                 config = group_data['config']
                 source_count = len(group_data['source_channels'])
                 target_count = len(group_data['target_channels'])
                 
-                # 获取统计信息
-                stats = await self.database.get_group_statistics(group_id, 1)
-                today_stats = stats[0] if stats else {}
+                today_stats = all_stats.get(group_id) or {}
                 
                 groups.append({
                     'id': group_id,
                     'name': config['name'],
                     'description': config['description'],
                     'status': config['status'],
-                    'schedule': {
-                        'start': config.get('schedule_start'),
-                        'end': config.get('schedule_end')
-                    },
+                    'priority': self.group_weight(config),
+                    'schedule': self._describe_schedule(group_id, config),
                     'channels': {
                         'source_count': source_count,
                         'target_count': target_count
                     },
                     'today_stats': {
-                        'messages': today_stats.get('total_messages', 0),
-                        'success': today_stats.get('total_success', 0),
-                        'errors': today_stats.get('total_errors', 0),
-                        'success_rate': today_stats.get('success_rate', 0)
+                        'messages': today_stats.get('total_messages') or 0,
+                        'success': today_stats.get('total_success') or 0,
+                        'errors': today_stats.get('total_errors') or 0,
+                        'success_rate': today_stats.get('success_rate') or 0
                     }
                 })
             
@@ -483,6 +920,23 @@ class GroupProcessor:
             self.logger.error(f"❌ 获取组列表失败: {e}")
             return []
 
+    async def get_group_page(self, page: int = 1, page_size: int = 20) -> Dict[str, Any]:
+        """分页获取搬运组列表"""
+        total = len(self.group_cache)
+        pages = max(math.ceil(total / page_size), 1) if page_size > 0 else 1
+        page = min(max(page, 1), pages)
+        if page_size > 0:
+            groups = await self.get_group_list((page - 1) * page_size, page_size)
+        else:
+            groups = await self.get_group_list()
+        
+        return {
+            'groups': groups,
+            'page': page,
+            'pages': pages,
+            'total': total
+        }
+
     async def get_group_info(self, group_id: int) -> Optional[Dict[str, Any]]:
         """获取组详细信息"""
         try:
@@ -502,9 +956,12 @@ class GroupProcessor:
                 'name': config['name'],
                 'description': config['description'],
                 'status': config['status'],
-                'schedule': {
-                    'start': config.get('schedule_start'),
-                    'end': config.get('schedule_end')
+                'priority': self.group_weight(config),
+                'schedule': self._describe_schedule(group_id, config),
+                'digest': {
+                    'window': config.get('digest_window') or 0,
+                    'max_messages': config.get('digest_size') or 0,
+                    'buffered': len(self._digests.get(group_id, ()))
                 },
                 'filters': config.get('filters', {}),
                 'footer': config.get('footer', ''),
@@ -534,6 +991,9 @@ class GroupProcessor:
                 'inactive_groups': total_groups - active_groups,
                 'total_source_channels': total_sources,
                 'total_target_channels': total_targets,
+                'filter_cache': self.message_filter.get_cache_stats(),
+                'regex_rules': self.message_filter.regex_guard.get_stats(10),
+                'pipeline': self.pipeline.stats(),
                 'is_running': self.is_running
             }
             
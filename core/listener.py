@@ -5,18 +5,21 @@
 import asyncio
 import logging
 import hashlib
-from typing import Dict, List, Set, Any
+from typing import Dict, List, Set, Any, Sequence
 from telethon import events
-from telethon.tl.types import MessageMediaPhoto, MessageMediaDocument
+
+from core.source_message import MessageRecord, SourceMessage, media_key, message_hash
 
 
 class MessageListener:
     """消息监听器"""
     
-    def __init__(self, settings, database, group_processor):
+    def __init__(self, settings, database, group_processor, archiver=None, account_manager=None):
         self.settings = settings
         self.database = database
         self.group_processor = group_processor
+        self.archiver = archiver
+        self.account_manager = account_manager
         self.logger = logging.getLogger(__name__)
         
         # 监听状态
@@ -28,6 +31,9 @@ class MessageListener:
         # 处理队列
         self.message_queue = asyncio.Queue()
         self.queue_processors = []
+        
+        # 启动补漏任务
+        self.catch_up_task = None
 
     async def start(self):
         """启动消息监听器"""
@@ -42,6 +48,11 @@ class MessageListener:
             self.queue_processors.append(processor)
         
         self.is_running = True
+        
+        # 后台补漏停机期间错过的消息
+        if self.settings.catch_up_limit > 0:
+            self.catch_up_task = asyncio.create_task(self.catch_up())
+        
         self.logger.info("✅ 消息监听器启动完成")
 
     async def stop(self):
@@ -49,6 +60,11 @@ class MessageListener:
         self.logger.info("🛑 停止消息监听器...")
         self.is_running = False
         
+        # 停止补漏任务
+        if self.catch_up_task:
+            self.catch_up_task.cancel()
+            self.catch_up_task = None
+        
         # 停止媒体组定时器
         for timer in self.media_group_timers.values():
             timer.cancel()
@@ -69,15 +85,12 @@ class MessageListener:
     async def _setup_listeners(self):
         """设置监听器"""
         try:
-            groups = await self.database.get_forwarding_groups()
+            groups = await self.database.get_groups_with_channels()
             
-            for group in groups:
+            for group, source_channels, _ in groups:
                 if group['status'] != 'active':
                     continue
                 
-                # 获取组的源频道
-                source_channels, _ = await self.database.get_group_channels(group['id'])
-                
                 for channel in source_channels:
                     channel_id = channel['channel_id']
                     if channel_id not in self.listening_channels:
@@ -102,6 +115,13 @@ class MessageListener:
         except Exception as e:
             self.logger.error(f"❌ 添加频道监听器失败 {channel_id}: {e}")
 
+    async def enqueue_message(self, message, channel_id: int, group_id: int = None):
+        """接收入口: Telethon 消息在这里转换为 MessageRecord 后入队，之后的处理不再持有原消息对象"""
+        item = {'message': MessageRecord.from_message(message), 'channel_id': channel_id}
+        if group_id is not None:
+            item['group_id'] = group_id
+        await self.message_queue.put(item)
+
     async def _message_processor(self):
         """消息处理器"""
         while self.is_running:
@@ -122,43 +142,49 @@ class MessageListener:
                 self.logger.error(f"❌ 处理消息异常: {e}")
 
     async def _process_message(self, message_data: Dict):
-        """处理单条消息"""
+        """处理单条消息
+
+        队列项为 {'message': MessageRecord, 'channel_id'}，消息按频道一次分发给监听该频道的所有组；
+        指定 group_id 时只交给该组处理。
+        """
         try:
             message = message_data['message']
-            group_id = message_data['group_id']
             channel_id = message_data['channel_id']
+            group_id = message_data.get('group_id')
+            group_ids = [group_id] if group_id is not None else list(self.group_processor.get_channel_groups(channel_id))
+            if not group_ids:
+                return
             
             # 检查消息是否有媒体组
             if message.grouped_id:
-                await self._handle_media_group(message, group_id, channel_id)
+                await self._handle_media_group(message, channel_id, group_ids)
             else:
                 # 单条消息直接处理
-                await self._handle_single_message(message, group_id, channel_id)
+                await self._handle_single_message(message, channel_id, group_ids)
                 
         except Exception as e:
             self.logger.error(f"❌ 处理消息失败: {e}")
 
-    async def _handle_single_message(self, message, group_id: int, channel_id: int):
-        """处理单条消息"""
+    async def _handle_single_message(self, message, channel_id: int, group_ids: Sequence[int]):
+        """处理单条消息: 哈希、去重和实体解析只做一次，再交给各组的过滤计划"""
         try:
-            # 生成消息哈希用于去重
-            content_hash = self._generate_message_hash(message)
+            source = SourceMessage(message, channel_id)
             
             # 检查是否已经转发过
-            if await self.database.is_message_forwarded(content_hash):
+            if await self._is_duplicate(source.content_hash):
                 self.logger.debug(f"📋 消息已转发，跳过: {message.id}")
                 return
             
-            # 更新最后处理的消息ID
-            await self.database.update_last_message_id(group_id, channel_id, message.id)
+            # 一条语句更新所有组的最后处理消息ID
+            await self.database.update_channel_last_message_id(channel_id, message.id, group_ids)
             
             # 发送给组处理器
-            await self.group_processor.process_message(group_id, message, content_hash)
+            await self.group_processor.process_source_message(source, group_ids)
             
         except Exception as e:
             self.logger.error(f"❌ 处理单条消息失败: {e}")
 
-    async def _handle_media_group(self, message, group_id: int, channel_id: int):
+    async def _handle_media_group(self, message, channel_id: int, group_ids: Sequence[int]):
         """处理媒体组消息"""
         try:
             grouped_id = message.grouped_id
@@ -170,8 +196,9 @@ class MessageListener:
             # 添加消息到媒体组
             self.media_groups[grouped_id].append({
                 'message': message,
-                'group_id': group_id,
-                'channel_id': channel_id
+                'source': SourceMessage(message, channel_id),
+                'channel_id': channel_id,
+                'group_ids': group_ids
             })
             
             # 取消之前的定时器
@@ -199,7 +226,7 @@ class MessageListener:
                 if messages:
                     # 使用第一条消息的信息
                     first_msg_data = messages[0]
-                    group_id = first_msg_data['group_id']
+                    group_ids = first_msg_data['group_ids']
                     channel_id = first_msg_data['channel_id']
                     
                     # 按消息ID排序确保顺序
@@ -209,13 +236,13 @@ class MessageListener:
                     content_hash = self._generate_media_group_hash(messages)
                     
                     # 检查是否已经转发过
-                    if not await self.database.is_message_forwarded(content_hash):
+                    if not await self._is_duplicate(content_hash):
                         # 更新最后处理的消息ID（使用最后一条消息的ID）
                         last_message = messages[-1]['message']
-                        await self.database.update_last_message_id(group_id, channel_id, last_message.id)
+                        await self.database.update_channel_last_message_id(channel_id, last_message.id, group_ids)
                         
                         # 发送给组处理器
-                        await self.group_processor.process_media_group(group_id, messages, content_hash)
+                        await self.group_processor.process_source_media_group(messages, content_hash, group_ids)
                     else:
                         self.logger.debug(f"📋 媒体组已转发，跳过: {grouped_id}")
                 
@@ -229,33 +256,20 @@ class MessageListener:
         except Exception as e:
             self.logger.error(f"❌ 延迟处理媒体组失败: {e}")
 
+    async def _is_duplicate(self, content_hash: str) -> bool:
+        """检查内容是否已转发（在线历史 + 归档历史）"""
+        if await self.database.is_message_forwarded(content_hash):
+            return True
+        
+        # 归档历史先经布隆过滤器筛选，只有命中时才读取分段
+        if self.archiver and self.settings.archive_dedup:
+            return await self.archiver.contains(content_hash)
+        
+        return False
+
     def _generate_message_hash(self, message) -> str:
         """生成消息哈希用于去重"""
-        try:
-            # 基于消息内容生成哈希
-            content = ""
-            
-            # 添加文本内容
-            if message.text:
-                content += message.text
-            
-            # 添加媒体信息
-            if message.media:
-                if isinstance(message.media, MessageMediaPhoto):
-                    content += f"photo_{message.media.photo.id}"
-                elif isinstance(message.media, MessageMediaDocument):
-                    content += f"doc_{message.media.document.id}"
-            
-            # 添加发送者和频道信息
-            content += f"_{message.chat_id}_{message.from_id}"
-            
-            # 生成MD5哈希
-            return hashlib.md5(content.encode('utf-8')).hexdigest()
-            
-        except Exception as e:
-            self.logger.error(f"❌ 生成消息哈希失败: {e}")
-            # 使用消息ID作为备用哈希
-            return f"msg_{message.chat_id}_{message.id}"
+        return message_hash(message)
 
     def _generate_media_group_hash(self, messages: List[Dict]) -> str:
         """生成媒体组哈希"""
@@ -268,16 +282,12 @@ class MessageListener:
             for msg_data in sorted_messages:
                 message = msg_data['message']
                 
-                # 添加文本内容
-                if message.text:
-                    content += message.text
-                
-                # 添加媒体信息
-                if message.media:
-                    if isinstance(message.media, MessageMediaPhoto):
-                        content += f"photo_{message.media.photo.id}"
-                    elif isinstance(message.media, MessageMediaDocument):
-                        content += f"doc_{message.media.document.id}"
+                # 添加文本内容和媒体信息（实时消息复用已提取的媒体信息）
+                source = msg_data.get('source')
+                if source is not None:
+                    content += source.text + source.media_key
+                else:
+                    content += (message.text or "") + media_key(message)
             
             # 添加组ID和频道信息
             first_message = sorted_messages[0]['message']
@@ -291,20 +301,99 @@ class MessageListener:
             first_message = messages[0]['message']
             return f"group_{first_message.grouped_id}_{first_message.chat_id}"
 
-    async def sync_history(self, group_id: int, channel_id: int, limit: int = 100) -> Dict[str, Any]:
-        """同步历史消息"""
+    async def catch_up(self):
+        """补漏: 从每个源频道上次处理的消息ID之后同步错过的消息"""
         try:
-            self.logger.info(f"🔄 开始同步历史消息: 组{group_id}, 频道{channel_id}, 限制{limit}")
+            groups = await self.database.get_groups_with_channels()
             
-            # 获取账号管理器的客户端
-            # 这里需要依赖注入，暂时省略具体实现
-            # client, phone = await self.account_manager.get_current_client()
+            for group, source_channels, _ in groups:
+                if group['status'] != 'active':
+                    continue
+                
+                for channel in source_channels:
+                    # 从未处理过消息的频道不补漏，避免把整段历史当作新消息转发
+                    last_message_id = channel['last_message_id'] or 0
+                    if last_message_id <= 0:
+                        continue
+                    
+                    await self.sync_history(
+                        group['id'], channel['channel_id'],
+                        limit=self.settings.catch_up_limit, min_id=last_message_id
+                    )
             
-            synced_count = 0
-            error_count = 0
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.logger.error(f"❌ 补漏失败: {e}")
+
+    async def _process_history_batch(self, group_id: int, channel_id: int, messages: List) -> Dict[str, int]:
+        """处理一批历史消息（按消息ID升序）: 单条消息批量过滤，媒体组逐组处理"""
+        singles = []
+        media_groups: Dict[int, List[Dict]] = {}
+        error_count = 0
+        
+        for message in messages:
+            try:
+                if message.grouped_id:
+                    media_groups.setdefault(message.grouped_id, []).append({
+                        'message': message,
+                        'group_id': group_id,
+                        'channel_id': channel_id
+                    })
+                    continue
+                
+                content_hash = self._generate_message_hash(message)
+                if await self._is_duplicate(content_hash):
+                    continue
+                singles.append((message, content_hash))
+                
+            except Exception as e:
+                error_count += 1
+                self.logger.error(f"❌ 处理历史消息失败 {message.id}: {e}")
+        
+        synced_count = await self.group_processor.process_message_batch(group_id, singles)
+        
+        for grouped_messages in media_groups.values():
+            try:
+                content_hash = self._generate_media_group_hash(grouped_messages)
+                if await self._is_duplicate(content_hash):
+                    continue
+                await self.group_processor.process_media_group(group_id, grouped_messages, content_hash)
+                synced_count += 1
+            except Exception as e:
+                error_count += 1
+                self.logger.error(f"❌ 处理历史媒体组失败: {e}")
+        
+        if messages:
+            await self.database.update_last_message_id(group_id, channel_id, messages[-1].id)
+        
+        return {'synced_count': synced_count, 'error_count': error_count}
+
+    async def sync_history(self, group_id: int, channel_id: int, limit: int = 100, min_id: int = 0) -> Dict[str, Any]:
+        """同步历史消息（min_id 之后的最多 limit 条）"""
+        try:
+            self.logger.info(f"🔄 开始同步历史消息: 组{group_id}, 频道{channel_id}, 限制{limit}")
             
-            # 这里应该实现实际的历史消息同步逻辑
-            # 遍历历史消息并处理
+            # 获取账号管理器的客户端
+            current = await self.account_manager.get_current_client() if self.account_manager else None
+            if not current:
+                return {
+                    'status': 'error',
+                    'synced_count': 0,
+                    'error_count': 0,
+                    'message': '没有可用的监听账号'
+                }
+            client, phone = current
+            
+            # 拉取历史消息（Telethon 按新到旧返回），转换为消息记录后按旧到新处理
+            messages = []
+            async for message in client.iter_messages(channel_id, limit=limit, min_id=min_id):
+                messages.append(MessageRecord.from_message(message))
+            messages.reverse()
+            
+            counts = await self._process_history_batch(group_id, channel_id, messages)
+            synced_count = counts['synced_count']
+            error_count = counts['error_count']
             
             result = {
                 'status': 'success',
@@ -13,6 +13,8 @@ from .account_manager import AccountManager
 from .scheduler import TaskScheduler
 from .group_processor import GroupProcessor
 from .api_pool_manager import APIPoolManager
+from .archiver import MessageArchiver
+from .sharding import ShardSupervisor
 from bot.handlers import setup_handlers
 from utils.config_watcher import ConfigWatcher
 
@@ -30,8 +32,16 @@ class ForwarderManager:
         self.account_manager = AccountManager(settings, database, self.api_pool_manager)
         self.message_sender = MessageSender(settings, database)
         self.group_processor = GroupProcessor(settings, database)
-        self.task_scheduler = TaskScheduler(settings, database)
-        self.message_listener = MessageListener(settings, database, self.group_processor)
+        # 多进程分片: 消息交给工作进程处理，父进程的组处理器只维护组缓存、投递索引和管理命令
+        self.shard_supervisor = (
+            ShardSupervisor(settings, database, self.group_processor) if settings.shard_workers > 0 else None
+        )
+        self.message_archiver = MessageArchiver(settings, database) if settings.archive_enabled else None
+        self.task_scheduler = TaskScheduler(settings, database, self.message_archiver)
+        self.message_listener = MessageListener(
+            settings, database, self.shard_supervisor or self.group_processor,
+            self.message_archiver, self.account_manager
+        )
         
         # Bot应用
         self.bot_app = None
@@ -58,6 +68,14 @@ class ForwarderManager:
             # 启动组处理器
             await self.group_processor.start()
             
+            # 启动分片工作进程
+            if self.shard_supervisor:
+                await self.shard_supervisor.start()
+            
+            # 启动消息归档器
+            if self.message_archiver:
+                await self.message_archiver.start()
+            
             # 启动任务调度器
             await self.task_scheduler.start()
             
@@ -98,7 +116,9 @@ class ForwarderManager:
         components = [
             self.config_watcher,
             self.message_listener,
+            self.shard_supervisor,
             self.task_scheduler,
+            self.message_archiver,
             self.group_processor,
             self.message_sender,
             self.account_manager,
@@ -166,6 +186,7 @@ class ForwarderManager:
                 self.account_manager,
                 self.message_sender,
                 self.group_processor,
+                self.shard_supervisor,
                 self.task_scheduler,
                 self.message_listener
             ]
@@ -188,6 +209,7 @@ class ForwarderManager:
                 'account_manager': self.account_manager.is_running if self.account_manager else False,
                 'message_sender': self.message_sender.is_running if self.message_sender else False,
                 'group_processor': self.group_processor.is_running if self.group_processor else False,
+                'shard_supervisor': self.shard_supervisor.is_running if self.shard_supervisor else False,
                 'task_scheduler': self.task_scheduler.is_running if self.task_scheduler else False,
                 'message_listener': self.message_listener.is_running if self.message_listener else False,
                 'bot': self.bot_app.running if self.bot_app else False
@@ -203,6 +225,11 @@ class ForwarderManager:
             
             if self.group_processor:
                 status['statistics']['groups'] = await self.group_processor.get_statistics()
+            
+            if self.shard_supervisor:
+                status['statistics']['shards'] = await self.shard_supervisor.get_statistics()
+            
+            status['statistics']['database'] = self.database.get_query_stats(top=10)
                 
         except Exception as e:
             status['errors'].append(f"获取统计信息失败: {e}")
@@ -0,0 +1,340 @@
+"""
+消息处理流水线 - 把组处理器的消息流程（单条消息和媒体组）拆成可组合的阶段
+
+每个阶段提供单条（process）和批量（process_batch）两个入口，流水线逐阶段执行，
+记录每个阶段的耗时和丢弃原因；每条消息保留一份处理轨迹，可以看到它在哪个阶段被过滤或耗时。
+"""
+
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+
+# 丢弃原因的显示名称
+DROP_REASONS = {
+    'no_group': '组不存在',
+    'inactive': '组已暂停',
+    'schedule_closed': '不在调度时间',
+    'no_text': '无文本',
+    'filtered_empty': '过滤后为空',
+    'error': '处理异常',
+    'dropped': '其它'
+}
+
+
+class MessageContext:
+    """一条消息在某个组中的处理上下文"""
+
+    __slots__ = ('group_id', 'message', 'content_hash', 'source', 'media', 'group_data', 'text',
+                 'trace', 'dropped_by', 'drop_reason')
+
+    def __init__(self, group_id: int, message, content_hash: str, source=None, media: Optional[List[Dict]] = None):
+        self.group_id = group_id
+        # 媒体组时为组内第一条消息
+        self.message = message
+        self.content_hash = content_hash
+        # 频道级共享的 SourceMessage（实时消息），历史同步时为 None
+        self.source = source
+        # 媒体组的消息列表（[{'message': ..., 'source': ...}]），过滤后替换为带 filtered_text 的列表；单条消息为 None
+        self.media = media
+        self.group_data: Optional[Dict] = None
+        # 过滤后的文本（不含小尾巴）
+        self.text: Optional[str] = None
+        # [(阶段名, 耗时秒)]
+        self.trace: List[Tuple[str, float]] = []
+        self.dropped_by: Optional[str] = None
+        self.drop_reason: Optional[str] = None
+
+    @property
+    def message_id(self) -> int:
+        return self.message.id
+
+    @property
+    def dropped(self) -> bool:
+        return self.dropped_by is not None
+
+    def drop(self, reason: str):
+        """在当前阶段丢弃该消息（由流水线记录阶段名）"""
+        self.drop_reason = reason
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            'group_id': self.group_id,
+            'message_id': self.message_id,
+            'stages': [(name, round(elapsed * 1000, 3)) for name, elapsed in self.trace],
+            'dropped_by': self.dropped_by,
+            'drop_reason': self.drop_reason
+        }
+
+
+class Stage:
+    """流水线阶段基类
+
+    process 返回 False（或调用 ctx.drop）表示丢弃；process_batch 默认逐条调用 process，
+    需要整批处理的阶段（如进程池过滤）可以重写。
+    """
+
+    name = 'stage'
+
+    async def process(self, ctx: MessageContext) -> bool:
+        raise NotImplementedError
+
+    async def process_batch(self, contexts: List[MessageContext]) -> List[MessageContext]:
+        """处理一批上下文，返回继续向后传递的部分"""
+        passed = []
+        for ctx in contexts:
+            if await self.process(ctx) and ctx.drop_reason is None:
+                passed.append(ctx)
+            elif ctx.drop_reason is None:
+                ctx.drop('dropped')
+        return passed
+
+
+class _StageStats:
+    __slots__ = ('count', 'total', 'max', 'drops')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.drops: Dict[str, int] = {}
+
+
+class Pipeline:
+    """按顺序执行的阶段列表，统计各阶段耗时和丢弃原因"""
+
+    def __init__(self, stages: Sequence[Stage] = (), trace_size: int = 200):
+        self.logger = logging.getLogger(__name__)
+        self.stages: List[Stage] = []
+        self._stats: Dict[str, _StageStats] = {}
+        # 最近处理完的消息轨迹
+        self.recent: Deque[Dict[str, Any]] = deque(maxlen=max(trace_size, 0))
+        for stage in stages:
+            self.add_stage(stage)
+
+    def add_stage(self, stage: Stage, before: Optional[str] = None, after: Optional[str] = None):
+        """添加阶段，可指定插在某个阶段之前或之后"""
+        if self.get_stage(stage.name):
+            raise ValueError(f"阶段已存在: {stage.name}")
+
+        names = [s.name for s in self.stages]
+        anchor = before or after
+        if anchor is None:
+            self.stages.append(stage)
+        elif anchor not in names:
+            raise ValueError(f"阶段不存在: {anchor}")
+        else:
+            index = names.index(anchor) + (1 if after else 0)
+            self.stages.insert(index, stage)
+        self._stats.setdefault(stage.name, _StageStats())
+
+    def remove_stage(self, name: str) -> bool:
+        stage = self.get_stage(name)
+        if stage is None:
+            return False
+        self.stages.remove(stage)
+        return True
+
+    def get_stage(self, name: str) -> Optional[Stage]:
+        for stage in self.stages:
+            if stage.name == name:
+                return stage
+        return None
+
+    def _record(self, stage: Stage, elapsed: float, count: int = 1):
+        stats = self._stats[stage.name]
+        stats.count += count
+        stats.total += elapsed
+        per_message = elapsed / count
+        if per_message > stats.max:
+            stats.max = per_message
+
+    def _record_drop(self, stage: Stage, ctx: MessageContext):
+        ctx.dropped_by = stage.name
+        drops = self._stats[stage.name].drops
+        drops[ctx.drop_reason] = drops.get(ctx.drop_reason, 0) + 1
+
+    def _finish(self, ctx: MessageContext):
+        if self.recent.maxlen:
+            self.recent.append(ctx.describe())
+        if ctx.dropped:
+            self.logger.debug(
+                f"📋 消息被丢弃: 组{ctx.group_id} 消息{ctx.message_id} "
+                f"阶段 {ctx.dropped_by} ({ctx.drop_reason})"
+            )
+
+    async def run(self, ctx: MessageContext) -> bool:
+        """单条执行，全部阶段通过返回 True"""
+        for stage in self.stages:
+            start = time.perf_counter()
+            try:
+                passed = await stage.process(ctx)
+            except Exception as e:
+                self.logger.error(f"❌ 阶段 {stage.name} 处理失败: 组{ctx.group_id} 消息{ctx.message_id}: {e}")
+                ctx.drop('error')
+                passed = False
+            elapsed = time.perf_counter() - start
+            ctx.trace.append((stage.name, elapsed))
+            self._record(stage, elapsed)
+
+            if not passed or ctx.drop_reason is not None:
+                if ctx.drop_reason is None:
+                    ctx.drop('dropped')
+                self._record_drop(stage, ctx)
+                self._finish(ctx)
+                return False
+
+        self._finish(ctx)
+        return True
+
+    async def run_batch(self, contexts: List[MessageContext]) -> List[MessageContext]:
+        """整批逐阶段执行，返回通过全部阶段的上下文（阶段耗时按条数均摊到每条轨迹）"""
+        pending = list(contexts)
+        for stage in self.stages:
+            if not pending:
+                break
+            start = time.perf_counter()
+            try:
+                passed = await stage.process_batch(pending)
+            except Exception as e:
+                self.logger.error(f"❌ 阶段 {stage.name} 批量处理失败: {e}")
+                for ctx in pending:
+                    ctx.drop('error')
+                passed = []
+            elapsed = time.perf_counter() - start
+            self._record(stage, elapsed, len(pending))
+
+            share = elapsed / len(pending)
+            passed_ids = {id(ctx) for ctx in passed}
+            for ctx in pending:
+                ctx.trace.append((stage.name, share))
+                if id(ctx) not in passed_ids:
+                    if ctx.drop_reason is None:
+                        ctx.drop('dropped')
+                    self._record_drop(stage, ctx)
+            pending = passed
+
+        for ctx in contexts:
+            self._finish(ctx)
+        return pending
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """各阶段的处理条数、平均/最大耗时（毫秒）和丢弃原因"""
+        result = []
+        for stage in self.stages:
+            stats = self._stats[stage.name]
+            result.append({
+                'stage': stage.name,
+                'count': stats.count,
+                'avg_ms': round(stats.total / stats.count * 1000, 3) if stats.count else 0,
+                'max_ms': round(stats.max * 1000, 3),
+                'drops': dict(stats.drops)
+            })
+        return result
+
+    def recent_traces(self, limit: int = 20) -> List[Dict[str, Any]]:
+        return list(self.recent)[-limit:]
+
+
+# ---- 组处理器的默认阶段 ----
+
+class GroupStateStage(Stage):
+    """读取组缓存，检查组状态和调度时间窗"""
+
+    name = 'group'
+
+    def __init__(self, processor):
+        self.processor = processor
+
+    async def process(self, ctx: MessageContext) -> bool:
+        group_data = await self.processor._get_group_data(ctx.group_id)
+        if not group_data:
+            ctx.drop('no_group')
+            return False
+        if group_data['config']['status'] != 'active':
+            ctx.drop('inactive')
+            return False
+        if not self.processor.schedule_table.is_open(ctx.group_id):
+            ctx.drop('schedule_closed')
+            return False
+        ctx.group_data = group_data
+        return True
+
+
+class FilterStage(Stage):
+    """按组的过滤计划过滤文本；批量入口整批使用同一个计划，批量较大时在进程池中过滤"""
+
+    name = 'filter'
+
+    def __init__(self, processor):
+        self.processor = processor
+
+    async def process(self, ctx: MessageContext) -> bool:
+        if ctx.media is not None:
+            ctx.media = await self.processor._filter_media_group(ctx.group_data, ctx.media)
+            if not ctx.media:
+                ctx.drop('filtered_empty')
+                return False
+            return True
+        if ctx.source is not None:
+            ctx.text = self.processor._filter_source(ctx.group_data, ctx.source)
+        else:
+            ctx.text = await self.processor._filter_message(ctx.group_data, ctx.message)
+        if not ctx.text:
+            ctx.drop('filtered_empty' if ctx.message.text else 'no_text')
+            return False
+        return True
+
+    async def process_batch(self, contexts: List[MessageContext]) -> List[MessageContext]:
+        processor = self.processor
+        order = {id(ctx): index for index, ctx in enumerate(contexts)}
+        passed = []
+        # 批内可能混有不同组、媒体组或带 SourceMessage 的实时消息，这些逐条过滤
+        by_group: Dict[int, List[MessageContext]] = {}
+        for ctx in contexts:
+            if ctx.media is None and not ctx.message.text:
+                ctx.drop('no_text')
+            elif ctx.source is not None or ctx.media is not None:
+                if await self.process(ctx):
+                    passed.append(ctx)
+            else:
+                by_group.setdefault(ctx.group_id, []).append(ctx)
+
+        use_entities = processor.settings.filter_use_entities
+        for group_contexts in by_group.values():
+            plan = processor._get_filter_plan(group_contexts[0].group_data['config'])
+
+            # 带实体的消息按实体单独过滤，其余整批过滤
+            plain = [ctx for ctx in group_contexts
+                     if not (use_entities and getattr(ctx.message, 'entities', None))]
+            plain_texts = await processor.message_filter.filter_batch_async(
+                [ctx.message.text for ctx in plain], plan
+            )
+            for ctx, filtered_text in zip(plain, plain_texts):
+                ctx.text = filtered_text
+            for ctx in group_contexts:
+                if ctx.text is None:
+                    ctx.text = processor._filter_content(ctx.message, ctx.message.text, plan)
+                if ctx.text.strip():
+                    passed.append(ctx)
+                else:
+                    ctx.drop('filtered_empty')
+
+        passed.sort(key=lambda ctx: order[id(ctx)])
+        return passed
+
+
+class DispatchStage(Stage):
+    """发送到目标频道（或进入合并缓冲区）；媒体组直接发送"""
+
+    name = 'dispatch'
+
+    def __init__(self, processor):
+        self.processor = processor
+
+    async def process(self, ctx: MessageContext) -> bool:
+        if ctx.media is not None:
+            await self.processor._send_media_group_to_targets(ctx.group_data, ctx.media, ctx.content_hash, ctx.message_id)
+            return True
+        await self.processor._dispatch(ctx.group_data, ctx.text, ctx.content_hash, ctx.message_id)
+        return True
@@ -4,26 +4,33 @@
 
 import asyncio
 import logging
-from datetime import datetime, time as dt_time
+import math
+from datetime import datetime, timezone
 from typing import Dict, List, Any, Optional
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.date import DateTrigger
+
+from utils.schedule import ScheduleTable, get_timezone, parse_window_list
 
 
 class TaskScheduler:
     """任务调度器"""
     
-    def __init__(self, settings, database):
+    def __init__(self, settings, database, archiver=None):
         self.settings = settings
         self.database = database
+        self.archiver = archiver
         self.logger = logging.getLogger(__name__)
         
-        # 调度器
-        self.scheduler = AsyncIOScheduler(timezone='Asia/Shanghai')
+        # 调度器（系统任务使用全局时区，组调度按各组时区计算）
+        self.scheduler = AsyncIOScheduler(timezone=settings.schedule_timezone)
         self.is_running = False
         
+        # 组调度时间窗: 只在最近的时间窗边界到达时重新计算并更新组状态
+        self.schedule_table = ScheduleTable(settings.schedule_timezone)
+        
         # 任务状态
-        self.scheduled_jobs = {}
         self.job_status = {}
 
     async def start(self):
@@ -36,7 +43,8 @@ class TaskScheduler:
         # 添加系统任务
         await self._add_system_jobs()
         
-        # 加载组调度任务
+        # 加载组调度，之后按数据库变更通知更新
+        self.database.add_group_listener(self._on_group_changed)
         await self._load_group_schedules()
         
         self.is_running = True
@@ -46,12 +54,13 @@ class TaskScheduler:
         """停止任务调度器"""
         self.logger.info("🛑 停止任务调度器...")
         self.is_running = False
+        self.database.remove_group_listener(self._on_group_changed)
         
         # 停止调度器
         if self.scheduler.running:
             self.scheduler.shutdown(wait=True)
         
-        self.scheduled_jobs.clear()
+        self.schedule_table.clear()
         self.job_status.clear()
         
         self.logger.info("✅ 任务调度器已停止")
@@ -92,91 +101,91 @@ class TaskScheduler:
             self.logger.error(f"❌ 添加系统任务失败: {e}")
 
     async def _load_group_schedules(self):
-        """加载组调度任务"""
+        """加载组调度"""
         try:
             groups = await self.database.get_forwarding_groups()
             
+            present = set()
             for group in groups:
-                if group['schedule_start'] and group['schedule_end']:
-                    await self._add_group_schedule(
-                        group['id'],
-                        group['schedule_start'],
-                        group['schedule_end']
-                    )
+                present.add(group['id'])
+                await self._apply_group_schedule(group)
             
-            self.logger.info(f"📅 加载 {len([g for g in groups if g['schedule_start']])} 个组调度任务")
+            # 已删除的组
+            for group_id in [group_id for group_id, _ in self.schedule_table.items() if group_id not in present]:
+                await self._remove_group_schedule(group_id)
+            
+            self._arm_boundary_job()
+            self.logger.info(f"📅 加载 {len(self.schedule_table)} 个组调度")
             
         except Exception as e:
             self.logger.error(f"❌ 加载组调度任务失败: {e}")
 
-    async def _add_group_schedule(self, group_id: int, start_time: str, end_time: str):
-        """添加组调度任务"""
+    async def _apply_group_schedule(self, group: Dict[str, Any]):
+        """按组配置更新调度时间窗，并把组状态同步为当前时间窗状态"""
+        group_id = group['id']
+        had_schedule = self.schedule_table.get(group_id) is not None
+        
+        schedule = self.schedule_table.set_group(group_id, group)
+        if schedule is None:
+            if had_schedule:
+                await self._remove_group_schedule(group_id)
+            return
+        
+        is_open, _ = schedule.state_at(datetime.now().timestamp())
+        status = 'active' if is_open else 'scheduled'
+        # 状态一致时不写库（写库会触发变更通知）
+        if group['status'] != status:
+            await self._update_group_status(group_id, status)
+        
+        if not had_schedule:
+            self.logger.info(f"📅 添加组调度: 组{group_id} ({', '.join(schedule.describe())}, {schedule.timezone_name})")
+
+    def _arm_boundary_job(self):
+        """在最近的时间窗边界安排一次状态更新"""
+        next_change = self.schedule_table.next_change
+        if next_change == math.inf:
+            if self.scheduler.get_job('schedule_boundary'):
+                self.scheduler.remove_job('schedule_boundary')
+            return
+        
+        self.scheduler.add_job(
+            self._schedule_boundary_task,
+            DateTrigger(run_date=datetime.fromtimestamp(next_change, timezone.utc)),
+            id='schedule_boundary',
+            name='调度时间窗边界',
+            max_instances=1,
+            misfire_grace_time=None,
+            replace_existing=True
+        )
+
+    async def _schedule_boundary_task(self):
+        """时间窗边界到达: 重新计算全部组，只更新状态变化的组"""
         try:
-            # 解析时间
-            start_hour, start_minute = map(int, start_time.split(':'))
-            end_hour, end_minute = map(int, end_time.split(':'))
-            
-            # 启动任务
-            start_job_id = f'group_{group_id}_start'
-            self.scheduler.add_job(
-                self._activate_group,
-                CronTrigger(hour=start_hour, minute=start_minute),
-                args=[group_id],
-                id=start_job_id,
-                name=f'启动组{group_id}',
-                max_instances=1,
-                replace_existing=True
-            )
-            
-            # 停止任务
-            end_job_id = f'group_{group_id}_end'
-            self.scheduler.add_job(
-                self._deactivate_group,
-                CronTrigger(hour=end_hour, minute=end_minute),
-                args=[group_id],
-                id=end_job_id,
-                name=f'停止组{group_id}',
-                max_instances=1,
-                replace_existing=True
-            )
-            
-            # 记录任务
-            self.scheduled_jobs[group_id] = {
-                'start_job_id': start_job_id,
-                'end_job_id': end_job_id,
-                'start_time': start_time,
-                'end_time': end_time
-            }
-            
-            # 检查当前是否在调度时间内
-            await self._check_current_schedule_status(group_id, start_time, end_time)
-            
-            self.logger.info(f"📅 添加组调度: 组{group_id} ({start_time}-{end_time})")
-            
+            for group_id, is_open in self.schedule_table.refresh():
+                if is_open:
+                    await self._activate_group(group_id)
+                else:
+                    await self._deactivate_group(group_id)
         except Exception as e:
-            self.logger.error(f"❌ 添加组调度失败: {e}")
+            self.logger.error(f"❌ 调度时间窗更新失败: {e}")
+        finally:
+            self._arm_boundary_job()
+
+    def _on_group_changed(self, group_id: int):
+        """数据库变更通知: 重新读取该组的调度"""
+        if self.is_running:
+            asyncio.create_task(self._reload_group_schedule(group_id))
 
-    async def _check_current_schedule_status(self, group_id: int, start_time: str, end_time: str):
-        """检查当前调度状态"""
+    async def _reload_group_schedule(self, group_id: int):
         try:
-            now = datetime.now().time()
-            start = dt_time.fromisoformat(start_time)
-            end = dt_time.fromisoformat(end_time)
-            
-            is_active = False
-            if start <= end:
-                # 同一天的时间段
-                is_active = start <= now <= end
+            group = await self.database.get_forwarding_group(group_id)
+            if group is None:
+                await self._remove_group_schedule(group_id)
             else:
-                # 跨天的时间段
-                is_active = now >= start or now <= end
-            
-            # 更新组状态
-            status = 'active' if is_active else 'scheduled'
-            await self._update_group_status(group_id, status)
-            
+                await self._apply_group_schedule(group)
+            self._arm_boundary_job()
         except Exception as e:
-            self.logger.error(f"❌ 检查当前调度状态失败: {e}")
+            self.logger.error(f"❌ 更新组调度失败: {e}")
 
     async def _activate_group(self, group_id: int):
         """激活组"""
@@ -199,12 +208,8 @@ class TaskScheduler:
     async def _update_group_status(self, group_id: int, status: str):
         """更新组状态"""
         try:
-            await self.database._connection.execute(
-                'UPDATE forwarding_groups SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
-                (status, group_id)
-            )
-            await self.database._connection.commit()
-            
+            await self.database.update_group_status(group_id, status)
+
             # 更新任务状态
             self.job_status[group_id] = {
                 'status': status,
@@ -219,6 +224,10 @@ class TaskScheduler:
         try:
             self.logger.info("🧹 开始每日数据清理...")
             
+            # 归档过期消息记录（先于清理执行，避免记录被直接删除）
+            if self.archiver:
+                await self.archiver.archive_old_messages()
+            
             # 清理旧数据
             retention_days = self.settings.log_retention_days
             await self.database.cleanup_old_data(retention_days)
@@ -253,26 +262,8 @@ class TaskScheduler:
         try:
             self.logger.debug("🔄 开始配置同步检查...")
             
-            # 检查是否有新的组调度需要加载
-            current_groups = await self.database.get_forwarding_groups()
-            
-            for group in current_groups:
-                group_id = group['id']
-                
-                # 检查是否有调度但未添加任务
-                if group['schedule_start'] and group['schedule_end']:
-                    if group_id not in self.scheduled_jobs:
-                        await self._add_group_schedule(
-                            group_id,
-                            group['schedule_start'],
-                            group['schedule_end']
-                        )
-                        self.logger.info(f"📅 自动添加新的组调度: 组{group_id}")
-                
-                # 检查是否取消了调度
-                elif group_id in self.scheduled_jobs:
-                    await self._remove_group_schedule(group_id)
-                    self.logger.info(f"📅 自动移除组调度: 组{group_id}")
+            # 兜底其它进程直接写库的调度变更（本进程的变更通过通知即时生效）
+            await self._load_group_schedules()
             
             self.logger.debug("✅ 配置同步检查完成")
             
@@ -304,50 +295,73 @@ class TaskScheduler:
     async def _backup_data(self):
         """备份数据"""
         try:
-            import shutil
             from pathlib import Path
             from datetime import datetime
-            
+            from utils.backup import create_backup
+
             backup_dir = Path('backup')
             backup_dir.mkdir(exist_ok=True)
-            
-            # 备份数据库
-            db_file = Path('data/forwarder.db')
+
+            # 备份数据库（在线备份API，在工作线程中分步复制，不阻塞转发）
+            # 服务端数据库（SQLAlchemy后端）由数据库自身的备份机制负责
+            if self.database.db_path is None:
+                self.logger.info("ℹ️ 当前存储后端不是本地SQLite文件，跳过数据库备份")
+                return
+
+            db_file = Path(self.database.db_path)
             if db_file.exists():
                 timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
                 backup_file = backup_dir / f'forwarder_{timestamp}.db'
-                shutil.copy2(db_file, backup_file)
-                self.logger.info(f"💾 数据库备份完成: {backup_file}")
-            
+                loop = asyncio.get_running_loop()
+                result = await loop.run_in_executor(
+                    None,
+                    create_backup,
+                    str(db_file),
+                    str(backup_file),
+                    self.settings.backup_pages_per_step,
+                    self.settings.backup_step_sleep,
+                    self.settings.backup_compression
+                )
+                if result:
+                    self.logger.info(f"💾 数据库备份完成: {result}")
+                else:
+                    self.logger.error("❌ 数据库备份失败，保留现有备份")
+                    return
+
             # 清理旧备份
-            backup_files = sorted(backup_dir.glob('forwarder_*.db'))
-            if len(backup_files) > 7:  # 保留最近7个备份
-                for old_backup in backup_files[:-7]:
+            max_backups = self.settings.max_backup_files
+            backup_files = sorted(backup_dir.glob('forwarder_*.db*'))
+            if len(backup_files) > max_backups:
+                for old_backup in backup_files[:-max_backups]:
                     old_backup.unlink()
                     self.logger.info(f"🗑️ 删除旧备份: {old_backup}")
-            
+
         except Exception as e:
             self.logger.error(f"❌ 备份数据失败: {e}")
 
     async def add_group_schedule(self, group_id: int, start_time: str, end_time: str) -> Dict[str, Any]:
-        """添加组调度"""
+        """添加组调度（单个时间窗）"""
+        return await self.set_group_windows(group_id, [(start_time, end_time)])
+
+    async def set_group_windows(self, group_id: int, windows: List, timezone_name: str = None) -> Dict[str, Any]:
+        """设置组调度时间窗（可多个）和时区"""
         try:
             # 验证时间格式
             try:
-                dt_time.fromisoformat(start_time)
-                dt_time.fromisoformat(end_time)
-            except ValueError:
+                parsed = parse_window_list(windows)
+            except (ValueError, TypeError):
                 return {'status': 'error', 'message': '时间格式错误，请使用 HH:MM 格式'}
+            if timezone_name and get_timezone(timezone_name) is None:
+                return {'status': 'error', 'message': f'无效的时区: {timezone_name}'}
             
-            # 添加到调度器
-            await self._add_group_schedule(group_id, start_time, end_time)
-            
-            # 更新数据库
-            await self.database.set_group_schedule(group_id, start_time, end_time)
+            # 更新数据库后立即应用
+            await self.database.set_group_windows(group_id, parsed, timezone_name)
+            await self._reload_group_schedule(group_id)
             
+            description = ', '.join(f'{start}-{end}' for start, end in parsed)
             return {
                 'status': 'success',
-                'message': f'调度设置成功: {start_time}-{end_time}'
+                'message': f'调度设置成功: {description}'
             }
             
         except Exception as e:
@@ -360,7 +374,8 @@ class TaskScheduler:
             await self._remove_group_schedule(group_id)
             
             # 更新数据库
-            await self.database.set_group_schedule(group_id, None, None)
+            await self.database.set_group_windows(group_id, [], None)
+            self._arm_boundary_job()
             
             return {'status': 'success', 'message': '调度已移除'}
             
@@ -369,45 +384,37 @@ class TaskScheduler:
             return {'status': 'error', 'message': f'移除失败: {str(e)}'}
 
     async def _remove_group_schedule(self, group_id: int):
-        """移除组调度任务"""
+        """移除组调度时间窗"""
         try:
-            if group_id in self.scheduled_jobs:
-                job_info = self.scheduled_jobs[group_id]
-                
-                # 移除调度任务
-                try:
-                    self.scheduler.remove_job(job_info['start_job_id'])
-                    self.scheduler.remove_job(job_info['end_job_id'])
-                except:
-                    pass  # 任务可能已经不存在
-                
-                # 清理记录
-                del self.scheduled_jobs[group_id]
-                if group_id in self.job_status:
-                    del self.job_status[group_id]
-                
+            if self.schedule_table.get(group_id) is not None:
+                self.schedule_table.remove_group(group_id)
+                self.job_status.pop(group_id, None)
                 self.logger.info(f"📅 移除组调度: 组{group_id}")
             
         except Exception as e:
             self.logger.error(f"❌ 移除组调度任务失败: {e}")
 
+    def _schedule_info(self, group_id: int, schedule) -> Dict[str, Any]:
+        status = self.job_status.get(group_id, {})
+        start_time, end_time = schedule.windows[0]
+        return {
+            'group_id': group_id,
+            'start_time': start_time,
+            'end_time': end_time,
+            'windows': schedule.describe(),
+            'timezone': schedule.timezone_name,
+            'current_status': status.get('status', 'unknown'),
+            'last_updated': status.get('updated_at')
+        }
+
     async def get_schedule_status(self, group_id: int = None) -> Dict[str, Any]:
         """获取调度状态"""
         try:
             if group_id:
                 # 获取指定组的调度状态
-                if group_id in self.scheduled_jobs:
-                    job_info = self.scheduled_jobs[group_id]
-                    status = self.job_status.get(group_id, {})
-                    
-                    return {
-                        'group_id': group_id,
-                        'scheduled': True,
-                        'start_time': job_info['start_time'],
-                        'end_time': job_info['end_time'],
-                        'current_status': status.get('status', 'unknown'),
-                        'last_updated': status.get('updated_at')
-                    }
+                schedule = self.schedule_table.get(group_id)
+                if schedule is not None:
+                    return dict(self._schedule_info(group_id, schedule), scheduled=True)
                 else:
                     return {
                         'group_id': group_id,
@@ -416,17 +423,10 @@ class TaskScheduler:
                     }
             else:
                 # 获取所有调度状态
-                all_schedules = []
-                
-                for group_id, job_info in self.scheduled_jobs.items():
-                    status = self.job_status.get(group_id, {})
-                    all_schedules.append({
-                        'group_id': group_id,
-                        'start_time': job_info['start_time'],
-                        'end_time': job_info['end_time'],
-                        'current_status': status.get('status', 'unknown'),
-                        'last_updated': status.get('updated_at')
-                    })
+                all_schedules = [
+                    self._schedule_info(group_id, schedule)
+                    for group_id, schedule in self.schedule_table.items()
+                ]
                 
                 return {
                     'total_scheduled': len(all_schedules),
@@ -450,7 +450,7 @@ class TaskScheduler:
                 'total_jobs': len(jobs),
                 'system_jobs': len(system_jobs),
                 'group_jobs': len(group_jobs),
-                'scheduled_groups': len(self.scheduled_jobs),
+                'scheduled_groups': len(self.schedule_table),
                 'scheduler_running': self.scheduler.running,
                 'is_running': self.is_running
             }
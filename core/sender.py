@@ -11,6 +11,8 @@ from telegram import Bot
 from telegram.constants import ParseMode
 from telegram.error import TelegramError, RetryAfter, Forbidden
 
+from utils.fair_queue import WeightedFairQueue
+
 
 class MessageSender:
     """消息发送器"""
@@ -25,8 +27,8 @@ class MessageSender:
         self.current_bot_index = 0
         self.bot_status: Dict[str, Dict] = {}
         
-        # 发送限制
-        self.send_queue = asyncio.Queue()
+        # 发送限制（按搬运组加权公平排队，单个组的大量消息不会挤占其它组）
+        self.send_queue = WeightedFairQueue()
         self.hourly_count = 0
         self.last_hour_reset = time.time()
         self.last_send_time = 0
@@ -76,11 +78,8 @@ class MessageSender:
         """加载发送Bot"""
         try:
             # 从数据库获取Bot列表
-            cursor = await self.database._connection.execute(
-                'SELECT * FROM sender_bots WHERE status = "active"'
-            )
-            rows = await cursor.fetchall()
-            
+            rows = await self.database.get_sender_bots()
+
             for row in rows:
                 bot_data = dict(row)
                 try:
@@ -117,12 +116,8 @@ class MessageSender:
             bot_info = await bot.get_me()
             
             # 添加到数据库
-            await self.database._connection.execute(
-                'INSERT OR REPLACE INTO sender_bots (token, username) VALUES (?, ?)',
-                (token, bot_info.username)
-            )
-            await self.database._connection.commit()
-            
+            await self.database.add_sender_bot(token, bot_info.username)
+
             # 添加到内存
             self.bots.append(bot)
             self.bot_status[token] = {
@@ -139,29 +134,33 @@ class MessageSender:
             self.logger.error(f"❌ 添加Bot失败: {e}")
             return {'status': 'error', 'message': f'添加失败: {str(e)}'}
 
-    async def send_message(self, chat_id: int, content: str, parse_mode: str = ParseMode.HTML) -> Dict[str, Any]:
-        """发送文本消息"""
+    async def send_message(self, chat_id: int, content: str, parse_mode: str = ParseMode.HTML,
+                           group_id: int = None, weight: int = None) -> Dict[str, Any]:
+        """发送文本消息（group_id/weight 为所属搬运组及其优先级）"""
         message_data = {
             'type': 'text',
             'chat_id': chat_id,
             'content': content,
-            'parse_mode': parse_mode
+            'parse_mode': parse_mode,
+            'group_id': group_id
         }
         
-        await self.send_queue.put(message_data)
+        await self.send_queue.put(message_data, group_id, weight)
         
         return {'status': 'queued', 'message': '消息已加入发送队列'}
 
-    async def send_media_group(self, chat_id: int, media_list: List[Dict], caption: str = None) -> Dict[str, Any]:
+    async def send_media_group(self, chat_id: int, media_list: List[Dict], caption: str = None,
+                               group_id: int = None, weight: int = None) -> Dict[str, Any]:
         """发送媒体组"""
         message_data = {
             'type': 'media_group',
             'chat_id': chat_id,
             'media_list': media_list,
-            'caption': caption
+            'caption': caption,
+            'group_id': group_id
         }
         
-        await self.send_queue.put(message_data)
+        await self.send_queue.put(message_data, group_id, weight)
         
         return {'status': 'queued', 'message': '媒体组已加入发送队列'}
 
@@ -336,12 +335,8 @@ class MessageSender:
             error_count = self.bot_status[token]['error_count']
             
             # 更新数据库
-            await self.database._connection.execute(
-                'UPDATE sender_bots SET error_count = ? WHERE token = ?',
-                (error_count, token)
-            )
-            await self.database._connection.commit()
-            
+            await self.database.update_bot_error_count(token, error_count)
+
             # 如果错误次数过多，暂停Bot
             if error_count >= 5:
                 self.bot_status[token]['status'] = 'suspended'
@@ -387,6 +382,7 @@ class MessageSender:
                 'hourly_count': self.hourly_count,
                 'hourly_limit': self.settings.hourly_limit,
                 'queue_size': self.send_queue.qsize(),
+                'group_queues': self.send_queue.stats(),
                 'bots': bot_stats
             }
             
@@ -398,6 +394,7 @@ class MessageSender:
                 'hourly_count': 0,
                 'hourly_limit': 0,
                 'queue_size': 0,
+                'group_queues': {},
                 'bots': []
             }
 
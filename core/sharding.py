@@ -0,0 +1,647 @@
+"""
+组分片 - 多进程模式下按组ID哈希把搬运组分给多个工作进程
+
+父进程保留监听账号、Bot 和组管理，收到的源消息（MessageRecord）经管道批量发给持有对应组的
+工作进程；每个工作进程运行一个只加载本分片组的 GroupProcessor，过滤和哈希计算分摊到多个 CPU 核。
+
+共享状态:
+- 去重: 父进程在分发前查库（消息记录由工作进程写入同一个数据库）
+- 目标频道投递索引: 由父进程统一维护，工作进程发送前通过管道向父进程占位，跨分片同样只发送一次
+- 组配置变更: 父进程的变更通知转发给持有该组的工作进程；重新启用正则规则的命令转发给所有工作进程
+
+背压和重发: 源消息以请求的形式发给工作进程，处理完成的应答即确认；每个分片未确认的消息数有上限，
+达到上限时监听器等待。未确认的消息保留在父进程，工作进程意外退出后重发给重启的进程
+（已投递的目标频道由投递索引拦截，不会重复发送）。
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import pickle
+import signal
+import threading
+import time
+import zlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from config.settings import Settings
+from config.storage import create_database
+from core.group_processor import GroupProcessor
+from core.source_message import MessageRecord, SourceMessage
+from utils.logger import setup_logging
+
+
+def shard_of(group_id: int, shard_count: int) -> int:
+    """组ID -> 分片序号（与进程数有关，修改进程数后组会重新分配）"""
+    if shard_count <= 1:
+        return 0
+    return zlib.crc32(str(group_id).encode()) % shard_count
+
+
+def shard_log_file(log_file: Optional[str], index: int) -> Optional[str]:
+    """工作进程的日志文件（logs/forwarder.log -> logs/forwarder.shard0.log）"""
+    if not log_file:
+        return None
+    path = Path(log_file)
+    return str(path.with_name(f"{path.stem}.shard{index}{path.suffix}"))
+
+
+# ---- 消息的序列化形式（MessageRecord 按元组 pickle） ----
+
+def encode_source(source: SourceMessage) -> Tuple:
+    """SourceMessage -> (消息记录, 频道ID)"""
+    return MessageRecord.from_message(source.message), source.channel_id
+
+
+def decode_source(data: Tuple) -> SourceMessage:
+    record, channel_id = data
+    return SourceMessage(record, channel_id)
+
+
+def encode_media_group(messages: List[Dict]) -> List[Tuple]:
+    """媒体组 [{'message', 'channel_id', ...}] -> [(消息记录, 频道ID)]"""
+    return [(MessageRecord.from_message(msg_data['message']), msg_data['channel_id']) for msg_data in messages]
+
+
+def decode_media_group(items: List[Tuple]) -> List[Dict]:
+    return [
+        {'message': record, 'source': SourceMessage(record, channel_id), 'channel_id': channel_id}
+        for record, channel_id in items
+    ]
+
+
+# ---- 进程间通道 ----
+
+class ShardChannel:
+    """进程间消息通道
+
+    帧为 (类型, 请求ID, 参数...)，发送时把积压的帧打包成一次 pickle 写入管道，接收由后台线程完成；
+    post 不等待应答，request 等待对端处理函数的返回值。收到的帧由 consumers 个任务并发处理。
+    """
+
+    def __init__(self, conn, handler: Callable[..., Awaitable[Any]], consumers: int = 1, name: str = 'shard'):
+        self.conn = conn
+        self.handler = handler
+        self.consumers = max(consumers, 1)
+        self.name = name
+        self.logger = logging.getLogger(__name__)
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._outbox: List[Tuple] = []
+        self._outbox_event: Optional[asyncio.Event] = None
+        self._sending = False
+        self._inbox: Optional[asyncio.Queue] = None
+        self._requests: Dict[int, asyncio.Future] = {}
+        self._next_request_id = 0
+        self._tasks: List[asyncio.Task] = []
+        # 单线程发送保证帧的顺序
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'{name}-send')
+        self.closed: Optional[asyncio.Event] = None
+
+        self.sent_frames = 0
+        self.received_frames = 0
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._outbox_event = asyncio.Event()
+        self._inbox = asyncio.Queue()
+        self.closed = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._write_loop())]
+        self._tasks += [asyncio.create_task(self._consume()) for _ in range(self.consumers)]
+        threading.Thread(target=self._read_loop, name=f'{self.name}-recv', daemon=True).start()
+
+    async def stop(self):
+        """发出积压的帧后关闭通道"""
+        await self.flush()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        self._on_closed()
+        try:
+            self.conn.close()
+        except OSError:
+            pass
+        self._executor.shutdown(wait=False)
+
+    async def flush(self, timeout: float = 5):
+        """等待积压的帧写入管道"""
+        deadline = time.monotonic() + timeout
+        while (self._outbox or self._sending) and not self.closed.is_set() and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+
+    @property
+    def pending(self) -> int:
+        return len(self._outbox)
+
+    def post(self, kind: str, *args):
+        """发送不需要应答的帧"""
+        self._enqueue((kind, 0) + args)
+
+    async def request(self, kind: str, *args) -> Any:
+        """发送请求并等待对端返回"""
+        if self.closed.is_set():
+            raise ConnectionError(f"{self.name} 通道已关闭")
+        self._next_request_id += 1
+        request_id = self._next_request_id
+        future = self._loop.create_future()
+        self._requests[request_id] = future
+        self._enqueue((kind, request_id) + args)
+        return await future
+
+    def _enqueue(self, frame: Tuple):
+        if self.closed.is_set():
+            return
+        self._outbox.append(frame)
+        self._outbox_event.set()
+
+    async def _write_loop(self):
+        while True:
+            await self._outbox_event.wait()
+            self._outbox_event.clear()
+            while self._outbox:
+                frames, self._outbox = self._outbox, []
+                self._sending = True
+                try:
+                    data = pickle.dumps(frames, protocol=pickle.HIGHEST_PROTOCOL)
+                    await self._loop.run_in_executor(self._executor, self.conn.send_bytes, data)
+                    self.sent_frames += len(frames)
+                except (OSError, EOFError, ValueError) as e:
+                    self.logger.warning(f"⚠️ {self.name} 通道写入失败: {e}")
+                    self._on_closed()
+                    return
+                finally:
+                    self._sending = False
+
+    def _read_loop(self):
+        """后台线程: 读取并反序列化帧，交给事件循环"""
+        while True:
+            try:
+                frames = pickle.loads(self.conn.recv_bytes())
+            except (EOFError, OSError):
+                break
+            except Exception as e:
+                self.logger.error(f"❌ {self.name} 通道数据解析失败: {e}")
+                continue
+            try:
+                self._loop.call_soon_threadsafe(self._on_frames, frames)
+            except RuntimeError:
+                return
+        try:
+            self._loop.call_soon_threadsafe(self._on_closed)
+        except RuntimeError:
+            pass
+
+    def _on_frames(self, frames: List[Tuple]):
+        self.received_frames += len(frames)
+        for frame in frames:
+            if frame[0] == 'reply':
+                future = self._requests.pop(frame[1], None)
+                if future is not None and not future.done():
+                    future.set_result(frame[2])
+            else:
+                self._inbox.put_nowait(frame)
+
+    async def _consume(self):
+        while True:
+            kind, request_id, *args = await self._inbox.get()
+            try:
+                result = await self.handler(kind, *args)
+            except Exception as e:
+                self.logger.error(f"❌ {self.name} 处理 {kind} 失败: {e}")
+                result = None
+            if request_id:
+                self._enqueue(('reply', request_id, result))
+
+    def _on_closed(self):
+        if self.closed.is_set():
+            return
+        self.closed.set()
+        for future in self._requests.values():
+            if not future.done():
+                future.set_exception(ConnectionError(f"{self.name} 通道已关闭"))
+        self._requests.clear()
+
+
+# ---- 工作进程 ----
+
+class RemoteDeliveryIndex:
+    """工作进程的投递索引: 占位/确认/释放都交给父进程的投递索引"""
+
+    def __init__(self, channel: ShardChannel):
+        self.channel = channel
+
+    async def load(self):
+        """索引由父进程加载"""
+
+    async def claim(self, target_channel_id: int, content_hash: str) -> bool:
+        if not content_hash:
+            return True
+        try:
+            return bool(await self.channel.request('claim', target_channel_id, content_hash))
+        except ConnectionError:
+            # 与父进程断开时不发送，避免重复
+            return False
+
+    def confirm(self, target_channel_id: int, content_hash: str):
+        if content_hash:
+            self.channel.post('confirm', target_channel_id, content_hash)
+
+    def release(self, target_channel_id: int, content_hash: str):
+        if content_hash:
+            self.channel.post('release', target_channel_id, content_hash)
+
+    def stats(self) -> Dict[str, Any]:
+        return {'remote': True}
+
+
+class ShardWorker:
+    """工作进程: 只加载本分片的组，处理父进程转发来的消息"""
+
+    # 并发处理的帧数（与监听器的队列处理任务数一致）
+    CONSUMERS = 3
+
+    def __init__(self, settings, database, index: int, count: int, conn):
+        self.settings = settings
+        self.database = database
+        self.index = index
+        self.count = count
+        self.logger = logging.getLogger(__name__)
+
+        self.channel = ShardChannel(conn, self.handle, self.CONSUMERS, name=f'shard{index}')
+        self.processor = GroupProcessor(
+            settings, database, group_filter=lambda group_id: shard_of(group_id, count) == index
+        )
+        self.processor.delivery_index = RemoteDeliveryIndex(self.channel)
+        self._stopping: Optional[asyncio.Event] = None
+
+    async def run(self):
+        self._stopping = asyncio.Event()
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, self._stopping.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+        # 组加载完成后再读取通道，重启后重发的消息不会遇到空的组缓存
+        await self.processor.start()
+        self.channel.start()
+        self.channel.post('ready', len(self.processor.group_cache))
+        self.logger.info(f"✅ 分片 {self.index}/{self.count} 已启动，持有 {len(self.processor.group_cache)} 个组")
+
+        waiters = [asyncio.create_task(self._stopping.wait()), asyncio.create_task(self.channel.closed.wait())]
+        await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+        for waiter in waiters:
+            waiter.cancel()
+
+        # 停止时合并发送缓冲区还会向父进程占位，通道在处理器停止后再关闭
+        await self.processor.stop()
+        await self.channel.stop()
+        self.logger.info(f"👋 分片 {self.index} 已停止")
+
+    async def handle(self, kind: str, *args) -> Any:
+        processor = self.processor
+        if kind == 'source':
+            source, group_ids = args
+            return await processor.process_source_message(decode_source(source), group_ids)
+        if kind == 'media':
+            items, content_hash, group_ids = args
+            messages = decode_media_group(items)
+            for group_id in group_ids:
+                await processor.process_media_group(group_id, messages, content_hash)
+            return None
+        if kind == 'batch':
+            group_id, items = args
+            return await processor.process_message_batch(group_id, items)
+        if kind == 'refresh':
+            processor._on_group_changed(args[0])
+            return None
+        if kind == 'enable_regex':
+            await processor.enable_regex_rule(args[0])
+            return None
+        if kind == 'reload':
+            self.settings.reload()
+            await processor.reload_config()
+            return None
+        if kind == 'stop':
+            self._stopping.set()
+            return None
+        self.logger.warning(f"⚠️ 未知的分片消息类型: {kind}")
+        return None
+
+
+def worker_main(index: int, count: int, conn, config_file: str):
+    """工作进程入口（spawn 启动）"""
+    # Ctrl+C 会发给整个进程组，由父进程统一停止工作进程
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    settings = Settings(config_file)
+    setup_logging(settings.log_level, shard_log_file(settings.log_file, index))
+    try:
+        asyncio.run(_run_worker(settings, index, count, conn))
+    except Exception as e:
+        logging.getLogger(__name__).error(f"❌ 分片 {index} 异常退出: {e}")
+        raise
+
+
+async def _run_worker(settings, index: int, count: int, conn):
+    database = create_database(settings)
+    await database.init()
+    try:
+        await ShardWorker(settings, database, index, count, conn).run()
+    finally:
+        await database.close()
+
+
+# ---- 父进程 ----
+
+class _Shard:
+    __slots__ = ('index', 'process', 'channel', 'routed', 'dropped', 'replayed', 'restarts', 'started_at', 'ready')
+
+    def __init__(self, index: int, process, channel: ShardChannel, restarts: int = 0):
+        self.index = index
+        self.process = process
+        self.channel = channel
+        self.routed = 0
+        self.dropped = 0
+        self.replayed = 0
+        self.restarts = restarts
+        self.started_at = time.time()
+        self.ready = False
+
+
+class ShardSupervisor:
+    """分片监督者（父进程）
+
+    对监听器提供与 GroupProcessor 相同的分发接口，按组分片把消息转发给工作进程；
+    父进程的 GroupProcessor 仍维护全部组的缓存（频道索引、管理命令），但不再处理消息。
+    工作进程意外退出时自动重启，并重发它未确认的消息。
+    """
+
+    MONITOR_INTERVAL = 2
+
+    def __init__(self, settings, database, group_processor):
+        self.settings = settings
+        self.database = database
+        self.group_processor = group_processor
+        self.shard_count = max(settings.shard_workers, 1)
+        self.logger = logging.getLogger(__name__)
+
+        self._shards: List[Optional[_Shard]] = [None] * self.shard_count
+        # 每个分片未确认的消息: 帧ID -> (类型, 参数)，跨工作进程重启保留
+        self._in_flight: List[Dict[int, Tuple]] = [{} for _ in range(self.shard_count)]
+        self._slots: List[asyncio.Semaphore] = []
+        self._acks: set = set()
+        self._next_frame_id = 0
+        self._monitor_task: Optional[asyncio.Task] = None
+        self.is_running = False
+
+    async def start(self):
+        self.logger.info(f"🔄 启动 {self.shard_count} 个分片工作进程...")
+        self.is_running = True
+        self._slots = [asyncio.Semaphore(max(self.settings.shard_max_in_flight, 1)) for _ in range(self.shard_count)]
+        self.database.add_group_listener(self._on_group_changed)
+        self.group_processor.add_regex_listener(self._on_regex_enabled)
+        for index in range(self.shard_count):
+            self._spawn(index)
+        self._monitor_task = asyncio.create_task(self._monitor_loop())
+
+    async def stop(self):
+        self.logger.info("🛑 停止分片工作进程...")
+        # 等待已发出的消息处理完成，监控任务此时仍会重启退出的工作进程
+        await self._drain(self.settings.shard_stop_timeout)
+        self.is_running = False
+        self.database.remove_group_listener(self._on_group_changed)
+        self.group_processor.remove_regex_listener(self._on_regex_enabled)
+        if self._monitor_task:
+            self._monitor_task.cancel()
+            try:
+                await self._monitor_task
+            except asyncio.CancelledError:
+                pass
+            self._monitor_task = None
+
+        shards = [shard for shard in self._shards if shard]
+        for shard in shards:
+            shard.channel.post('stop')
+        # 工作进程停止时还会向父进程占位，等它们退出后再关闭通道
+        await asyncio.gather(*(self._join(shard) for shard in shards))
+        for shard in shards:
+            await shard.channel.stop()
+        self._shards = [None] * self.shard_count
+        for task in list(self._acks):
+            task.cancel()
+        self.logger.info("✅ 分片工作进程已停止")
+
+    async def _drain(self, timeout: float):
+        deadline = time.monotonic() + timeout
+        while any(self._in_flight) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        lost = sum(len(frames) for frames in self._in_flight)
+        if lost:
+            self.logger.warning(f"⚠️ 停止时仍有 {lost} 条消息未处理完")
+
+    async def _join(self, shard: _Shard):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, shard.process.join, self.settings.shard_stop_timeout)
+        if shard.process.is_alive():
+            self.logger.warning(f"⚠️ 分片 {shard.index} 未按时退出，强制结束")
+            shard.process.terminate()
+            await loop.run_in_executor(None, shard.process.join, 5)
+
+    def _spawn(self, index: int, restarts: int = 0):
+        # 工作进程内的过滤进程池需要非守护进程；父进程退出时工作进程读到 EOF 自行停止
+        context = multiprocessing.get_context('spawn')
+        parent_conn, child_conn = context.Pipe()
+        process = context.Process(
+            target=worker_main,
+            args=(index, self.shard_count, child_conn, self.settings.config_file),
+            name=f'forwarder-shard-{index}'
+        )
+        process.start()
+        child_conn.close()
+
+        channel = ShardChannel(
+            parent_conn, lambda kind, *args: self._handle(index, kind, *args),
+            consumers=4, name=f'shard{index}'
+        )
+        channel.start()
+        self._shards[index] = _Shard(index, process, channel, restarts)
+        self.logger.info(f"🚀 分片 {index} 进程已启动: pid {process.pid}")
+
+    async def _monitor_loop(self):
+        """工作进程退出时重启"""
+        while self.is_running:
+            try:
+                await asyncio.sleep(self.MONITOR_INTERVAL)
+                for index, shard in enumerate(self._shards):
+                    if shard is None or shard.process.is_alive():
+                        continue
+                    self.logger.error(f"❌ 分片 {index} 进程退出 (exitcode {shard.process.exitcode})，正在重启")
+                    await shard.channel.stop()
+                    self._spawn(index, shard.restarts + 1)
+                    self._replay(index)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                self.logger.error(f"❌ 分片监控异常: {e}")
+
+    async def _handle(self, index: int, kind: str, *args) -> Any:
+        """处理工作进程发来的请求"""
+        delivery_index = self.group_processor.delivery_index
+        if kind == 'claim':
+            return await delivery_index.claim(*args)
+        if kind == 'confirm':
+            delivery_index.confirm(*args)
+        elif kind == 'release':
+            delivery_index.release(*args)
+        elif kind == 'ready':
+            shard = self._shards[index]
+            if shard:
+                shard.ready = True
+            self.logger.info(f"✅ 分片 {index} 已就绪，持有 {args[0]} 个组")
+        return None
+
+    def _on_group_changed(self, group_id: int):
+        """组配置变更通知转发给持有该组的工作进程"""
+        self._post(shard_of(group_id, self.shard_count), 'refresh', group_id)
+
+    def _on_regex_enabled(self, pattern: Optional[str]):
+        """正则规则在各工作进程内独立统计和停用，重新启用时通知所有工作进程"""
+        for index in range(self.shard_count):
+            self._post(index, 'enable_regex', pattern)
+
+    async def _deliver(self, index: int, kind: str, *args) -> bool:
+        """发送需要确认的消息；分片未确认的消息达到上限时等待"""
+        if not self.is_running:
+            self.logger.warning(f"⚠️ 分片已停止，丢弃 {kind}")
+            return False
+        await self._slots[index].acquire()
+        self._next_frame_id += 1
+        frame_id = self._next_frame_id
+        self._in_flight[index][frame_id] = (kind, args)
+        shard = self._shards[index]
+        if shard:
+            shard.routed += 1
+        self._send(index, frame_id)
+        return True
+
+    def _send(self, index: int, frame_id: int):
+        shard = self._shards[index]
+        if shard is None or shard.channel.closed.is_set():
+            # 工作进程重启后由监控任务重发
+            return
+        kind, args = self._in_flight[index][frame_id]
+        task = asyncio.create_task(shard.channel.request(kind, *args))
+        self._acks.add(task)
+        task.add_done_callback(lambda done: self._on_ack(index, frame_id, done))
+
+    def _on_ack(self, index: int, frame_id: int, task: asyncio.Task):
+        self._acks.discard(task)
+        if task.cancelled() or task.exception() is not None:
+            # 通道断开: 消息保留到工作进程重启后重发
+            return
+        if self._in_flight[index].pop(frame_id, None) is not None:
+            self._slots[index].release()
+
+    def _replay(self, index: int):
+        """把未确认的消息按原顺序重发给重启的工作进程"""
+        frame_ids = sorted(self._in_flight[index])
+        if not frame_ids:
+            return
+        self._shards[index].replayed += len(frame_ids)
+        self.logger.warning(f"🔁 分片 {index} 重发 {len(frame_ids)} 条未处理完的消息")
+        for frame_id in frame_ids:
+            self._send(index, frame_id)
+
+    def _post(self, index: int, kind: str, *args) -> bool:
+        shard = self._shards[index]
+        if shard is None or shard.channel.closed.is_set():
+            if shard:
+                shard.dropped += 1
+            self.logger.warning(f"⚠️ 分片 {index} 不可用，丢弃 {kind}")
+            return False
+        shard.channel.post(kind, *args)
+        shard.routed += 1
+        return True
+
+    def _split(self, group_ids: Sequence[int]) -> Dict[int, List[int]]:
+        by_shard: Dict[int, List[int]] = {}
+        for group_id in group_ids:
+            by_shard.setdefault(shard_of(group_id, self.shard_count), []).append(group_id)
+        return by_shard
+
+    # 与 GroupProcessor 相同的分发接口（监听器调用）
+
+    def get_channel_groups(self, channel_id: int) -> Tuple[int, ...]:
+        return self.group_processor.get_channel_groups(channel_id)
+
+    async def process_source_message(self, source, group_ids: Optional[Sequence[int]] = None) -> int:
+        """按分片转发一条源消息，返回转发给工作进程的组数"""
+        if group_ids is None:
+            group_ids = self.get_channel_groups(source.channel_id)
+        routed = 0
+        wire = None
+        for index, shard_group_ids in self._split(group_ids).items():
+            if wire is None:
+                wire = encode_source(source)
+            if await self._deliver(index, 'source', wire, shard_group_ids):
+                routed += len(shard_group_ids)
+        return routed
+
+    async def process_source_media_group(self, messages: List[Dict], content_hash: str, group_ids: Sequence[int]):
+        items = None
+        for index, shard_group_ids in self._split(group_ids).items():
+            if items is None:
+                items = encode_media_group(messages)
+            await self._deliver(index, 'media', items, content_hash, shard_group_ids)
+
+    async def process_media_group(self, group_id: int, messages: List[Dict], content_hash: str):
+        await self.process_source_media_group(messages, content_hash, [group_id])
+
+    async def process_message_batch(self, group_id: int, items: List[Tuple[Any, str]]) -> int:
+        """整批交给持有该组的工作进程，返回发送的消息数"""
+        if not items:
+            return 0
+        shard = self._shards[shard_of(group_id, self.shard_count)]
+        if shard is None:
+            return 0
+        try:
+            shard.routed += 1
+            result = await shard.channel.request(
+                'batch', group_id,
+                [(MessageRecord.from_message(message), content_hash) for message, content_hash in items]
+            )
+            return result or 0
+        except ConnectionError as e:
+            self.logger.error(f"❌ 分片 {shard.index} 批量处理失败: {e}")
+            return 0
+
+    async def reload_config(self):
+        for index in range(self.shard_count):
+            self._post(index, 'reload')
+
+    async def get_statistics(self) -> Dict[str, Any]:
+        """各分片的进程状态、持有组数和转发量"""
+        groups = Counter(shard_of(group_id, self.shard_count) for group_id in self.group_processor.group_cache)
+        shards = []
+        for index, shard in enumerate(self._shards):
+            if shard is None:
+                continue
+            shards.append({
+                'index': index,
+                'pid': shard.process.pid,
+                'alive': shard.process.is_alive(),
+                'ready': shard.ready,
+                'groups': groups.get(index, 0),
+                'routed': shard.routed,
+                'dropped': shard.dropped,
+                'pending': shard.channel.pending,
+                'in_flight': len(self._in_flight[index]),
+                'replayed': shard.replayed,
+                'restarts': shard.restarts,
+                'uptime': int(time.time() - shard.started_at)
+            })
+        return {'workers': self.shard_count, 'shards': shards}
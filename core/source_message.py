@@ -0,0 +1,156 @@
+"""
+源消息 - 频道级的消息中间表示
+
+MessageRecord 是接收消息时由 Telethon 消息生成的紧凑记录，队列、媒体组缓冲和跨进程传递都使用它；
+同一源频道被多个搬运组监听时，内容哈希、媒体信息和实体解析每条消息只计算一次，
+各组的过滤计划都基于这一份结果执行。
+"""
+
+import hashlib
+import logging
+from typing import List, Optional, Tuple
+
+from telethon.tl.types import MessageMediaPhoto, MessageMediaDocument
+
+from utils.entities import Span, entities_to_dicts, get_raw_text, normalize_entities
+
+logger = logging.getLogger(__name__)
+
+
+def media_key(message) -> str:
+    """消息媒体的去重标识（photo_ID / doc_ID），无媒体或其它媒体返回空串"""
+    if isinstance(message, MessageRecord):
+        return message.media_key
+    media = getattr(message, 'media', None)
+    if media:
+        if isinstance(media, MessageMediaPhoto):
+            return f"photo_{media.photo.id}"
+        if isinstance(media, MessageMediaDocument):
+            return f"doc_{media.document.id}"
+    return ""
+
+
+def message_hash(message, text: Optional[str] = None, media: Optional[str] = None) -> str:
+    """生成消息哈希用于去重（文本 + 媒体 + 频道 + 发送者）"""
+    if text is None and media is None and isinstance(message, MessageRecord) and message.content_hash:
+        return message.content_hash
+    try:
+        if text is None:
+            text = message.text or ""
+        if media is None:
+            media = media_key(message)
+        content = f"{text}{media}_{message.chat_id}_{message.from_id}"
+        return hashlib.md5(content.encode('utf-8')).hexdigest()
+
+    except Exception as e:
+        logger.error(f"❌ 生成消息哈希失败: {e}")
+        # 使用消息ID作为备用哈希
+        return f"msg_{message.chat_id}_{message.id}"
+
+
+class MessageRecord:
+    """流水线内部的消息记录，接收时由 Telethon 消息生成一次
+
+    只保留处理需要的字段，属性名与 Telethon Message 一致（id/chat_id/grouped_id/text/message/entities），
+    过滤和哈希代码可以直接使用。实体为字典形式（UTF-16 偏移），日期为 Unix 时间戳（秒）。
+    pickle 时按元组序列化，可用于跨进程传递和持久化。
+    """
+
+    __slots__ = ('id', 'chat_id', 'grouped_id', 'date', 'text', '_raw_text', 'entities', 'media_key', 'content_hash')
+
+    # 与 Bot API 消息兼容（Telethon 消息的说明文字就在 text 中）
+    caption = None
+
+    def __init__(self, id: int, chat_id: Optional[int], text: str = "", raw_text: Optional[str] = None,
+                 entities: Optional[Tuple[dict, ...]] = None, media_key: str = "", grouped_id: Optional[int] = None,
+                 date: Optional[int] = None, content_hash: Optional[str] = None):
+        self.id = id
+        self.chat_id = chat_id
+        self.grouped_id = grouped_id
+        self.date = date
+        self.text = text
+        # 原始文本与 text 相同时不重复保存
+        self._raw_text = raw_text if raw_text != text else None
+        self.entities = entities
+        self.media_key = media_key
+        self.content_hash = content_hash
+
+    @classmethod
+    def from_message(cls, message) -> 'MessageRecord':
+        """由 Telethon 消息生成记录（已是记录时原样返回）"""
+        if isinstance(message, cls):
+            return message
+        text = message.text or ""
+        key = media_key(message)
+        entities = getattr(message, 'entities', None)
+        date = getattr(message, 'date', None)
+        return cls(
+            message.id,
+            message.chat_id,
+            text,
+            get_raw_text(message),
+            tuple(entities_to_dicts(entities)) if entities else None,
+            key,
+            getattr(message, 'grouped_id', None),
+            int(date.timestamp()) if date else None,
+            message_hash(message, text, key)
+        )
+
+    @property
+    def message(self) -> str:
+        """原始文本（实体偏移基于该文本，对应 Telethon 的 message.message）"""
+        return self.text if self._raw_text is None else self._raw_text
+
+    def to_tuple(self) -> Tuple:
+        return (self.id, self.chat_id, self.text, self._raw_text, self.entities,
+                self.media_key, self.grouped_id, self.date, self.content_hash)
+
+    def __reduce__(self):
+        return self.__class__, self.to_tuple()
+
+    def __repr__(self) -> str:
+        return f"MessageRecord(id={self.id}, chat_id={self.chat_id}, grouped_id={self.grouped_id})"
+
+
+class SourceMessage:
+    """一条源频道消息的共享表示，哈希和实体在首次使用时计算并缓存"""
+
+    __slots__ = ('message', 'channel_id', 'text', 'media_key', '_content_hash', '_raw_text', '_spans')
+
+    def __init__(self, message, channel_id: int):
+        self.message = message
+        self.channel_id = channel_id
+        self.text = message.text or ""
+        self.media_key = media_key(message)
+        # MessageRecord 接收时已计算哈希
+        self._content_hash: Optional[str] = message.content_hash if isinstance(message, MessageRecord) else None
+        self._raw_text: Optional[str] = None
+        self._spans: Optional[List[Span]] = None
+
+    @property
+    def id(self) -> int:
+        return self.message.id
+
+    @property
+    def entities(self):
+        return getattr(self.message, 'entities', None)
+
+    @property
+    def content_hash(self) -> str:
+        if self._content_hash is None:
+            self._content_hash = message_hash(self.message, self.text, self.media_key)
+        return self._content_hash
+
+    @property
+    def raw_text(self) -> str:
+        """实体偏移所基于的原始文本"""
+        if self._raw_text is None:
+            self._raw_text = get_raw_text(self.message)
+        return self._raw_text
+
+    @property
+    def spans(self) -> List[Span]:
+        """规范化后的实体（各组共用，过滤时不会修改该列表）"""
+        if self._spans is None:
+            self._spans = normalize_entities(self.raw_text, self.entities)
+        return self._spans
@@ -15,7 +15,7 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent))
 
 from config.settings import Settings
-from config.database import Database
+from config.storage import create_database
 from core.manager import ForwarderManager
 from utils.logger import setup_logging
 
@@ -23,7 +23,7 @@ from utils.logger import setup_logging
 class TelegramForwarder:
     def __init__(self):
         self.settings = Settings()
-        self.database = Database()
+        self.database = create_database(self.settings)
         self.manager = None
         self.running = False
 
@@ -31,7 +31,7 @@ class TelegramForwarder:
         """启动转发程序"""
         try:
             # 设置日志
-            setup_logging(self.settings.log_level, self.settings.log_file)
+            setup_logging(self.settings.log_level, self.settings.log_file, self.settings.slow_query_log)
             logger = logging.getLogger(__name__)
             
             logger.info("🚀 Telegram Forwarder 启动中...")
@@ -42,23 +42,22 @@ backup_database() {
     
     if [[ -f "$db_file" ]]; then
         log_info "备份数据库..."
-        cp "$db_file" "$backup_file"
         
-        # 验证备份
-        if [[ -f "$backup_file" ]]; then
-            local original_size=$(stat -c%s "$db_file")
-            local backup_size=$(stat -c%s "$backup_file")
-            
-            if [[ $original_size -eq $backup_size ]]; then
-                log_info "数据库备份成功: $(basename "$backup_file")"
-                echo "$backup_file"
-            else
-                log_error "数据库备份验证失败"
-                rm -f "$backup_file"
-                return 1
-            fi
+        # 使用SQLite在线备份API分步复制，并对副本执行完整性检查
+        # 直接cp运行中的数据库可能得到损坏的备份，且会遗漏WAL中的数据
+        local python_cmd="python3"
+        if [[ -x "${PROJECT_DIR}/venv/bin/python" ]]; then
+            python_cmd="${PROJECT_DIR}/venv/bin/python"
+        fi
+        
+        if (cd "${PROJECT_DIR}" && "$python_cmd" -m utils.backup "$db_file" "$backup_file" \
+                --pages "${BACKUP_PAGES_PER_STEP:-256}" \
+                --sleep "${BACKUP_STEP_SLEEP:-0.05}" > /dev/null); then
+            log_info "数据库备份成功: $(basename "$backup_file")"
+            echo "$backup_file"
         else
             log_error "数据库备份失败"
+            rm -f "$backup_file"
             return 1
         fi
     else
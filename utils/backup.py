@@ -0,0 +1,176 @@
+"""
+数据库备份工具 - 基于SQLite在线备份API的非阻塞备份
+"""
+
+import argparse
+import gzip
+import logging
+import shutil
+import sqlite3
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+try:
+    import zstandard
+except ImportError:  # zstd为可选依赖，缺失时回退到gzip
+    zstandard = None
+
+
+logger = logging.getLogger(__name__)
+
+# 压缩格式对应的文件后缀
+COMPRESSION_SUFFIXES = {
+    'gzip': '.gz',
+    'zstd': '.zst',
+    'none': ''
+}
+
+# 分步备份因源库被写入而重新开始的最多次数，超过后改为一步复制
+MAX_BACKUP_RESTARTS = 3
+
+
+class _BackupRestarted(Exception):
+    """分步备份重新开始次数超过上限"""
+
+
+def online_backup(source: str, target: str, pages: int = 256, step_sleep: float = 0.05,
+                  max_restarts: int = MAX_BACKUP_RESTARTS) -> int:
+    """使用SQLite在线备份API复制数据库
+
+    每步复制 pages 页，步与步之间休眠 step_sleep 秒，期间写入方不会被长时间阻塞。
+    其它连接写入源库会使分步备份从头开始，重新开始超过 max_restarts 次后改为一步复制全部页，
+    避免繁忙的数据库上备份永远无法完成。
+    备份在独立连接上进行，WAL中尚未检查点的内容也会被包含在内。
+    返回备份文件的页数。
+    """
+    source_path = Path(source)
+    target_path = Path(target)
+    target_path.parent.mkdir(parents=True, exist_ok=True)
+
+    src = sqlite3.connect(str(source_path), timeout=30)
+    dst = sqlite3.connect(str(target_path))
+    try:
+        state = {'remaining': None, 'restarts': 0}
+
+        def _progress(status, remaining, total):
+            # 剩余页数变多说明源库被写入，备份已从头开始
+            last = state['remaining']
+            state['remaining'] = remaining
+            if last is not None and remaining > last:
+                state['restarts'] += 1
+                if state['restarts'] > max_restarts:
+                    raise _BackupRestarted()
+            # 每步之间让出时间给写入方
+            if remaining and step_sleep > 0:
+                time.sleep(step_sleep)
+
+        try:
+            src.backup(dst, pages=pages, progress=_progress)
+        except _BackupRestarted:
+            logger.warning(f"⚠️ 源数据库写入频繁，分步备份已重新开始 {state['restarts']} 次，改为一步复制")
+            src.backup(dst, pages=-1)
+        # 备份文件为单文件格式，便于压缩和恢复
+        dst.execute('PRAGMA journal_mode=DELETE')
+        page_count = dst.execute('PRAGMA page_count').fetchone()[0]
+        return page_count
+    finally:
+        dst.close()
+        src.close()
+
+
+def verify_integrity(db_file: str) -> bool:
+    """对备份文件执行 PRAGMA integrity_check"""
+    conn = sqlite3.connect(str(db_file))
+    try:
+        rows = conn.execute('PRAGMA integrity_check').fetchall()
+        ok = len(rows) == 1 and rows[0][0] == 'ok'
+        if not ok:
+            logger.error(f"❌ 备份完整性检查失败: {[r[0] for r in rows[:5]]}")
+        return ok
+    finally:
+        conn.close()
+
+
+def resolve_compression(method: str) -> str:
+    """解析压缩方式，zstd不可用时回退到gzip"""
+    method = (method or 'gzip').lower()
+    if method not in COMPRESSION_SUFFIXES:
+        logger.warning(f"⚠️ 未知的压缩方式 {method}，使用gzip")
+        return 'gzip'
+    if method == 'zstd' and zstandard is None:
+        logger.warning("⚠️ 未安装zstandard，使用gzip压缩备份")
+        return 'gzip'
+    return method
+
+
+def compress_file(path: str, method: str = 'gzip', remove_source: bool = True) -> Path:
+    """压缩备份文件，返回压缩后的路径"""
+    method = resolve_compression(method)
+    source_path = Path(path)
+    if method == 'none':
+        return source_path
+
+    target_path = source_path.with_name(source_path.name + COMPRESSION_SUFFIXES[method])
+    with open(source_path, 'rb') as src:
+        if method == 'zstd':
+            compressor = zstandard.ZstdCompressor(level=10, threads=-1)
+            with open(target_path, 'wb') as dst:
+                compressor.copy_stream(src, dst)
+        else:
+            with gzip.open(target_path, 'wb', compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+
+    if remove_source:
+        source_path.unlink()
+    return target_path
+
+
+def create_backup(source: str, target: str, pages: int = 256, step_sleep: float = 0.05,
+                  compression: str = 'gzip') -> Optional[Path]:
+    """完整备份流程: 在线备份 -> 完整性检查 -> 压缩
+
+    该函数是阻塞的，应在工作线程中调用。失败时返回None并清理半成品文件。
+    """
+    target_path = Path(target)
+    try:
+        started = time.monotonic()
+        page_count = online_backup(source, str(target_path), pages, step_sleep)
+
+        if not verify_integrity(str(target_path)):
+            target_path.unlink(missing_ok=True)
+            return None
+
+        result = compress_file(str(target_path), compression)
+        elapsed = time.monotonic() - started
+        logger.info(f"💾 在线备份完成: {result} ({page_count}页, {elapsed:.1f}秒)")
+        return result
+
+    except Exception as e:
+        logger.error(f"❌ 在线备份失败: {e}")
+        target_path.unlink(missing_ok=True)
+        return None
+
+
+def main(argv=None) -> int:
+    """命令行入口，供 scripts/backup.sh 调用"""
+    parser = argparse.ArgumentParser(description='SQLite在线备份')
+    parser.add_argument('source', help='源数据库文件')
+    parser.add_argument('target', help='备份文件路径')
+    parser.add_argument('--pages', type=int, default=256, help='每步复制的页数')
+    parser.add_argument('--sleep', type=float, default=0.05, help='每步之间的休眠秒数')
+    parser.add_argument('--compression', default='none', choices=sorted(COMPRESSION_SUFFIXES),
+                        help='压缩方式')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    result = create_backup(args.source, args.target, args.pages, args.sleep, args.compression)
+    if not result:
+        return 1
+    print(result)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""
+字符分类表 - 导入时构建一次的码位分类表，按字素簇删除表情，逐字符删除特殊符号
+
+删除表情时，ZWJ 组合序列、变体选择符、肤色修饰符、旗帜标签和键帽组合符与表情一起整体删除；
+删除特殊符号时逐字符删除 \w、空白、汉字和 # 以外的字符（与原正则相同，键帽 1️⃣ 删除后剩 1）。
+
+strip_emojis_scan / strip_special_chars_scan 逐字符查表，定义确切的删除规则；
+strip_emojis 使用由同一张表生成的字符类正则在C层扫描，strip_special_chars 沿用原字符类正则
+（实测比按字素簇匹配的正则快），纯ASCII文本直接返回或走 bytes.translate，
+结果与逐字符实现完全一致（见 benchmarks/bench_normalizer.py）。
+"""
+
+import re
+from typing import Iterable, List, Tuple
+
+
+# 分类标志
+F_EMOJI = 0x01        # 表情（总是按表情处理）
+F_TEXT_EMOJI = 0x02   # 默认文本样式的符号，后跟 U+FE0F 时才按表情处理（如 © ™ ↔）
+F_COMPONENT = 0x04    # 表情组件: 变体选择符、肤色修饰符、标签字符、键帽组合符
+F_ORPHAN = 0x08       # 删除表情时单独出现也删除的组件: U+FE0F、键帽组合符、标签字符
+F_KEEP = 0x20         # 删除特殊符号时保留: \w、空白、CJK统一汉字、#
+
+ZWJ = '\u200d'
+VS16 = '\ufe0f'
+
+# 表情范围（包含原 emoji_pattern 的全部范围）
+_EMOJI_RANGES = [
+    (0x1F000, 0x1F2FF),   # 麻将/扑克牌、带圈字母数字补充、区域指示符号
+    (0x1F300, 0x1F5FF),   # 杂项符号和象形文字（含肤色修饰符）
+    (0x1F600, 0x1F64F),   # 表情
+    (0x1F680, 0x1F6FF),   # 交通和地图符号
+    (0x1F700, 0x1F8FF),   # 炼金术符号、几何图形扩展、补充箭头C
+    (0x1F900, 0x1FAFF),   # 补充符号和象形文字、符号和象形文字扩展A
+    (0x2600, 0x27BF),     # 杂项符号、装饰符号
+    (0x231A, 0x231B), (0x23E9, 0x23F3), (0x23F8, 0x23FA),
+    (0x2B05, 0x2B07), (0x2B1B, 0x2B1C), (0x2B50, 0x2B50), (0x2B55, 0x2B55),
+    (0x3030, 0x3030), (0x303D, 0x303D), (0x3297, 0x3297), (0x3299, 0x3299),
+]
+
+_TEXT_EMOJI_RANGES = [
+    (0x00A9, 0x00A9), (0x00AE, 0x00AE), (0x203C, 0x203C), (0x2049, 0x2049),
+    (0x2122, 0x2122), (0x2139, 0x2139), (0x2194, 0x2199), (0x21A9, 0x21AA),
+    (0x2328, 0x2328), (0x23CF, 0x23CF), (0x24C2, 0x24C2), (0x25AA, 0x25AB),
+    (0x25B6, 0x25B6), (0x25C0, 0x25C0), (0x25FB, 0x25FE), (0x2934, 0x2935),
+]
+
+_COMPONENT_RANGES = [(0xFE00, 0xFE0F), (0x1F3FB, 0x1F3FF), (0xE0020, 0xE007F), (0x20E3, 0x20E3)]
+
+_ORPHAN_RANGES = [(0xFE0F, 0xFE0F), (0x20E3, 0x20E3), (0xE0020, 0xE007F)]
+
+_KEEP_RANGES = [(0x4E00, 0x9FFF), (ord('_'), ord('_')), (ord('#'), ord('#'))]
+
+# \w 和空白只出现在这个区间（Unicode 14 下最大为 U+3134A）
+_SCAN_RANGES = [(0x0, 0x3FFFF)]
+
+
+def _build_table() -> bytearray:
+    table = bytearray(0x110000)
+
+    def mark(ranges: Iterable[Tuple[int, int]], flag: int):
+        for start, end in ranges:
+            for cp in range(start, end + 1):
+                table[cp] |= flag
+
+    for start, end in _SCAN_RANGES:
+        for cp in range(start, end + 1):
+            char = chr(cp)
+            if char.isalnum() or char.isspace():
+                table[cp] |= F_KEEP
+
+    mark(_EMOJI_RANGES, F_EMOJI)
+    mark(_TEXT_EMOJI_RANGES, F_TEXT_EMOJI)
+    mark(_COMPONENT_RANGES, F_COMPONENT)
+    mark(_ORPHAN_RANGES, F_ORPHAN)
+    mark(_KEEP_RANGES, F_KEEP)
+    return table
+
+
+# 码位 -> 分类标志（bytearray，每个码位1字节）
+TABLE = _build_table()
+
+
+def ranges_where(include: int, exclude: int = 0) -> List[Tuple[int, int]]:
+    """带有 include 中任一标志且不带 exclude 中任何标志的码位区间"""
+    selector = bytes(1 if value & include and not value & exclude else 0 for value in range(256))
+    marks = bytes(TABLE).translate(selector)
+    return [(match.start(), match.end() - 1) for match in re.finditer(rb'\x01+', marks)]
+
+
+def _char_class(ranges: List[Tuple[int, int]], negate: bool = False) -> str:
+    parts = []
+    for start, end in ranges:
+        parts.append(re.escape(chr(start)) if start == end else f'{re.escape(chr(start))}-{re.escape(chr(end))}')
+    return f"[{'^' if negate else ''}{''.join(parts)}]"
+
+
+_START_CLASS = _char_class(ranges_where(F_EMOJI | F_ORPHAN | F_TEXT_EMOJI))
+_TEXT_EMOJI_CLASS = _char_class(ranges_where(F_TEXT_EMOJI, F_EMOJI))
+_JOINED_CLASS = _char_class(ranges_where(F_EMOJI | F_TEXT_EMOJI))
+_COMPONENT_CLASS = _char_class(ranges_where(F_COMPONENT))
+
+# 表情簇: 起始字符 组件* (ZWJ 表情 组件*)*
+# 起始字符为表情、单独出现的组件（FE0F/键帽组合符/标签字符），或后跟 FE0F 的文本样式符号；
+# 以单个字符类开头，re 可以按字符类快速跳过不相关的字符
+EMOJI_PATTERN = re.compile(
+    f'{_START_CLASS}(?:(?<!{_TEXT_EMOJI_CLASS})|(?={VS16}))'
+    f'{_COMPONENT_CLASS}*(?:{ZWJ}{_JOINED_CLASS}{_COMPONENT_CLASS}*)*'
+)
+
+# 特殊符号（保留#号），即原字符类正则；\w、\s 与分类表的 F_KEEP 定义相同
+SPECIAL_CHARS_PATTERN = re.compile(r'[^\w\s\u4e00-\u9fff#]', re.UNICODE)
+
+# ASCII 中要删除的特殊符号
+_ASCII_SPECIAL = bytes(cp for cp in range(128) if not TABLE[cp] & F_KEEP)
+
+
+def strip_emojis(text: str) -> str:
+    """删除表情（按字素簇）"""
+    if text.isascii():
+        return text
+    return EMOJI_PATTERN.sub('', text)
+
+
+def strip_special_chars(text: str) -> str:
+    """删除特殊符号（保留 \\w、空白、汉字、#）"""
+    if text.isascii():
+        return text.encode('ascii').translate(None, _ASCII_SPECIAL).decode('ascii')
+    return SPECIAL_CHARS_PATTERN.sub('', text)
+
+
+def strip_emojis_scan(text: str) -> str:
+    """逐字符查表删除表情（规则定义；与 strip_emojis 结果一致）"""
+    table = TABLE
+    length = len(text)
+    kept = []
+    i = 0
+    while i < length:
+        flags = table[ord(text[i])]
+        if flags & (F_EMOJI | F_ORPHAN) or (flags & F_TEXT_EMOJI and i + 1 < length and text[i + 1] == VS16):
+            i += 1 if flags & (F_EMOJI | F_ORPHAN) else 2
+            while True:
+                while i < length and table[ord(text[i])] & F_COMPONENT:
+                    i += 1
+                if i + 1 < length and text[i] == ZWJ and table[ord(text[i + 1])] & (F_EMOJI | F_TEXT_EMOJI):
+                    i += 2
+                    continue
+                break
+            continue
+        kept.append(text[i])
+        i += 1
+    return ''.join(kept)
+
+
+def strip_special_chars_scan(text: str) -> str:
+    """逐字符查表删除特殊符号（规则定义；与 strip_special_chars 结果一致）"""
+    table = TABLE
+    return ''.join(char for char in text if table[ord(char)] & F_KEEP)
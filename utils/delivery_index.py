@@ -0,0 +1,118 @@
+"""
+投递索引 - 记录 (目标频道, 内容指纹) 是否已经发送过
+
+多个搬运组共用同一个目标频道且同时命中一条消息时，只向该频道发送一次。
+内存中保存最近发送的 64 位指纹（每条约几十字节），启动时从消息记录预热；
+消息记录本身就是持久化（add_message_record 写入目标频道和内容哈希），
+内存索引装不下全部记录时，未命中再回查数据库。
+"""
+
+import hashlib
+import logging
+from typing import Any, Dict, Set
+
+
+def delivery_fingerprint(target_channel_id: int, content_hash: str) -> int:
+    """(目标频道, 内容哈希) -> 64 位指纹"""
+    digest = hashlib.blake2b(f"{target_channel_id}:{content_hash}".encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+class DeliveryIndex:
+    """目标频道投递索引
+
+    发送前 claim 占位（已发送或正在发送时返回 False），发送成功后 confirm，失败时 release。
+    """
+
+    def __init__(self, database, max_size: int = 100000):
+        self.database = database
+        self.max_size = max(max_size, 0)
+        self.logger = logging.getLogger(__name__)
+
+        # 指纹 -> None（按插入顺序淘汰最旧的）
+        self._delivered: Dict[int, None] = {}
+        # 正在发送的指纹（并发的多个组不会同时发往同一频道）
+        self._pending: Set[int] = set()
+        # 内存索引包含数据库中的全部投递记录时，未命中即可确定未发送
+        self._complete = False
+
+        self.hits = 0
+        self.db_checks = 0
+
+    async def load(self):
+        """从最近的消息记录预热"""
+        if self.max_size <= 0:
+            return
+        try:
+            rows = await self.database.get_recent_deliveries(self.max_size)
+            self._delivered.clear()
+            # 记录按新到旧返回，倒序插入使最旧的先被淘汰
+            for target_channel_id, content_hash in reversed(rows):
+                if content_hash:
+                    self._delivered[delivery_fingerprint(target_channel_id, content_hash)] = None
+            self._complete = len(rows) < self.max_size
+            self.logger.info(f"📮 投递索引加载 {len(self._delivered)} 条记录")
+        except Exception as e:
+            self._complete = False
+            self.logger.error(f"❌ 加载投递索引失败: {e}")
+
+    def _remember(self, fingerprint: int):
+        delivered = self._delivered
+        if fingerprint in delivered or self.max_size <= 0:
+            return
+        if len(delivered) >= self.max_size:
+            del delivered[next(iter(delivered))]
+            self._complete = False
+        delivered[fingerprint] = None
+
+    async def is_delivered(self, target_channel_id: int, content_hash: str) -> bool:
+        """该内容是否已发送到目标频道"""
+        fingerprint = delivery_fingerprint(target_channel_id, content_hash)
+        if fingerprint in self._delivered:
+            return True
+        if self._complete:
+            return False
+
+        self.db_checks += 1
+        if await self.database.is_delivered(target_channel_id, content_hash):
+            self._remember(fingerprint)
+            return True
+        return False
+
+    async def claim(self, target_channel_id: int, content_hash: str) -> bool:
+        """发送前占位，已发送或正在发送时返回 False"""
+        if not content_hash:
+            return True
+
+        fingerprint = delivery_fingerprint(target_channel_id, content_hash)
+        if fingerprint in self._pending or await self.is_delivered(target_channel_id, content_hash):
+            self.hits += 1
+            return False
+        # is_delivered 可能访问数据库，期间其它组可能已占位
+        if fingerprint in self._pending:
+            self.hits += 1
+            return False
+        self._pending.add(fingerprint)
+        return True
+
+    def confirm(self, target_channel_id: int, content_hash: str):
+        """发送成功后记录"""
+        if not content_hash:
+            return
+        fingerprint = delivery_fingerprint(target_channel_id, content_hash)
+        self._pending.discard(fingerprint)
+        self._remember(fingerprint)
+
+    def release(self, target_channel_id: int, content_hash: str):
+        """发送失败时释放占位"""
+        if content_hash:
+            self._pending.discard(delivery_fingerprint(target_channel_id, content_hash))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'size': len(self._delivered),
+            'pending': len(self._pending),
+            'complete': self._complete,
+            'skipped': self.hits,
+            'db_checks': self.db_checks
+        }
@@ -0,0 +1,78 @@
+"""
+合并发送 - 把一个组在时间窗内过滤后的多条消息拼成尽量少的几条消息
+
+按 Telegram 单条消息长度上限分段，尽量只在消息之间断开，单条过长的消息按行（单行过长时按字符）切开；
+小尾巴只加在最后一段。
+"""
+
+from typing import List, Sequence, Tuple
+
+# Telegram 单条文本消息的最大长度
+MAX_MESSAGE_LENGTH = 4096
+
+DIGEST_SEPARATOR = '\n\n➖➖➖\n\n'
+
+
+def split_text(text: str, limit: int = MAX_MESSAGE_LENGTH) -> List[str]:
+    """把超过 limit 的文本按行切成若干段，单行仍超过上限时按字符切开"""
+    if len(text) <= limit:
+        return [text]
+
+    pieces: List[str] = []
+    lines: List[str] = []
+    length = -1
+    for line in text.split('\n'):
+        while len(line) > limit:
+            if lines:
+                pieces.append('\n'.join(lines))
+                lines, length = [], -1
+            pieces.append(line[:limit])
+            line = line[limit:]
+        if lines and length + 1 + len(line) > limit:
+            pieces.append('\n'.join(lines))
+            lines, length = [], -1
+        lines.append(line)
+        length += 1 + len(line)
+    if lines:
+        pieces.append('\n'.join(lines))
+    return pieces
+
+
+def pack_digest(texts: Sequence[str], footer: str = '', limit: int = MAX_MESSAGE_LENGTH,
+                separator: str = DIGEST_SEPARATOR) -> List[Tuple[str, int, int]]:
+    """把多条文本拼成若干条不超过 limit 的消息，返回 (消息, 起始下标, 结束下标)
+
+    单条文本超过上限时切成多段，下标区间只包含最后一段落在该消息中的文本，
+    因此每条文本恰好属于一条消息（只含中间段的消息区间为空）。长度按字符串长度计算，
+    HTML 标签也计入，结果偏保守。
+    """
+    footer_text = f"\n\n{footer}" if footer else ''
+    chunks: List[Tuple[str, int, int]] = []
+    parts: List[str] = []
+    length = 0
+    start = 0
+
+    for index, text in enumerate(texts):
+        for piece in split_text(text, limit):
+            extra = len(piece) + (len(separator) if parts else 0)
+            if parts and length + extra > limit:
+                # 同一条文本的前几段已满一条消息，不会和后续段落在同一条中
+                chunks.append((separator.join(parts), start, index))
+                parts, length, start = [], 0, index
+                extra = len(piece)
+            parts.append(piece)
+            length += extra
+
+    if parts:
+        # 小尾巴放在最后一段，放不下时把最后一条移到新的一段，仍放不下时小尾巴单独发送
+        last = len(texts)
+        if footer_text and length + len(footer_text) > limit:
+            if len(parts) > 1:
+                chunks.append((separator.join(parts[:-1]), start, last - 1))
+                parts, length, start = parts[-1:], len(parts[-1]), last - 1
+            if length + len(footer_text) > limit:
+                chunks.append((parts[0], start, last))
+                parts, start, footer_text = [footer[:limit]], last, ''
+        chunks.append((separator.join(parts) + footer_text, start, last))
+
+    return chunks
@@ -0,0 +1,327 @@
+"""
+消息实体处理 - 按 Telegram 实体偏移删除链接/提及，保留其余格式实体并输出为 HTML
+
+Telegram 实体偏移以 UTF-16 码元计，这里统一换算为 Python 字符下标后处理。
+"""
+
+import bisect
+import html
+from typing import Any, Iterable, List, NamedTuple, Optional, Tuple
+
+
+class Span(NamedTuple):
+    """规范化后的实体（offset/length 为字符下标）"""
+    kind: str
+    offset: int
+    length: int
+    extra: Any = None   # text_link 的 url / text_mention 的用户ID / pre 的语言 / custom_emoji 的ID
+
+
+# 删除链接时连同文本一起删除的实体
+REMOVED_KINDS = frozenset({'url', 'mention'})
+# 删除链接时只去掉链接、保留显示文本的实体
+UNLINKED_KINDS = frozenset({'text_link', 'text_mention'})
+
+# Telethon 实体类名 -> 实体类型（与 Bot API 的类型名一致）
+_TELETHON_KINDS = {
+    'MessageEntityBold': 'bold',
+    'MessageEntityItalic': 'italic',
+    'MessageEntityUnderline': 'underline',
+    'MessageEntityStrike': 'strikethrough',
+    'MessageEntitySpoiler': 'spoiler',
+    'MessageEntityCode': 'code',
+    'MessageEntityPre': 'pre',
+    'MessageEntityBlockquote': 'blockquote',
+    'MessageEntityTextUrl': 'text_link',
+    'MessageEntityMentionName': 'text_mention',
+    'InputMessageEntityMentionName': 'text_mention',
+    'MessageEntityUrl': 'url',
+    'MessageEntityMention': 'mention',
+    'MessageEntityCustomEmoji': 'custom_emoji',
+}
+
+_SIMPLE_TAGS = {
+    'bold': 'b',
+    'italic': 'i',
+    'underline': 'u',
+    'strikethrough': 's',
+    'spoiler': 'tg-spoiler',
+    'code': 'code',
+    'blockquote': 'blockquote',
+}
+
+
+def get_raw_text(message) -> str:
+    """消息的原始文本（实体偏移基于该文本；Telethon 的 message.text 是按解析模式格式化后的文本）"""
+    raw = getattr(message, 'message', None)
+    if isinstance(raw, str):
+        return raw
+    return getattr(message, 'text', None) or getattr(message, 'caption', None) or ""
+
+
+def _describe(entity) -> Tuple[str, int, int, Any]:
+    if isinstance(entity, dict):
+        kind = entity.get('type', '')
+        return (kind, entity.get('offset', 0), entity.get('length', 0),
+                entity.get('url') or entity.get('user_id') or entity.get('language') or entity.get('custom_emoji_id'))
+
+    kind = _TELETHON_KINDS.get(type(entity).__name__)
+    if kind is not None:
+        extra = None
+        if kind == 'text_link':
+            extra = entity.url
+        elif kind == 'text_mention':
+            extra = getattr(entity, 'user_id', None)
+        elif kind == 'pre':
+            extra = entity.language or None
+        elif kind == 'custom_emoji':
+            extra = entity.document_id
+        return kind, entity.offset, entity.length, extra
+
+    # python-telegram-bot MessageEntity
+    kind = str(getattr(entity, 'type', '') or '')
+    extra = None
+    if kind == 'text_link':
+        extra = entity.url
+    elif kind == 'text_mention':
+        user = getattr(entity, 'user', None)
+        extra = user.id if user is not None else None
+    elif kind == 'pre':
+        extra = getattr(entity, 'language', None)
+    elif kind == 'custom_emoji':
+        extra = getattr(entity, 'custom_emoji_id', None)
+    return kind, getattr(entity, 'offset', 0), getattr(entity, 'length', 0), extra
+
+
+# 字典形式实体中附加信息的键
+_EXTRA_KEYS = {
+    'text_link': 'url',
+    'text_mention': 'user_id',
+    'pre': 'language',
+    'custom_emoji': 'custom_emoji_id',
+}
+
+
+def entities_to_dicts(entities: Optional[Iterable]) -> List[dict]:
+    """把实体转换为可序列化的字典形式（偏移保持 UTF-16 码元，normalize_entities 可直接读取）"""
+    result = []
+    for entity in entities or ():
+        try:
+            kind, offset, length, extra = _describe(entity)
+        except Exception:
+            continue
+        if not kind:
+            continue
+        item = {'type': kind, 'offset': offset, 'length': length}
+        if extra is not None and kind in _EXTRA_KEYS:
+            item[_EXTRA_KEYS[kind]] = extra
+        result.append(item)
+    return result
+
+
+def normalize_entities(text: str, entities: Optional[Iterable]) -> List[Span]:
+    """把 Telethon / Bot API / 字典形式的实体转换为按字符下标的 Span 列表"""
+    if not entities:
+        return []
+
+    # 没有基本多文种平面以外的字符时 UTF-16 偏移即字符下标
+    if text.isascii() or len(text.encode('utf-16-le', 'surrogatepass')) == 2 * len(text):
+        to_index = None
+        limit = len(text)
+    else:
+        # units[i] = 前 i 个字符占用的 UTF-16 码元数
+        units = [0]
+        total = 0
+        for char in text:
+            total += 2 if char > '\uffff' else 1
+            units.append(total)
+        limit = total
+
+        def to_index(offset: int) -> int:
+            return bisect.bisect_left(units, offset)
+
+    spans = []
+    for entity in entities:
+        try:
+            kind, offset, length, extra = _describe(entity)
+        except Exception:
+            continue
+        if not kind or length <= 0 or offset < 0 or offset >= limit:
+            continue
+        end = min(offset + length, limit)
+        if to_index is not None:
+            offset, end = to_index(offset), to_index(end)
+        if end > offset:
+            spans.append(Span(kind, offset, end - offset, extra))
+    return spans
+
+
+def remove_link_spans(text: str, spans: List[Span]) -> Tuple[str, List[Span]]:
+    """删除链接/提及实体覆盖的文本（一次切片拼接），其余实体按删除位置重新计算偏移"""
+    removed = sorted((span.offset, span.offset + span.length) for span in spans if span.kind in REMOVED_KINDS)
+    kept_spans = [span for span in spans if span.kind not in REMOVED_KINDS and span.kind not in UNLINKED_KINDS]
+    if not removed:
+        return text, kept_spans
+
+    # 合并重叠区间
+    merged = [list(removed[0])]
+    for start, end in removed[1:]:
+        if start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+
+    pieces = []
+    position = 0
+    for start, end in merged:
+        pieces.append(text[position:start])
+        position = end
+    pieces.append(text[position:])
+
+    starts = [start for start, _ in merged]
+    removed_before = [0]
+    for start, end in merged:
+        removed_before.append(removed_before[-1] + end - start)
+
+    def shift(index: int) -> int:
+        # 下标之前被删除的字符数（落在删除区间内的下标移到区间起点）
+        k = bisect.bisect_right(starts, index) - 1
+        if k < 0:
+            return index
+        start, end = merged[k]
+        return start - removed_before[k] if index < end else index - removed_before[k + 1]
+
+    return ''.join(pieces), _remap(kept_spans, shift)
+
+
+def _remap(spans: List[Span], shift) -> List[Span]:
+    remapped = []
+    for span in spans:
+        start = shift(span.offset)
+        end = shift(span.offset + span.length)
+        if end > start:
+            remapped.append(Span(span.kind, start, end - start, span.extra))
+    return remapped
+
+
+def realign_spans(source: str, result: str, spans: List[Span]) -> Optional[List[Span]]:
+    """result 由 source 删除若干字符得到时，把实体偏移映射到 result；不是删除关系（有替换）时返回None"""
+    if not spans or source == result:
+        return spans
+
+    # 贪心匹配公共片段: (source起点, result起点, 长度)
+    start = source.find(result)
+    if start >= 0:
+        # 只去掉了首尾（最常见的情况）
+        runs = [(start, 0, len(result))]
+    else:
+        runs = []
+        i = j = 0
+        source_length, result_length = len(source), len(result)
+        while j < result_length:
+            i = source.find(result[j], i)
+            if i < 0:
+                return None
+            # 片段长度按倍增试探、逐步回退，比较都用切片在C层完成
+            length = 1
+            limit = min(source_length - i, result_length - j)
+            step = limit
+            while step:
+                size = length + step
+                if size <= limit and source[i + length:i + size] == result[j + length:j + size]:
+                    length = size
+                else:
+                    step //= 2
+            runs.append((i, j, length))
+            i += length
+            j += length
+
+    run_starts = [run[0] for run in runs]
+
+    def shift(index: int) -> int:
+        # source 下标之前保留下来的字符数
+        k = bisect.bisect_right(run_starts, index) - 1
+        if k < 0:
+            return 0
+        start, target, length = runs[k]
+        return target + min(index - start, length)
+
+    return _remap(spans, shift)
+
+
+def _open_tag(span: Span) -> str:
+    tag = _SIMPLE_TAGS.get(span.kind)
+    if tag:
+        return f'<{tag}>'
+    if span.kind == 'pre':
+        if span.extra:
+            return f'<pre><code class="language-{html.escape(str(span.extra))}">'
+        return '<pre>'
+    if span.kind == 'text_link':
+        return f'<a href="{html.escape(str(span.extra or ""))}">'
+    if span.kind == 'text_mention':
+        return f'<a href="tg://user?id={int(span.extra or 0)}">'
+    if span.kind == 'custom_emoji':
+        return f'<tg-emoji emoji-id="{html.escape(str(span.extra or ""))}">'
+    return ''
+
+
+def _close_tag(span: Span) -> str:
+    tag = _SIMPLE_TAGS.get(span.kind)
+    if tag:
+        return f'</{tag}>'
+    if span.kind == 'pre':
+        return '</code></pre>' if span.extra else '</pre>'
+    if span.kind in ('text_link', 'text_mention'):
+        return '</a>'
+    if span.kind == 'custom_emoji':
+        return '</tg-emoji>'
+    return ''
+
+
+def to_html(text: str, spans: List[Span]) -> str:
+    """把文本和格式实体渲染为 Telegram HTML（交叉的实体在边界处拆分为合法嵌套）"""
+    spans = [span for span in spans if _open_tag(span)]
+    if not spans:
+        return html.escape(text, quote=False)
+
+    boundaries = sorted({0, len(text)} | {span.offset for span in spans} | {span.offset + span.length for span in spans})
+    # 同一位置开始的实体，较长的在外层
+    opening = {}
+    for span in sorted(spans, key=lambda span: (span.offset, -span.length)):
+        opening.setdefault(span.offset, []).append(span)
+
+    # 各位置结束的实体数
+    closing = {}
+    for span in spans:
+        end = span.offset + span.length
+        closing[end] = closing.get(end, 0) + 1
+
+    parts = []
+    stack: List[Span] = []
+    for index, position in enumerate(boundaries):
+        # 关闭在此结束的实体；在它们之后打开的实体先关闭再重新打开
+        pending = closing.get(position, 0)
+        if pending:
+            reopen = []
+            while pending:
+                span = stack.pop()
+                parts.append(_close_tag(span))
+                if span.offset + span.length == position:
+                    pending -= 1
+                else:
+                    reopen.append(span)
+            for span in reversed(reopen):
+                parts.append(_open_tag(span))
+                stack.append(span)
+
+        for span in opening.get(position, ()):
+            parts.append(_open_tag(span))
+            stack.append(span)
+
+        if index + 1 < len(boundaries):
+            parts.append(html.escape(text[position:boundaries[index + 1]], quote=False))
+
+    for span in reversed(stack):
+        parts.append(_close_tag(span))
+    return ''.join(parts)
@@ -0,0 +1,138 @@
+"""
+加权公平队列 - 按搬运组分队列，用差额轮询（DRR）在各组之间分配发送机会
+
+每个组每轮获得与权重（组优先级）成正比的发送额度，消息量大的组不会挤占其它组；
+同时统计每个组的排队深度和等待时间。
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Hashable, Tuple
+
+
+class _GroupQueue:
+    """单个组的队列和统计"""
+
+    __slots__ = ('items', 'weight', 'deficit', 'enqueued', 'dequeued', 'total_wait', 'max_wait', 'last_wait')
+
+    def __init__(self, weight: float):
+        self.items: Deque[Tuple[float, Any]] = deque()
+        self.weight = weight
+        self.deficit = 0.0
+        self.enqueued = 0
+        self.dequeued = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.last_wait = 0.0
+
+
+class WeightedFairQueue:
+    """按组加权公平的异步队列（接口与 asyncio.Queue 的 put/get/qsize 一致）
+
+    每条消息的代价为 1；轮到某组时该组额度增加其权重，额度足够时出队，
+    额度用完后轮到下一个有消息的组。权重 2 的组在拥堵时获得权重 1 的组两倍的发送机会。
+    """
+
+    MIN_WEIGHT = 0.1
+
+    def __init__(self, default_weight: float = 1.0, clock=time.monotonic):
+        self.default_weight = default_weight
+        self._clock = clock
+        self._queues: Dict[Hashable, _GroupQueue] = {}
+        # 有消息的组，队首为当前轮到的组
+        self._active: Deque[Hashable] = deque()
+        self._size = 0
+        self._available = asyncio.Semaphore(0)
+
+    def _weight(self, weight) -> float:
+        if weight is None:
+            weight = self.default_weight
+        return max(float(weight), self.MIN_WEIGHT)
+
+    def set_weight(self, key: Hashable, weight: float):
+        """修改组的权重（下一轮生效）"""
+        queue = self._queues.get(key)
+        if queue is not None:
+            queue.weight = self._weight(weight)
+
+    def put_nowait(self, item: Any, key: Hashable = None, weight: float = None):
+        """加入组 key 的队列；weight 为 None 时沿用该组已有权重"""
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = _GroupQueue(self._weight(weight))
+        elif weight is not None:
+            queue.weight = self._weight(weight)
+
+        if not queue.items:
+            self._active.append(key)
+        queue.items.append((self._clock(), item))
+        queue.enqueued += 1
+        self._size += 1
+        self._available.release()
+
+    async def put(self, item: Any, key: Hashable = None, weight: float = None):
+        self.put_nowait(item, key, weight)
+
+    async def get(self) -> Any:
+        """按 DRR 顺序取出下一条消息，队列为空时等待"""
+        await self._available.acquire()
+        return self._pop()
+
+    def _pop(self) -> Any:
+        active = self._active
+        while True:
+            key = active[0]
+            queue = self._queues[key]
+            if queue.deficit < 1:
+                # 新一轮: 增加额度，权重小于 1 的组需要多轮累积
+                queue.deficit += queue.weight
+                if queue.deficit < 1:
+                    active.rotate(-1)
+                    continue
+
+            queue.deficit -= 1
+            enqueued_at, item = queue.items.popleft()
+            self._size -= 1
+
+            wait = self._clock() - enqueued_at
+            queue.dequeued += 1
+            queue.total_wait += wait
+            queue.last_wait = wait
+            if wait > queue.max_wait:
+                queue.max_wait = wait
+
+            if not queue.items:
+                # 队列空了不保留额度（DRR）
+                active.popleft()
+                queue.deficit = 0.0
+            elif queue.deficit < 1:
+                active.rotate(-1)
+            return item
+
+    def qsize(self) -> int:
+        return self._size
+
+    def empty(self) -> bool:
+        return self._size == 0
+
+    def depth(self, key: Hashable) -> int:
+        queue = self._queues.get(key)
+        return len(queue.items) if queue else 0
+
+    def stats(self) -> Dict[Hashable, Dict[str, Any]]:
+        """每个组的排队深度、权重和等待时间（秒）"""
+        now = self._clock()
+        result = {}
+        for key, queue in self._queues.items():
+            result[key] = {
+                'weight': queue.weight,
+                'depth': len(queue.items),
+                'enqueued': queue.enqueued,
+                'dequeued': queue.dequeued,
+                'avg_wait': round(queue.total_wait / queue.dequeued, 3) if queue.dequeued else 0,
+                'max_wait': round(queue.max_wait, 3),
+                'last_wait': round(queue.last_wait, 3),
+                'oldest_wait': round(now - queue.items[0][0], 3) if queue.items else 0
+            }
+        return result
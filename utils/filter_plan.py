@@ -0,0 +1,256 @@
+"""
+过滤计划 - 把组的 filters 配置编译为不可变的执行计划（预编译正则、合并步骤、固定顺序）
+"""
+
+import hashlib
+import itertools
+import json
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from utils.char_table import strip_emojis, strip_special_chars
+from utils.keyword_matcher import KeywordMatcher
+from utils.regex_guard import check_regex, compile_regex
+from utils.spam_classifier import SpamRules
+
+
+logger = logging.getLogger(__name__)
+
+
+# 自定义规则步骤类型
+STEP_REGEX = 'regex'                # (STEP_REGEX, 已编译正则, 替换文本)
+STEP_KEYWORD = 'keyword'            # (STEP_KEYWORD, 关键词, 替换文本)
+STEP_REMOVE_LINES = 'remove_lines'  # (STEP_REMOVE_LINES, 关键词元组) 连续的 remove_line 规则合并为一步
+STEP_ERROR = 'error'                # (STEP_ERROR, 错误信息) 执行到此处停止，与原先逐条执行时抛错的位置一致
+
+# 过滤判定
+DECISION_KEPT = 'kept'      # 保留（可能被修改）
+DECISION_EMPTY = 'empty'    # 过滤后为空
+DECISION_AD = 'ad'          # 判定为广告
+DECISION_SPAM = 'spam'      # 判定为垃圾内容
+DECISION_ERROR = 'error'    # 过滤出错，返回原文
+
+# 计划编号（进程内唯一，用于日志显示）
+_plan_ids = itertools.count(1)
+
+# 配置损坏（非字典）时原样返回文本的计划指纹
+PASSTHROUGH_FINGERPRINT = b'passthrough'
+
+
+def filters_fingerprint(filters: Dict) -> bytes:
+    """规范化后的过滤配置摘要: 配置相同的组得到相同的指纹，判定缓存按指纹共享"""
+    normalized = {
+        'ad_detection': bool(filters.get('ad_detection', False)),
+        'smart_filter': bool(filters.get('smart_filter', False)),
+        'remove_links': bool(filters.get('remove_links', False)),
+        'remove_emojis': bool(filters.get('remove_emojis', False)),
+        'remove_special_chars': bool(filters.get('remove_special_chars', False)),
+        'custom_rules': filters.get('custom_rules') or [],
+        'spam_rules': filters.get('spam_rules') or None,
+        'spam_threshold': filters.get('spam_threshold')
+    }
+    data = json.dumps(normalized, sort_keys=True, ensure_ascii=False, default=repr)
+    return hashlib.blake2b(data.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+
+class FilterPlan:
+    """不可变的过滤执行计划
+
+    执行顺序固定: 广告检测 -> 智能过滤 -> 删除链接 -> 删除表情/特殊符号 -> 自定义规则 -> 清理空白
+    """
+
+    __slots__ = (
+        'plan_id', 'fingerprint', 'version', 'passthrough', 'ad_detection', 'smart_filter',
+        'remove_links', 'strip_steps', 'custom_steps', 'rule_matcher',
+        'spam_rules', 'spam_threshold'
+    )
+
+    def __init__(self, version: Any = None, passthrough: bool = False, ad_detection: bool = False,
+                 smart_filter: bool = False, remove_links: bool = False, strip_steps: Tuple[Callable[[str], str], ...] = (),
+                 custom_steps: Tuple[tuple, ...] = (), spam_rules: Optional[SpamRules] = None,
+                 spam_threshold: Optional[float] = None, fingerprint: Optional[bytes] = None):
+        set_attr = object.__setattr__
+        plan_id = next(_plan_ids)
+        set_attr(self, 'plan_id', plan_id)
+        # 判定缓存的键；未由配置编译时按计划编号区分，不与其它计划共享
+        set_attr(self, 'fingerprint', fingerprint if fingerprint is not None else b'plan:%d' % plan_id)
+        set_attr(self, 'version', version)
+        set_attr(self, 'passthrough', passthrough)
+        set_attr(self, 'ad_detection', ad_detection)
+        set_attr(self, 'smart_filter', smart_filter)
+        set_attr(self, 'remove_links', remove_links)
+        set_attr(self, 'strip_steps', strip_steps)
+        set_attr(self, 'custom_steps', custom_steps)
+        # 组级垃圾判断阈值（None 表示使用默认启发式阈值 / 模型自带阈值）
+        set_attr(self, 'spam_rules', spam_rules)
+        set_attr(self, 'spam_threshold', spam_threshold)
+        # keyword/remove_line 步骤的关键词合并到一个匹配器，一次扫描判断哪些步骤需要执行
+        keywords = []
+        for step in custom_steps:
+            if step[0] == STEP_KEYWORD:
+                keywords.append(step[1])
+            elif step[0] == STEP_REMOVE_LINES:
+                keywords.extend(step[1])
+        set_attr(self, 'rule_matcher', KeywordMatcher(keywords))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('FilterPlan 不可修改')
+
+    def __reduce__(self):
+        # 发送到进程池时按构造参数重建（关键词匹配器在工作进程中重新构建）
+        return (FilterPlan, (
+            self.version, self.passthrough, self.ad_detection, self.smart_filter,
+            self.remove_links, self.strip_steps, self.custom_steps,
+            self.spam_rules, self.spam_threshold, self.fingerprint
+        ))
+
+    def __repr__(self) -> str:
+        return (f"FilterPlan(id={self.plan_id}, version={self.version!r}, ad={self.ad_detection}, spam={self.smart_filter}, "
+                f"links={self.remove_links}, strip={len(self.strip_steps)}, "
+                f"custom_steps={len(self.custom_steps)})")
+
+
+def compile_custom_rules(rules) -> Tuple[tuple, ...]:
+    """编译自定义规则列表
+
+    遇到会在执行时抛错的规则（非字典、非法正则、非字符串关键词）时生成 STEP_ERROR 并停止编译，
+    保持原先"执行到出错规则即停止"的行为；未通过安全检查的正则（如嵌套量词）跳过不执行。
+    """
+    steps = []
+    try:
+        for rule in rules:
+            rule_type = rule.get('type')
+            pattern = rule.get('pattern')
+            replacement = rule.get('replacement', '')
+
+            if not pattern:
+                continue
+
+            if rule_type == 'regex':
+                try:
+                    compiled = compile_regex(pattern)
+                except Exception as e:
+                    steps.append((STEP_ERROR, f"正则 {pattern!r} 无效: {e}"))
+                    break
+                reason = check_regex(pattern)
+                if reason:
+                    logger.warning(f"⚠️ 跳过不安全的自定义正则 {pattern!r}: {reason}")
+                    continue
+                steps.append((STEP_REGEX, compiled, replacement))
+
+            elif rule_type in ('keyword', 'remove_line'):
+                if not isinstance(pattern, str):
+                    steps.append((STEP_ERROR, f"关键词必须是字符串: {pattern!r}"))
+                    break
+                if rule_type == 'keyword':
+                    steps.append((STEP_KEYWORD, pattern, replacement))
+                elif steps and steps[-1][0] == STEP_REMOVE_LINES:
+                    steps[-1] = (STEP_REMOVE_LINES, steps[-1][1] + (pattern,))
+                else:
+                    steps.append((STEP_REMOVE_LINES, (pattern,)))
+
+    except Exception as e:
+        steps.append((STEP_ERROR, str(e)))
+
+    return tuple(steps)
+
+
+def compile_filter_plan(filters: Dict, version: Any = None) -> FilterPlan:
+    """把 filters 配置编译为 FilterPlan"""
+    if not isinstance(filters, dict):
+        # 配置损坏时原样返回文本（与原先 filters.get 抛错后的行为一致）
+        return FilterPlan(version=version, passthrough=True, fingerprint=PASSTHROUGH_FINGERPRINT)
+
+    # 表情和特殊符号分两次扫描（实测比合并成一个分支正则更快）；步骤是模块级函数，可直接发送到进程池
+    strip_steps = []
+    if filters.get('remove_emojis', False):
+        strip_steps.append(strip_emojis)
+    if filters.get('remove_special_chars', False):
+        strip_steps.append(strip_special_chars)
+
+    custom_rules = filters.get('custom_rules', [])
+    custom_steps = compile_custom_rules(custom_rules) if custom_rules else ()
+
+    # 组级垃圾判断阈值: spam_rules 覆盖启发式阈值，spam_threshold 覆盖模型概率阈值
+    spam_rules = SpamRules(filters['spam_rules']) if filters.get('spam_rules') else None
+    spam_threshold = filters.get('spam_threshold')
+    if not isinstance(spam_threshold, (int, float)):
+        spam_threshold = None
+
+    return FilterPlan(
+        version=version,
+        ad_detection=bool(filters.get('ad_detection', False)),
+        smart_filter=bool(filters.get('smart_filter', False)),
+        remove_links=bool(filters.get('remove_links', False)),
+        strip_steps=tuple(strip_steps),
+        custom_steps=custom_steps,
+        spam_rules=spam_rules,
+        spam_threshold=spam_threshold,
+        fingerprint=filters_fingerprint(filters)
+    )
+
+
+class DecisionCache:
+    """过滤判定LRU缓存: (配置指纹, 广告词表版本, 文本摘要) -> (过滤结果, 判定)
+
+    键只保存文本的 blake2b 摘要；配置相同的组共享条目，同一文本经过多个组只过滤一次。
+    配置或广告词表变化后键随之变化，旧条目按LRU淘汰；正则停用状态变化时需整体清空。
+    除条目数外还限制缓存结果的总字符数，避免长文本占用过多内存。
+    """
+
+    def __init__(self, max_size: int = 4096, max_text_length: int = 8192, max_chars: int = 4 * 1024 * 1024):
+        self.max_size = max_size
+        self.max_text_length = max_text_length
+        self.max_chars = max_chars
+        self._entries: 'OrderedDict[Tuple[bytes, int, bytes], Tuple[str, str]]' = OrderedDict()
+        self._chars = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def cacheable(self, text: str) -> bool:
+        return self.max_size > 0 and len(text) <= self.max_text_length
+
+    @staticmethod
+    def _key(plan: FilterPlan, text: str, ad_version: int) -> Tuple[bytes, int, bytes]:
+        digest = hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+        return plan.fingerprint, ad_version, digest
+
+    def get(self, plan: FilterPlan, text: str, ad_version: int = 0) -> Optional[Tuple[str, str]]:
+        key = self._key(plan, text, ad_version)
+        result = self._entries.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return result
+
+    def put(self, plan: FilterPlan, text: str, result: Tuple[str, str], ad_version: int = 0):
+        key = self._key(plan, text, ad_version)
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._chars -= len(old[0])
+        self._entries[key] = result
+        self._chars += len(result[0])
+        while len(self._entries) > self.max_size or (self._chars > self.max_chars and len(self._entries) > 1):
+            _, evicted = self._entries.popitem(last=False)
+            self._chars -= len(evicted[0])
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._chars = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'chars': self._chars,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+        }
@@ -3,8 +3,51 @@
 """
 
 import re
+import asyncio
 import logging
-from typing import Dict, List, Optional
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from utils.filter_plan import (
+    FilterPlan, DecisionCache, compile_custom_rules, compile_filter_plan,
+    STEP_REGEX, STEP_KEYWORD, STEP_REMOVE_LINES,
+    DECISION_KEPT, DECISION_EMPTY, DECISION_AD, DECISION_SPAM, DECISION_ERROR
+)
+from utils.char_table import EMOJI_PATTERN, SPECIAL_CHARS_PATTERN, strip_emojis, strip_special_chars
+from utils.entities import Span, normalize_entities, realign_spans, remove_link_spans, to_html
+from utils.keyword_matcher import KeywordMatcher
+from utils.regex_guard import RegexGuard
+from utils.spam_classifier import TextFeatures, SpamRules, is_advertisement, load_model
+
+
+# 英文字母统计用的删除表（ASCII 中非字母 / 非大写字母）
+_NON_LETTER_BYTES = bytes(c for c in range(128) if not chr(c).isalpha())
+_NON_UPPER_BYTES = bytes(c for c in range(128) if not chr(c).isupper())
+
+# 进程池工作进程内的过滤器实例（每个工作进程一个）
+_worker_filter = None
+
+
+def _filter_chunk(ad_keywords: List[str], ad_phrases: List[str], guard: Tuple[float, int, List[str]],
+                  plan: FilterPlan, texts: List[str]) -> Tuple[List[Tuple[str, str]], Dict[str, Tuple]]:
+    """进程池任务: 在工作进程中过滤一批文本，返回 [(结果, 判定)] 和本批的正则执行统计
+
+    广告词表和正则防护设置（超时预算、上限、已停用的规则）随任务传入，保证与主进程一致；
+    正则统计由主进程合并，超时停用在主进程生效。
+    """
+    global _worker_filter
+    if _worker_filter is None:
+        _worker_filter = MessageFilter(None)
+    if _worker_filter.ad_keywords != ad_keywords or _worker_filter.ad_phrases != ad_phrases:
+        _worker_filter.ad_keywords = list(ad_keywords)
+        _worker_filter.ad_phrases = list(ad_phrases)
+        _worker_filter._build_ad_matcher()
+    regex_guard = _worker_filter.regex_guard
+    regex_guard.timeout_ms, regex_guard.max_timeouts, disabled = guard
+    regex_guard.reset(disabled)
+    results = [_worker_filter.filter_decision(text, plan) for text in texts]
+    return results, regex_guard.export_stats()
 
 
 class MessageFilter:
@@ -27,16 +70,41 @@ class MessageFilter:
             '代孕', '药品', '减肥', '丰胸', '壮阳', '假证',
             '发票', '***', '微商', '淘宝客', '返利'
         ]
-        
-        # 特殊符号（保留#号）
-        self.special_chars_pattern = re.compile(r'[^\w\s\u4e00-\u9fff#]', re.UNICODE)
-        
-        # 表情符号（保留#号）
-        self.emoji_pattern = re.compile(
-            r'[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F1E0-\U0001F1FF\U00002600-\U000027BF\U0001f900-\U0001f9ff\U0001f600-\U0001f64f\U0001f680-\U0001f6ff\u2600-\u27bf]',
-            re.UNICODE
+
+        # 典型广告短语
+        self.ad_phrases = [
+            '加我微信', '联系客服', '免费咨询', '立即下单',
+            '扫码关注', '点击购买', '限时特价', '包邮到家'
+        ]
+        self.ad_version = 0
+        self._build_ad_matcher()
+
+        # 组过滤计划缓存: group_id -> (配置版本 updated_at, filters 字典, FilterPlan)
+        self._plans: Dict[int, Tuple[Any, Dict, FilterPlan]] = {}
+
+        # 垃圾内容模型（未配置时使用启发式规则）与默认启发式阈值
+        self.spam_model = load_model(settings.spam_model) if settings else None
+        self.default_spam_rules = SpamRules()
+
+        # 自定义正则执行防护（耗时预算、超时停用、逐条规则耗时统计）
+        self.regex_guard = RegexGuard(
+            settings.regex_timeout_ms if settings else 50,
+            settings.regex_max_timeouts if settings else 3
         )
 
+        # 过滤判定缓存（同一文本经过多个组、相册重复说明、补漏重复拉取）
+        self.decision_cache = DecisionCache(settings.filter_cache_size if settings else 0)
+        self._cache_generation = self.regex_guard.generation
+
+        # 批量过滤进程池（首次使用时创建）
+        self.pool_workers = settings.filter_pool_workers if settings else 0
+        self.pool_min_batch = settings.filter_pool_min_batch if settings else 0
+        self._pool: Optional[ProcessPoolExecutor] = None
+        
+        # 特殊符号（保留#号）和表情符号（由字符分类表生成，按字素簇匹配）
+        self.special_chars_pattern = SPECIAL_CHARS_PATTERN
+        self.emoji_pattern = EMOJI_PATTERN
+
     def _compile_patterns(self):
         """预编译正则表达式"""
         # URL链接匹配
@@ -45,9 +113,9 @@ class MessageFilter:
             re.IGNORECASE
         )
         
-        # Telegram链接
+        # Telegram链接（开头的前瞻让正则引擎在不可能起始的位置立即失败，匹配结果不变）
         self.telegram_link_pattern = re.compile(
-            r'(?:https?://)?(?:www\.)?(?:t\.me|telegram\.me)/\S+',
+            r'(?=[htw])(?:https?://)?(?:www\.)?t(?:elegram)?\.me/\S+',
             re.IGNORECASE
         )
         
@@ -63,126 +131,363 @@ class MessageFilter:
         # 微信号
         self.wechat_pattern = re.compile(r'[微V信]{1,2}[:：\s]*[a-zA-Z0-9_-]{6,20}')
 
-    def filter_text(self, text: str, filters: Dict) -> str:
-        """过滤文本内容"""
+    def _build_ad_matcher(self):
+        """构建广告关键词/短语匹配器（关键词或短语变更后需重建）
+
+        关键词在小写文本上匹配；不含大小写字符的短语在小写文本上与原文匹配结果相同，
+        与关键词合并到同一个匹配器一次扫描，其余短语单独在原文上检查。
+        """
+        # 词表版本是判定缓存键的一部分，词表变更后旧的判定不再命中
+        self.ad_version += 1
+        self._ad_keyword_counts = {}
+        for keyword in self.ad_keywords:
+            self._ad_keyword_counts[keyword] = self._ad_keyword_counts.get(keyword, 0) + 1
+
+        self._ad_phrase_counts = {}
+        cased_phrases = []
+        for phrase in self.ad_phrases:
+            if phrase.lower() == phrase == phrase.upper():
+                self._ad_phrase_counts[phrase] = self._ad_phrase_counts.get(phrase, 0) + 1
+            else:
+                cased_phrases.append(phrase)
+
+        self._ad_matcher = KeywordMatcher(list(self._ad_keyword_counts) + list(self._ad_phrase_counts))
+        self._cased_phrase_matcher = KeywordMatcher(cased_phrases)
+
+    def _scan_ad_terms(self, text: str):
+        """一次扫描返回 (广告关键词命中数, 广告短语命中数)"""
+        hits = self._ad_matcher.find(text.lower())
+        keyword_counts = self._ad_keyword_counts
+        phrase_counts = self._ad_phrase_counts
+
+        ad_count = sum(keyword_counts.get(term, 0) for term in hits)
+        phrase_count = sum(phrase_counts.get(term, 0) for term in hits)
+        if len(self._cased_phrase_matcher):
+            phrase_count += self._cased_phrase_matcher.count(text)
+        return ad_count, phrase_count
+
+    def compile_filters(self, filters: Dict, version: Any = None) -> FilterPlan:
+        """把组的 filters 配置编译为过滤计划"""
+        return compile_filter_plan(filters, version)
+
+    def get_plan(self, group_id: int, version: Any, filters: Dict) -> FilterPlan:
+        """获取组的过滤计划，按组ID和配置版本（updated_at）缓存
+
+        updated_at 只精确到秒，同时要求 filters 为同一个（存储层缓存的）字典对象，
+        同一秒内的多次修改也会重新编译。
+        """
+        cached = self._plans.get(group_id)
+        if cached is not None and cached[0] == version and cached[1] is filters:
+            return cached[2]
+
+        plan = self.compile_filters(filters, version)
+        self._plans[group_id] = (version, filters, plan)
+        return plan
+
+    def invalidate_plan(self, group_id: int = None):
+        """使组的过滤计划失效（不指定组时清空全部）"""
+        if group_id is None:
+            self._plans.clear()
+        else:
+            self._plans.pop(group_id, None)
+
+    def filter_text(self, text: str, filters: Union[Dict, FilterPlan]) -> str:
+        """过滤文本内容（filters 可以是配置字典或已编译的过滤计划）"""
+        return self.filter_decision(text, filters)[0]
+
+    def filter_decision(self, text: str, filters: Union[Dict, FilterPlan]) -> Tuple[str, str]:
+        """过滤文本并返回 (结果, 判定)；传入已编译的过滤计划时结果会被缓存"""
         if not text:
-            return ""
+            return "", DECISION_EMPTY
         
+        if not isinstance(filters, FilterPlan) or not self.decision_cache.cacheable(text):
+            return self._apply_plan(text, filters)
+        
+        self._check_cache_generation()
+        result = self.decision_cache.get(filters, text, self.ad_version)
+        if result is None:
+            result = self._apply_plan(text, filters)
+            if result[1] != DECISION_ERROR:
+                self.decision_cache.put(filters, text, result, self.ad_version)
+        return result
+
+    def _check_cache_generation(self):
+        """正则规则被停用或启用后旧结果不再有效"""
+        if self._cache_generation != self.regex_guard.generation:
+            self.decision_cache.clear()
+            self._cache_generation = self.regex_guard.generation
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """获取过滤判定缓存统计"""
+        return self.decision_cache.stats()
+
+    def _apply_plan(self, text: str, filters: Union[Dict, FilterPlan]) -> Tuple[str, str]:
+        """执行过滤计划"""
         try:
-            filtered_text = text
-            
-            # 广告检测
-            if filters.get('ad_detection', False):
-                if self._is_advertisement(filtered_text):
-                    return ""
-            
-            # 智能过滤
-            if filters.get('smart_filter', False):
-                if self._is_spam_content(filtered_text):
-                    return ""
+            plan = filters if isinstance(filters, FilterPlan) else self.compile_filters(filters)
+            if plan.passthrough:
+                return text, DECISION_KEPT
+
+            # 广告检测/智能过滤
+            if plan.ad_detection or plan.smart_filter:
+                decision = self._classify(text, plan)
+                if decision:
+                    return "", decision
             
             # 删除链接
-            if filters.get('remove_links', False):
-                filtered_text = self._remove_links(filtered_text)
-            
-            # 删除表情符号
-            if filters.get('remove_emojis', False):
-                filtered_text = self._remove_emojis(filtered_text)
-            
-            # 删除特殊符号
-            if filters.get('remove_special_chars', False):
-                filtered_text = self._remove_special_chars(filtered_text)
-            
-            # 自定义过滤规则
-            custom_rules = filters.get('custom_rules', [])
-            if custom_rules:
-                filtered_text = self._apply_custom_rules(filtered_text, custom_rules)
-            
-            # 清理多余空行
-            filtered_text = self._clean_whitespace(filtered_text)
+            filtered_text = self._remove_links(text) if plan.remove_links else text
             
-            return filtered_text.strip()
+            filtered_text = self._rewrite(filtered_text, plan)
+            return filtered_text, DECISION_KEPT if filtered_text else DECISION_EMPTY
             
         except Exception as e:
             self.logger.error(f"❌ 过滤文本失败: {e}")
-            return text
+            return text, DECISION_ERROR
 
-    def _is_advertisement(self, text: str) -> bool:
-        """检测是否为广告内容"""
+    def _classify(self, text: str, plan: FilterPlan) -> Optional[str]:
+        """广告检测和智能过滤（共用一次特征提取），命中时返回判定"""
+        if self.spam_model is not None:
+            features = self.extract_features(text)
+        else:
+            # 规则判断下联系方式只在恰好命中1个广告关键词时影响结果，按需再检查
+            features = self.extract_features(text, ad_terms=plan.ad_detection, contacts=False, links=False)
+            if features.ad_keywords == 1:
+                features = features._replace(contacts=self._count_contacts(text))
+        
+        # 广告检测
+        if plan.ad_detection and is_advertisement(features):
+            return DECISION_AD
+        
+        # 智能过滤
+        if plan.smart_filter and self._score_spam(features, plan):
+            return DECISION_SPAM
+        
+        return None
+
+    def _rewrite(self, text: str, plan: FilterPlan) -> str:
+        """删除链接之后的步骤: 表情/特殊符号、自定义规则、清理空白"""
+        # 删除表情符号/特殊符号
+        for strip in plan.strip_steps:
+            text = strip(text)
+        
+        # 自定义过滤规则
+        if plan.custom_steps:
+            text = self._run_custom_steps(text, plan)
+        
+        # 清理多余空行（结果已去除首尾空白）
+        return self._clean_whitespace(text)
+
+    def filter_entities(self, text: str, entities, filters: Union[Dict, FilterPlan],
+                        spans: Optional[List[Span]] = None) -> Tuple[str, str]:
+        """按消息实体过滤，返回 (HTML, 判定)
+
+        链接和提及按实体偏移删除（不再用正则扫描），文字链接只去掉链接保留文字；
+        加粗、斜体等格式实体重新计算偏移后输出为 HTML。后续步骤有替换（不只是删除字符）时
+        无法可靠映射偏移，此时丢弃格式输出纯文本。
+        spans 为已规范化的实体（多个组共用同一条消息时只解析一次），传入时忽略 entities。
+        """
+        if not text:
+            return "", DECISION_EMPTY
+        
         try:
-            text_lower = text.lower()
+            plan = filters if isinstance(filters, FilterPlan) else self.compile_filters(filters)
+            if spans is None:
+                spans = normalize_entities(text, entities)
+            if plan.passthrough:
+                return to_html(text, spans), DECISION_KEPT
+            
+            if plan.ad_detection or plan.smart_filter:
+                decision = self._classify(text, plan)
+                if decision:
+                    return "", decision
+            
+            if plan.remove_links:
+                text, spans = remove_link_spans(text, spans)
+            
+            filtered_text = self._rewrite(text, plan)
+            if not filtered_text:
+                return "", DECISION_EMPTY
+            
+            # 有非空替换的自定义规则时，无法区分替换和删除，不映射格式
+            if spans and not self._deletes_only(plan):
+                spans = []
+            spans = realign_spans(text, filtered_text, spans) or []
+            return to_html(filtered_text, spans), DECISION_KEPT
             
-            # 检查广告关键词
-            ad_count = sum(1 for keyword in self.ad_keywords if keyword in text_lower)
-            
-            # 如果包含2个或以上广告关键词，认为是广告
-            if ad_count >= 2:
-                return True
-            
-            # 检查联系方式
-            contact_patterns = [
-                self.phone_pattern,
-                self.qq_pattern,
-                self.wechat_pattern
-            ]
-            
-            contact_count = sum(1 for pattern in contact_patterns if pattern.search(text))
-            
-            # 包含联系方式且有广告关键词
-            if contact_count > 0 and ad_count > 0:
-                return True
-            
-            # 检查典型广告短语
-            ad_phrases = [
-                '加我微信', '联系客服', '免费咨询', '立即下单',
-                '扫码关注', '点击购买', '限时特价', '包邮到家'
+        except Exception as e:
+            self.logger.error(f"❌ 按实体过滤失败: {e}")
+            return to_html(text, []), DECISION_ERROR
+
+    @staticmethod
+    def _deletes_only(plan: FilterPlan) -> bool:
+        """自定义规则只删除文本（替换为空或删除整行）"""
+        return all(step[0] == STEP_REMOVE_LINES or (step[0] in (STEP_REGEX, STEP_KEYWORD) and not step[2])
+                   for step in plan.custom_steps)
+
+    def filter_batch(self, texts: List[str], filters: Union[Dict, FilterPlan]) -> List[str]:
+        """用同一个过滤计划过滤一批文本"""
+        plan = filters if isinstance(filters, FilterPlan) else self.compile_filters(filters)
+        filter_text = self.filter_text
+        return [filter_text(text, plan) for text in texts]
+
+    async def filter_batch_async(self, texts: List[str], filters: Union[Dict, FilterPlan]) -> List[str]:
+        """批量过滤；批量较大时分块提交到进程池，正则计算不占用 GIL 和事件循环"""
+        if self.pool_workers <= 0 or len(texts) < max(self.pool_min_batch, 1):
+            return self.filter_batch(texts, filters)
+
+        plan = filters if isinstance(filters, FilterPlan) else self.compile_filters(filters)
+        # 词表可能在进程池执行期间更新，结果按提交时的版本缓存
+        ad_version = self.ad_version
+        self._check_cache_generation()
+
+        # 先用缓存命中的结果，未命中的文本去重后交给进程池
+        results: List[Optional[str]] = [None] * len(texts)
+        pending: Dict[str, List[int]] = {}
+        for index, text in enumerate(texts):
+            if not text:
+                results[index] = ""
+                continue
+            if text in pending:
+                pending[text].append(index)
+                continue
+            if self.decision_cache.cacheable(text):
+                cached = self.decision_cache.get(plan, text, ad_version)
+                if cached is not None:
+                    results[index] = cached[0]
+                    continue
+            pending[text] = [index]
+
+        pending_texts = list(pending)
+        if len(pending_texts) < max(self.pool_min_batch, 1):
+            for text in pending_texts:
+                filtered_text = self.filter_text(text, plan)
+                for index in pending[text]:
+                    results[index] = filtered_text
+            return results
+
+        try:
+            if self._pool is None:
+                # spawn 启动: 主进程有 aiosqlite 等后台线程，fork 可能复制到被持有的锁
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.pool_workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+
+            loop = asyncio.get_running_loop()
+            chunk_size = -(-len(pending_texts) // self.pool_workers)
+            guard = (self.regex_guard.timeout_ms, self.regex_guard.max_timeouts, self.regex_guard.disabled_patterns())
+            generation = self.regex_guard.generation
+            futures = [
+                loop.run_in_executor(
+                    self._pool, _filter_chunk,
+                    self.ad_keywords, self.ad_phrases, guard, plan, pending_texts[start:start + chunk_size]
+                )
+                for start in range(0, len(pending_texts), chunk_size)
             ]
-            
-            phrase_count = sum(1 for phrase in ad_phrases if phrase in text)
-            if phrase_count >= 2:
-                return True
-            
+            filtered = []
+            for chunk, regex_stats in await asyncio.gather(*futures):
+                filtered.extend(chunk)
+                self.regex_guard.merge(regex_stats)
+
+            # 执行期间有规则被停用或启用时结果不缓存
+            cache = generation == self.regex_guard.generation
+            for text, result in zip(pending_texts, filtered):
+                for index in pending[text]:
+                    results[index] = result[0]
+                if cache and result[1] != DECISION_ERROR and self.decision_cache.cacheable(text):
+                    self.decision_cache.put(plan, text, result, ad_version)
+            return results
+
+        except Exception as e:
+            self.logger.error(f"❌ 进程池批量过滤失败，改为在当前进程执行: {e}")
+            # 进程池损坏后重建
+            self.shutdown()
+            return self.filter_batch(texts, plan)
+
+    def shutdown(self):
+        """关闭批量过滤进程池"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def extract_features(self, text: str, ad_terms: bool = True, contacts: bool = True,
+                         links: bool = True) -> TextFeatures:
+        """一次提取文本特征；关闭的特征项记为0"""
+        # 英文字母计数在 ASCII 字节上用 translate 完成，不逐字符进入 Python 层
+        ascii_bytes = text.encode('ascii', 'ignore')
+        letters = len(ascii_bytes.translate(None, _NON_LETTER_BYTES))
+        uppercase = len(ascii_bytes.translate(None, _NON_UPPER_BYTES)) if letters else 0
+        
+        punctuation = text.count('!') + text.count('！') + text.count('?') + text.count('？')
+        
+        ad_count, phrase_count = self._scan_ad_terms(text) if ad_terms else (0, 0)
+        contact_count = self._count_contacts(text) if contacts else 0
+        
+        link_count = 0
+        if links:
+            if '://' in text:
+                link_count += len(self.url_pattern.findall(text))
+            if '.me/' in text.lower():
+                link_count += len(self.telegram_link_pattern.findall(text))
+            if '@' in text:
+                link_count += len(self.mention_pattern.findall(text))
+        
+        return TextFeatures(
+            len(text), len(set(text)), punctuation, letters, uppercase,
+            ad_count, phrase_count, contact_count, link_count
+        )
+
+    def _count_contacts(self, text: str) -> int:
+        """命中的联系方式类型数（电话/QQ/微信）"""
+        return sum(1 for pattern in (self.phone_pattern, self.qq_pattern, self.wechat_pattern)
+                   if pattern.search(text))
+
+    def _score_spam(self, features: TextFeatures, plan: FilterPlan) -> bool:
+        """垃圾内容判断: 有模型时按模型概率和组阈值，否则按组的启发式阈值"""
+        try:
+            if self.spam_model is not None:
+                return self.spam_model.is_spam(features, plan.spam_threshold)
+            return (plan.spam_rules or self.default_spam_rules).is_spam(features)
+        except Exception as e:
+            self.logger.error(f"❌ 垃圾内容检测失败: {e}")
             return False
-            
+
+    def _is_advertisement(self, text: str) -> bool:
+        """检测是否为广告内容"""
+        try:
+            return is_advertisement(self.extract_features(text))
         except Exception as e:
             self.logger.error(f"❌ 广告检测失败: {e}")
             return False
 
     def _is_spam_content(self, text: str) -> bool:
-        """检测是否为垃圾内容"""
+        """检测是否为垃圾内容（默认阈值）"""
         try:
-            # 检查重复字符
-            if len(set(text)) / len(text) < 0.3 and len(text) > 10:
-                return True
-            
-            # 检查过多感叹号或问号
-            if text.count('!') + text.count('！') + text.count('?') + text.count('？') > len(text) * 0.2:
-                return True
-            
-            # 检查全大写英文（超过一定比例）
-            english_chars = re.findall(r'[a-zA-Z]', text)
-            if len(english_chars) > 10:
-                upper_ratio = sum(1 for c in english_chars if c.isupper()) / len(english_chars)
-                if upper_ratio > 0.8:
-                    return True
-            
-            return False
-            
+            return self.default_spam_rules.is_spam(
+                self.extract_features(text, ad_terms=False, contacts=False, links=False)
+            )
         except Exception as e:
             self.logger.error(f"❌ 垃圾内容检测失败: {e}")
             return False
 
     def _remove_links(self, text: str) -> str:
-        """删除链接"""
+        """删除链接
+
+        每个正则都有必须出现的字面量（'://'、'.me/'、'@'），先用 C 层子串查找判断，
+        不可能命中时跳过整次正则扫描；判断基于上一步处理后的文本，结果与依次执行三个正则完全一致。
+        """
         try:
             # 删除HTTP链接
-            text = self.url_pattern.sub('', text)
+            if '://' in text:
+                text = self.url_pattern.sub('', text)
             
-            # 删除Telegram链接
-            text = self.telegram_link_pattern.sub('', text)
+            # 删除Telegram链接（该正则没有固定前缀，逐位置尝试，开销最大）
+            if '.me/' in text.lower():
+                text = self.telegram_link_pattern.sub('', text)
             
             # 删除@提及
-            text = self.mention_pattern.sub('', text)
+            if '@' in text:
+                text = self.mention_pattern.sub('', text)
             
             return text
             
@@ -193,7 +498,7 @@ class MessageFilter:
     def _remove_emojis(self, text: str) -> str:
         """删除表情符号（保留#号）"""
         try:
-            return self.emoji_pattern.sub('', text)
+            return strip_emojis(text)
         except Exception as e:
             self.logger.error(f"❌ 删除表情符号失败: {e}")
             return text
@@ -201,33 +506,50 @@ class MessageFilter:
     def _remove_special_chars(self, text: str) -> str:
         """删除特殊符号（保留#号）"""
         try:
-            return self.special_chars_pattern.sub('', text)
+            return strip_special_chars(text)
         except Exception as e:
             self.logger.error(f"❌ 删除特殊符号失败: {e}")
             return text
 
     def _apply_custom_rules(self, text: str, rules: List[Dict]) -> str:
         """应用自定义过滤规则"""
+        plan = FilterPlan(custom_steps=compile_custom_rules(rules))
+        return self._run_custom_steps(text, plan)
+
+    def _run_custom_steps(self, text: str, plan: FilterPlan) -> str:
+        """执行过滤计划中已编译的自定义规则"""
         try:
-            for rule in rules:
-                rule_type = rule.get('type')
-                pattern = rule.get('pattern')
-                replacement = rule.get('replacement', '')
-                
-                if not pattern:
-                    continue
-                
-                if rule_type == 'regex':
-                    # 正则表达式替换
-                    text = re.sub(pattern, replacement, text)
-                elif rule_type == 'keyword':
+            # 一次扫描找出文本中出现的关键词，未命中的 keyword/remove_line 步骤直接跳过；
+            # 文本被任何步骤修改后重新扫描，保证与逐条顺序执行的结果一致
+            matcher = plan.rule_matcher
+            hits = matcher.find(text) if len(matcher) else set()
+
+            for step in plan.custom_steps:
+                kind = step[0]
+                before = text
+
+                if kind == STEP_REGEX:
+                    # 正则表达式替换（已预编译，在耗时预算内执行）
+                    text = self.regex_guard.sub(step[1], step[2], text)
+                elif kind == STEP_KEYWORD:
                     # 关键词替换
-                    text = text.replace(pattern, replacement)
-                elif rule_type == 'remove_line':
-                    # 删除包含关键词的整行
+                    if step[1] not in hits:
+                        continue
+                    text = text.replace(step[1], step[2])
+                elif kind == STEP_REMOVE_LINES:
+                    # 删除包含任一关键词的整行（连续的 remove_line 规则合并为一次遍历）
+                    patterns = [pattern for pattern in step[1] if pattern in hits]
+                    if not patterns:
+                        continue
                     lines = text.split('\n')
-                    lines = [line for line in lines if pattern not in line]
+                    lines = [line for line in lines if not any(pattern in line for pattern in patterns)]
                     text = '\n'.join(lines)
+                else:
+                    self.logger.error(f"❌ 应用自定义规则失败: {step[1]}")
+                    return text
+
+                if text != before and len(matcher):
+                    hits = matcher.find(text)
             
             return text
             
@@ -236,22 +558,15 @@ class MessageFilter:
             return text
 
     def _clean_whitespace(self, text: str) -> str:
-        """清理多余空白字符"""
+        """清理多余空白字符（每行去除首尾空白，连续空行合并为一行，去除首尾空行）"""
         try:
-            # 删除多余空行
-            lines = text.split('\n')
-            cleaned_lines = []
-            
-            for line in lines:
-                line = line.strip()
-                if line or (cleaned_lines and cleaned_lines[-1]):
-                    cleaned_lines.append(line)
+            text = '\n'.join([line.strip() for line in text.split('\n')])
             
-            # 删除末尾空行
-            while cleaned_lines and not cleaned_lines[-1]:
-                cleaned_lines.pop()
+            # 删除多余空行
+            while '\n\n\n' in text:
+                text = text.replace('\n\n\n', '\n\n')
             
-            return '\n'.join(cleaned_lines)
+            return text.strip()
             
         except Exception as e:
             self.logger.error(f"❌ 清理空白字符失败: {e}")
@@ -293,7 +608,7 @@ class MessageFilter:
                 'qq_numbers': len(self.qq_pattern.findall(text)),
                 'wechat_ids': len(self.wechat_pattern.findall(text)),
                 'emojis': len(self.emoji_pattern.findall(text)),
-                'ad_keywords': sum(1 for keyword in self.ad_keywords if keyword in text.lower())
+                'ad_keywords': self._scan_ad_terms(text)[0]
             }
             
             return stats
@@ -308,6 +623,7 @@ class MessageFilter:
             self.ad_keywords.extend(keywords)
             # 去重
             self.ad_keywords = list(set(self.ad_keywords))
+            self._build_ad_matcher()
             self.logger.info(f"📝 广告关键词已更新，当前数量: {len(self.ad_keywords)}")
             
         except Exception as e:
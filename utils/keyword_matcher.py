@@ -0,0 +1,107 @@
+"""
+多关键词匹配 - Aho-Corasick 自动机，一次扫描找出文本中出现的所有关键词
+"""
+
+from collections import Counter
+from typing import Dict, Iterable, List, Set, Tuple
+
+
+# 关键词数量低于该值时逐个 `in` 检查更快（C层子串搜索 vs Python层逐字符状态转移）
+# 实测: 50~2000字中文文本下交叉点约在 60~100 个关键词之间
+LINEAR_SCAN_THRESHOLD = 80
+
+
+class KeywordAutomaton:
+    """Aho-Corasick 自动机"""
+
+    __slots__ = ('_goto', '_fail', '_output')
+
+    def __init__(self, patterns: Iterable[str]):
+        goto: List[Dict[str, int]] = [{}]
+        output: List[Tuple[str, ...]] = [()]
+
+        for pattern in patterns:
+            if not pattern:
+                continue
+            node = 0
+            for char in pattern:
+                next_node = goto[node].get(char)
+                if next_node is None:
+                    next_node = len(goto)
+                    goto[node][char] = next_node
+                    goto.append({})
+                    output.append(())
+                node = next_node
+            if pattern not in output[node]:
+                output[node] = output[node] + (pattern,)
+
+        # 广度优先构建失败指针，并合并后缀节点的输出
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+        for node in queue:
+            for char, child in goto[node].items():
+                queue.append(child)
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                target = goto[state].get(char, 0)
+                fail[child] = target if target != child else 0
+                if output[fail[child]]:
+                    output[child] = output[child] + output[fail[child]]
+
+        self._goto = goto
+        self._fail = fail
+        self._output = output
+
+    def find(self, text: str) -> Set[str]:
+        """返回文本中出现过的关键词集合"""
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        found = set()
+        node = 0
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if output[node]:
+                found.update(output[node])
+        return found
+
+
+class KeywordMatcher:
+    """关键词集合匹配器
+
+    关键词较少时使用逐个子串检查，超过阈值时使用 Aho-Corasick 自动机；
+    两种方式的结果完全一致。空字符串关键词视为总是出现（与 `'' in text` 一致）。
+    """
+
+    def __init__(self, patterns: Iterable[str], threshold: int = None):
+        if threshold is None:
+            threshold = LINEAR_SCAN_THRESHOLD
+        self.patterns: Tuple[str, ...] = tuple(patterns)
+        self.multiplicity = Counter(self.patterns)
+        self._unique = tuple(self.multiplicity)
+        self._always = {pattern for pattern in self._unique if not pattern}
+        self._automaton = KeywordAutomaton(self._unique) if len(self._unique) >= threshold else None
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+    @property
+    def uses_automaton(self) -> bool:
+        return self._automaton is not None
+
+    def find(self, text: str) -> Set[str]:
+        """返回出现过的（去重）关键词"""
+        if self._automaton is not None:
+            found = self._automaton.find(text)
+            if self._always:
+                found |= self._always
+            return found
+        return {pattern for pattern in self._unique if pattern in text}
+
+    def count(self, text: str) -> int:
+        """出现过的关键词数量（列表中重复的关键词按重复次数计）"""
+        multiplicity = self.multiplicity
+        return sum(multiplicity[pattern] for pattern in self.find(text))
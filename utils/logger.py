@@ -11,7 +11,7 @@ import colorama
 from colorama import Fore, Style
 
 
-def setup_logging(level: str = "INFO", log_file: Optional[str] = None):
+def setup_logging(level: str = "INFO", log_file: Optional[str] = None, slow_query_file: Optional[str] = None):
     """设置日志系统"""
     
     # 初始化颜色支持
@@ -62,6 +62,22 @@ def setup_logging(level: str = "INFO", log_file: Optional[str] = None):
         file_handler.setFormatter(detailed_formatter)
         root_logger.addHandler(file_handler)
     
+    # 慢查询日志单独写入文件（同时仍传播到根日志器）
+    slow_query_logger = logging.getLogger('slow_query')
+    for handler in slow_query_logger.handlers[:]:
+        slow_query_logger.removeHandler(handler)
+    if slow_query_file:
+        Path(slow_query_file).parent.mkdir(exist_ok=True)
+        slow_handler = logging.handlers.RotatingFileHandler(
+            slow_query_file,
+            maxBytes=5*1024*1024,  # 5MB
+            backupCount=3,
+            encoding='utf-8'
+        )
+        slow_handler.setLevel(logging.WARNING)
+        slow_handler.setFormatter(detailed_formatter)
+        slow_query_logger.addHandler(slow_handler)
+    
     # 设置第三方库日志级别
     logging.getLogger('telegram').setLevel(logging.WARNING)
     logging.getLogger('httpx').setLevel(logging.WARNING)
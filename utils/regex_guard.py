@@ -0,0 +1,276 @@
+"""
+正则安全防护 - 自定义正则规则的静态检查、执行耗时预算、超时自动停用
+"""
+
+import logging
+import re
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+try:
+    import regex
+except ImportError:  # 缺失regex时回退到标准库re，只能在执行后按耗时计入超时
+    regex = None
+
+
+logger = logging.getLogger(__name__)
+
+# 自定义正则的最大长度
+MAX_PATTERN_LENGTH = 500
+
+_REPEAT_OPS = {sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT}
+if hasattr(sre_parse, 'POSSESSIVE_REPEAT'):
+    _REPEAT_OPS.add(sre_parse.POSSESSIVE_REPEAT)
+
+
+def _first_chars(parsed) -> Optional[set]:
+    """分支可能的首字符集合（无法确定时返回None）"""
+    for op, av in parsed:
+        if op == sre_parse.LITERAL:
+            return {av}
+        if op == sre_parse.SUBPATTERN:
+            return _first_chars(av[-1])
+        if op == sre_parse.IN:
+            chars = set()
+            for item_op, item_av in av:
+                if item_op == sre_parse.LITERAL:
+                    chars.add(item_av)
+                elif item_op == sre_parse.RANGE and item_av[1] - item_av[0] < 256:
+                    chars.update(range(item_av[0], item_av[1] + 1))
+                else:
+                    return None
+            return chars
+        return None
+    return None
+
+
+def _branches_overlap(branches) -> bool:
+    """任意两个分支可能以相同字符开头"""
+    seen = set()
+    for branch in branches:
+        chars = _first_chars(branch)
+        if chars is None or chars & seen:
+            return True
+        seen |= chars
+    return False
+
+
+def _has_unbounded(parsed) -> bool:
+    """是否包含无上限的量词（*、+、{m,}）"""
+    for op, av in parsed:
+        if op in _REPEAT_OPS:
+            if av[1] == sre_parse.MAXREPEAT or _has_unbounded(av[2]):
+                return True
+        elif op == sre_parse.SUBPATTERN:
+            if _has_unbounded(av[-1]):
+                return True
+        elif op == sre_parse.BRANCH:
+            if any(_has_unbounded(branch) for branch in av[1]):
+                return True
+        elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            if _has_unbounded(av[1]):
+                return True
+        elif op == sre_parse.GROUPREF_EXISTS:
+            if any(branch and _has_unbounded(branch) for branch in av[1:]):
+                return True
+        elif op == getattr(sre_parse, 'ATOMIC_GROUP', None):
+            if _has_unbounded(av):
+                return True
+    return False
+
+
+def _has_nested_quantifier(parsed, inside_unbounded: bool = False) -> bool:
+    """检查可重复多次的量词（*、+、{m,n}）内部是否含有无上限量词（如 (a+)+、(.*a){12}），
+    或无上限量词内部有开头可能相同的分支（如 (a|aa)*）；(\\d{1,3}\\.)+ 这类内部有界的允许"""
+    for op, av in parsed:
+        if op in _REPEAT_OPS:
+            low, high, item = av
+            if high > 1 and _has_unbounded(item):
+                return True
+            if _has_nested_quantifier(item, inside_unbounded or high == sre_parse.MAXREPEAT):
+                return True
+        elif op == sre_parse.SUBPATTERN:
+            if _has_nested_quantifier(av[-1], inside_unbounded):
+                return True
+        elif op == sre_parse.BRANCH:
+            if inside_unbounded and _branches_overlap(av[1]):
+                return True
+            if any(_has_nested_quantifier(branch, inside_unbounded) for branch in av[1]):
+                return True
+        elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            if _has_nested_quantifier(av[1], inside_unbounded):
+                return True
+        elif op == sre_parse.GROUPREF_EXISTS:
+            if any(branch and _has_nested_quantifier(branch, inside_unbounded) for branch in av[1:]):
+                return True
+        elif op == getattr(sre_parse, 'ATOMIC_GROUP', None):
+            if _has_nested_quantifier(av, inside_unbounded):
+                return True
+    return False
+
+
+def check_regex(pattern: str) -> Optional[str]:
+    """静态检查自定义正则，安全时返回None，否则返回原因"""
+    if not isinstance(pattern, str):
+        return '正则必须是字符串'
+    if len(pattern) > MAX_PATTERN_LENGTH:
+        return f'正则过长（最多{MAX_PATTERN_LENGTH}个字符）'
+
+    try:
+        parsed = sre_parse.parse(pattern)
+    except Exception as e:
+        return f'正则语法错误: {e}'
+
+    if _has_nested_quantifier(parsed):
+        return '包含嵌套量词或开头重叠的重复分支（如 (a+)+、(.*a){12}、(a|aa)*），可能导致灾难性回溯'
+
+    return None
+
+
+def compile_regex(pattern: str):
+    """编译正则；安装了 regex 时使用 regex 编译（支持执行超时），不兼容时回退到 re"""
+    if regex is not None:
+        try:
+            return regex.compile(pattern, regex.VERSION0)
+        except Exception:
+            pass
+    return re.compile(pattern)
+
+
+class RuleStats:
+    """单条正则规则的执行统计"""
+
+    __slots__ = ('calls', 'total_ms', 'max_ms', 'timeouts', 'disabled')
+
+    def __init__(self):
+        self.calls = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.timeouts = 0
+        self.disabled = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'calls': self.calls,
+            'avg_ms': round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+            'max_ms': round(self.max_ms, 3),
+            'total_ms': round(self.total_ms, 3),
+            'timeouts': self.timeouts,
+            'disabled': self.disabled
+        }
+
+
+class RegexGuard:
+    """自定义正则执行防护
+
+    安装了 regex 时超出预算的执行会被中断，该规则对本条消息不生效；
+    仅有标准库 re 时无法中断，执行完成后按耗时计入超时。
+    累计超时达到 max_timeouts 次的规则自动停用，直到规则被修改或通过 /enable_regex 重新启用。
+    进程池工作进程的执行统计由主进程合并（export_stats / merge），停用由主进程决定。
+    """
+
+    def __init__(self, timeout_ms: float = 50, max_timeouts: int = 3):
+        self.timeout_ms = timeout_ms
+        self.max_timeouts = max_timeouts
+        self.preemptive = regex is not None
+        if not self.preemptive:
+            logger.warning("⚠️ 未安装 regex，自定义正则超时无法中断，请执行 pip install regex")
+        self._stats: Dict[str, RuleStats] = {}
+        # 停用/启用规则时递增，依赖过滤结果的缓存据此失效
+        self.generation = 0
+
+    def sub(self, compiled, replacement: str, text: str) -> str:
+        """在耗时预算内执行一次正则替换"""
+        stats = self._stats.get(compiled.pattern)
+        if stats is None:
+            stats = self._stats[compiled.pattern] = RuleStats()
+        if stats.disabled:
+            return text
+
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            if self.preemptive and self.timeout_ms > 0 and isinstance(compiled, regex.Pattern):
+                result = compiled.sub(replacement, text, timeout=self.timeout_ms / 1000)
+            else:
+                result = compiled.sub(replacement, text)
+        except TimeoutError:
+            result = text
+            timed_out = True
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        stats.calls += 1
+        stats.total_ms += elapsed_ms
+        if elapsed_ms > stats.max_ms:
+            stats.max_ms = elapsed_ms
+
+        if timed_out or (self.timeout_ms > 0 and elapsed_ms > self.timeout_ms):
+            stats.timeouts += 1
+            logger.warning(f"⚠️ 自定义正则超时 ({elapsed_ms:.1f}ms): {compiled.pattern}")
+            self._check_disable(compiled.pattern, stats)
+
+        return result
+
+    def _check_disable(self, pattern: str, stats: RuleStats):
+        if not stats.disabled and stats.timeouts >= self.max_timeouts:
+            stats.disabled = True
+            self.generation += 1
+            logger.error(f"❌ 自定义正则连续超时 {stats.timeouts} 次，已停用: {pattern}")
+
+    def is_disabled(self, pattern: str) -> bool:
+        stats = self._stats.get(pattern)
+        return stats is not None and stats.disabled
+
+    def disabled_patterns(self) -> List[str]:
+        return [pattern for pattern, stats in self._stats.items() if stats.disabled]
+
+    def reset(self, disabled: Sequence[str] = ()):
+        """清空统计，只保留主进程已停用的规则（进程池工作进程在每个任务开始时调用）"""
+        if set(disabled) != set(self.disabled_patterns()):
+            self.generation += 1
+        self._stats.clear()
+        for pattern in disabled:
+            stats = self._stats[pattern] = RuleStats()
+            stats.disabled = True
+
+    def export_stats(self) -> Dict[str, Tuple[int, float, float, int]]:
+        """本进程执行过的规则统计 (calls, total_ms, max_ms, timeouts)，交给主进程合并"""
+        return {
+            pattern: (stats.calls, stats.total_ms, stats.max_ms, stats.timeouts)
+            for pattern, stats in self._stats.items() if stats.calls
+        }
+
+    def merge(self, exported: Dict[str, Tuple[int, float, float, int]]):
+        """合并进程池工作进程的执行统计，累计超时达到上限的规则在主进程停用"""
+        for pattern, (calls, total_ms, max_ms, timeouts) in exported.items():
+            stats = self._stats.get(pattern)
+            if stats is None:
+                stats = self._stats[pattern] = RuleStats()
+            stats.calls += calls
+            stats.total_ms += total_ms
+            if max_ms > stats.max_ms:
+                stats.max_ms = max_ms
+            if timeouts:
+                stats.timeouts += timeouts
+                logger.warning(f"⚠️ 自定义正则在进程池中超时 {timeouts} 次: {pattern}")
+                self._check_disable(pattern, stats)
+
+    def enable(self, pattern: str = None):
+        """重新启用规则（不指定时重置全部统计）"""
+        self.generation += 1
+        if pattern is None:
+            self._stats.clear()
+        else:
+            self._stats.pop(pattern, None)
+
+    def get_stats(self, top: int = None) -> List[Dict[str, Any]]:
+        """按总耗时排序的规则统计"""
+        items = sorted(self._stats.items(), key=lambda item: item[1].total_ms, reverse=True)
+        if top:
+            items = items[:top]
+        return [{'pattern': pattern, **stats.to_dict()} for pattern, stats in items]
@@ -0,0 +1,270 @@
+"""
+调度时间窗 - 解析搬运组的调度时间窗（每组独立时区、每天多个时间段），
+并维护全部组"当前是否在时间窗内"的共享位图，只在最近的时间窗边界到达后重新计算
+"""
+
+import json
+import logging
+import math
+import re
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone, time as dt_time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # Python 3.8: 使用 APScheduler 依赖的 pytz
+    ZoneInfo = None
+
+logger = logging.getLogger(__name__)
+
+DAY_SECONDS = 86400
+
+# UTC+8 / UTC-03:30 / +08:00 形式的固定偏移时区
+_OFFSET_PATTERN = re.compile(r'^(?:UTC|GMT)?\s*([+-])(\d{1,2})(?::?(\d{2}))?$', re.IGNORECASE)
+
+# 时区名 -> 时区对象（None 表示无法识别）
+_timezone_cache: Dict[str, Any] = {}
+
+
+def get_timezone(name: str):
+    """按 IANA 名称（如 Asia/Shanghai）或固定偏移（如 UTC+8）获取时区，无法识别时返回 None"""
+    if name in _timezone_cache:
+        return _timezone_cache[name]
+
+    tz = None
+    match = _OFFSET_PATTERN.match(name.strip())
+    if name.strip().upper() in ('UTC', 'GMT'):
+        tz = dt_timezone.utc
+    elif match:
+        sign, hours, minutes = match.groups()
+        offset = timedelta(hours=int(hours), minutes=int(minutes or 0))
+        if offset < timedelta(hours=24):
+            tz = dt_timezone(-offset if sign == '-' else offset)
+    else:
+        try:
+            if ZoneInfo is not None:
+                tz = ZoneInfo(name.strip())
+            else:
+                import pytz
+                tz = pytz.timezone(name.strip())
+        except Exception:
+            tz = None
+
+    _timezone_cache[name] = tz
+    return tz
+
+
+def _local_timestamp(naive: datetime, tz) -> float:
+    """本地墙上时间 -> 时间戳（pytz 时区需要 localize）"""
+    localize = getattr(tz, 'localize', None)
+    if localize is not None:
+        return localize(naive).timestamp()
+    return naive.replace(tzinfo=tz).timestamp()
+
+
+def parse_clock(value: str) -> int:
+    """HH:MM[:SS] -> 一天内的秒数"""
+    parsed = dt_time.fromisoformat(value.strip())
+    return parsed.hour * 3600 + parsed.minute * 60 + parsed.second
+
+
+def parse_window_list(value) -> List[Tuple[str, str]]:
+    """解析时间窗列表: JSON 字符串、[["09:00","12:00"], ...] 或 ["09:00-12:00", ...]"""
+    if isinstance(value, str):
+        value = value.strip()
+        if not value:
+            return []
+        if value.startswith('['):
+            value = json.loads(value)
+        else:
+            value = [part for part in re.split(r'[,\s]+', value) if part]
+
+    windows = []
+    for item in value or ():
+        if isinstance(item, str):
+            start, end = item.split('-', 1)
+        else:
+            start, end = item
+        parse_clock(start)
+        parse_clock(end)
+        windows.append((start.strip(), end.strip()))
+    return windows
+
+
+def normalize_windows(windows: Sequence[Tuple[str, str]]) -> Tuple[Tuple[int, int], ...]:
+    """时间窗 -> 合并后的 [开始秒, 结束秒) 区间；跨天的时间窗拆成两段，开始等于结束的时间窗为空"""
+    spans = []
+    for start_text, end_text in windows:
+        start, end = parse_clock(start_text), parse_clock(end_text)
+        if start < end:
+            spans.append((start, end))
+        elif start > end:
+            spans.append((start, DAY_SECONDS))
+            if end > 0:
+                spans.append((0, end))
+
+    spans.sort()
+    merged: List[List[int]] = []
+    for start, end in spans:
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return tuple((start, end) for start, end in merged)
+
+
+class GroupSchedule:
+    """单个组解析后的调度"""
+
+    __slots__ = ('windows', 'spans', 'tz', 'timezone_name', 'boundaries')
+
+    def __init__(self, windows: Sequence[Tuple[str, str]], tz, timezone_name: str):
+        self.windows = tuple(windows)           # 原始时间窗 (HH:MM, HH:MM)
+        self.spans = normalize_windows(windows)  # 本地时间一天内的 [开始秒, 结束秒)
+        self.tz = tz
+        self.timezone_name = timezone_name
+        # 一天内状态可能变化的时刻（不含全天时间窗的 0/86400）
+        self.boundaries = tuple(sorted({
+            point for span in self.spans for point in span if 0 < point < DAY_SECONDS
+        }))
+
+    def state_at(self, now: float) -> Tuple[bool, float]:
+        """返回 (now 时是否在时间窗内, 下一次状态可能变化的时间戳)"""
+        local = datetime.fromtimestamp(now, self.tz)
+        second = local.hour * 3600 + local.minute * 60 + local.second + local.microsecond / 1e6
+        is_open = any(start <= second < end for start, end in self.spans)
+
+        if not self.boundaries:
+            return is_open, math.inf
+
+        midnight = local.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+        for day in (0, 1):
+            for point in self.boundaries:
+                if day == 0 and point <= second:
+                    continue
+                moment = _local_timestamp(midnight + timedelta(days=day, seconds=point), self.tz)
+                if moment > now:
+                    return is_open, moment
+        # 夏令时切换等导致找不到时，一分钟后再算
+        return is_open, now + 60
+
+    def describe(self) -> List[str]:
+        return [f'{start}-{end}' for start, end in self.windows]
+
+
+def parse_schedule(config, default_timezone: str) -> Optional[GroupSchedule]:
+    """从组配置解析调度，未设置调度返回 None；配置无效时记录警告并按未设置处理（全天运行）"""
+    try:
+        raw_windows = config.get('schedule_windows')
+        if raw_windows:
+            windows = parse_window_list(raw_windows)
+        elif config.get('schedule_start') and config.get('schedule_end'):
+            windows = parse_window_list([(config['schedule_start'], config['schedule_end'])])
+        else:
+            return None
+        if not windows:
+            return None
+
+        timezone_name = config.get('schedule_timezone') or default_timezone
+        tz = get_timezone(timezone_name)
+        if tz is None:
+            logger.warning(f"⚠️ 组{config.get('id')} 时区无效: {timezone_name}，使用 {default_timezone}")
+            timezone_name = default_timezone
+            tz = get_timezone(default_timezone) or dt_timezone.utc
+
+        return GroupSchedule(windows, tz, timezone_name)
+
+    except Exception as e:
+        logger.warning(f"⚠️ 组{config.get('id')} 调度配置无效，按全天运行: {e}")
+        return None
+
+
+class ScheduleTable:
+    """全部组的时间窗状态位图
+
+    is_open 为 O(1) 查表；所有组中最近的时间窗边界到达后才重新计算一次。
+    未设置调度的组（以及未知的组）视为在时间窗内。
+    """
+
+    def __init__(self, default_timezone: str = 'Asia/Shanghai', clock=time.time):
+        self.default_timezone = default_timezone
+        self._clock = clock
+        self._schedules: Dict[int, GroupSchedule] = {}
+        # group_id -> 1 在时间窗内/未设置调度，0 不在时间窗内
+        self._open = bytearray()
+        self._next_change = math.inf
+
+    @property
+    def next_change(self) -> float:
+        """最近的时间窗边界（时间戳），没有调度时为 inf"""
+        return self._next_change
+
+    def __len__(self) -> int:
+        return len(self._schedules)
+
+    def get(self, group_id: int) -> Optional[GroupSchedule]:
+        return self._schedules.get(group_id)
+
+    def items(self):
+        return self._schedules.items()
+
+    def _set_flag(self, group_id: int, is_open: bool):
+        flags = self._open
+        if group_id >= len(flags):
+            if is_open:
+                return
+            flags.extend(b'\x01' * (group_id + 1 - len(flags)))
+        flags[group_id] = 1 if is_open else 0
+
+    def set_group(self, group_id: int, config, now: float = None) -> Optional[GroupSchedule]:
+        """按组配置更新该组的调度和当前状态，返回解析后的调度（未设置为 None）"""
+        schedule = parse_schedule(config, self.default_timezone)
+        if schedule is None:
+            self.remove_group(group_id)
+            return None
+
+        self._schedules[group_id] = schedule
+        is_open, next_change = schedule.state_at(self._clock() if now is None else now)
+        self._set_flag(group_id, is_open)
+        if next_change < self._next_change:
+            self._next_change = next_change
+        return schedule
+
+    def remove_group(self, group_id: int):
+        self._schedules.pop(group_id, None)
+        self._set_flag(group_id, True)
+
+    def clear(self):
+        self._schedules.clear()
+        self._open = bytearray()
+        self._next_change = math.inf
+
+    def refresh(self, now: float = None) -> List[Tuple[int, bool]]:
+        """边界已到达时重新计算全部组，返回状态发生变化的 (group_id, 是否在时间窗内)"""
+        now = self._clock() if now is None else now
+        if now < self._next_change:
+            return []
+
+        changed = []
+        next_change = math.inf
+        flags = self._open
+        for group_id, schedule in self._schedules.items():
+            is_open, group_next = schedule.state_at(now)
+            was_open = group_id >= len(flags) or flags[group_id] != 0
+            if is_open != was_open:
+                self._set_flag(group_id, is_open)
+                changed.append((group_id, is_open))
+            if group_next < next_change:
+                next_change = group_next
+        self._next_change = next_change
+        return changed
+
+    def is_open(self, group_id: int, now: float = None) -> bool:
+        """组当前是否在时间窗内"""
+        if now is None:
+            now = self._clock()
+        if now >= self._next_change:
+            self.refresh(now)
+        flags = self._open
+        return group_id >= len(flags) or flags[group_id] != 0
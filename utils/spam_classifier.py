@@ -0,0 +1,233 @@
+"""
+垃圾/广告内容评分 - 一次特征提取得到紧凑特征向量，由启发式规则或离线训练的线性模型打分
+
+训练: python -m utils.spam_classifier labelled.jsonl -o data/spam_model.json
+      labelled.jsonl 每行 {"text": "...", "label": 1}（1为垃圾/广告，0为正常）
+"""
+
+import argparse
+import json
+import logging
+import math
+import random
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+class TextFeatures(NamedTuple):
+    """一次扫描得到的文本特征（均为计数，比例在使用时计算，保证与原判断条件逐位一致）"""
+    length: int         # 字符数
+    unique_chars: int   # 不同字符数
+    punctuation: int    # ! ！ ? ？ 数量
+    letters: int        # 英文字母数
+    uppercase: int      # 大写英文字母数
+    ad_keywords: int    # 广告关键词命中数
+    ad_phrases: int     # 广告短语命中数
+    contacts: int       # 命中的联系方式类型数（电话/QQ/微信）
+    links: int          # 链接和@提及数量
+
+
+# 线性模型使用的特征
+MODEL_FEATURES = (
+    'log_length', 'diversity', 'punctuation_ratio', 'letter_ratio', 'uppercase_ratio',
+    'ad_keywords', 'ad_phrases', 'contacts', 'links'
+)
+
+
+def feature_vector(features: TextFeatures) -> List[float]:
+    """把计数特征转换为模型输入"""
+    length = features.length or 1
+    letters = features.letters or 1
+    return [
+        math.log1p(features.length),
+        features.unique_chars / length,
+        features.punctuation / length,
+        features.letters / length,
+        features.uppercase / letters,
+        float(features.ad_keywords),
+        float(features.ad_phrases),
+        float(features.contacts),
+        float(features.links),
+    ]
+
+
+class SpamRules:
+    """启发式垃圾内容判断（默认阈值即原 _is_spam_content 的条件），可按组覆盖阈值"""
+
+    __slots__ = ('diversity', 'punctuation', 'uppercase', 'min_length', 'min_letters')
+
+    DEFAULTS = {
+        'diversity': 0.3,     # 不同字符占比低于该值视为重复字符刷屏
+        'punctuation': 0.2,   # 感叹号/问号占比超过该值
+        'uppercase': 0.8,     # 英文大写占比超过该值
+        'min_length': 10,     # 字符数超过该值才检查重复字符
+        'min_letters': 10,    # 英文字母数超过该值才检查大写占比
+    }
+
+    def __init__(self, overrides: Optional[Dict[str, Any]] = None):
+        values = dict(self.DEFAULTS)
+        if isinstance(overrides, dict):
+            for key, value in overrides.items():
+                if key in values and isinstance(value, (int, float)):
+                    values[key] = value
+        for key, value in values.items():
+            setattr(self, key, value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: getattr(self, key) for key in self.__slots__}
+
+    def is_spam(self, features: TextFeatures) -> bool:
+        length = features.length
+        if length and features.unique_chars / length < self.diversity and length > self.min_length:
+            return True
+
+        if features.punctuation > length * self.punctuation:
+            return True
+
+        if features.letters > self.min_letters:
+            if features.uppercase / features.letters > self.uppercase:
+                return True
+
+        return False
+
+
+def is_advertisement(features: TextFeatures) -> bool:
+    """广告判断: 2个以上广告关键词、联系方式加广告关键词、或2个以上广告短语"""
+    if features.ad_keywords >= 2:
+        return True
+    if features.contacts > 0 and features.ad_keywords > 0:
+        return True
+    return features.ad_phrases >= 2
+
+
+class LinearSpamModel:
+    """逻辑回归模型（特征先按训练集均值/标准差标准化）"""
+
+    def __init__(self, weights: List[float], bias: float, mean: List[float], scale: List[float],
+                 threshold: float = 0.5):
+        self.weights = weights
+        self.bias = bias
+        self.mean = mean
+        self.scale = scale
+        self.threshold = threshold
+
+    def score(self, features: TextFeatures) -> float:
+        """垃圾内容概率"""
+        z = self.bias
+        for value, weight, mean, scale in zip(feature_vector(features), self.weights, self.mean, self.scale):
+            z += weight * (value - mean) / scale
+        if z < -30:
+            return 0.0
+        return 1.0 / (1.0 + math.exp(-z))
+
+    def is_spam(self, features: TextFeatures, threshold: float = None) -> bool:
+        return self.score(features) >= (self.threshold if threshold is None else threshold)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'features': list(MODEL_FEATURES),
+            'weights': self.weights,
+            'bias': self.bias,
+            'mean': self.mean,
+            'scale': self.scale,
+            'threshold': self.threshold
+        }
+
+    def save(self, path: str):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.to_dict(), indent=2), encoding='utf-8')
+
+    @classmethod
+    def load(cls, path: str) -> 'LinearSpamModel':
+        data = json.loads(Path(path).read_text(encoding='utf-8'))
+        if data.get('features') != list(MODEL_FEATURES):
+            raise ValueError('模型特征与当前版本不一致，请重新训练')
+        return cls(data['weights'], data['bias'], data['mean'], data['scale'], data.get('threshold', 0.5))
+
+
+def load_model(path: str) -> Optional[LinearSpamModel]:
+    """加载模型，未配置或加载失败时返回None（使用启发式规则）"""
+    if not path:
+        return None
+    try:
+        model = LinearSpamModel.load(path)
+        logger.info(f"📊 已加载垃圾内容模型: {path}")
+        return model
+    except Exception as e:
+        logger.error(f"❌ 加载垃圾内容模型失败，使用启发式规则: {e}")
+        return None
+
+
+def train_linear_model(samples: Iterable[Tuple[TextFeatures, int]], epochs: int = 300,
+                       learning_rate: float = 0.5, l2: float = 1e-3, threshold: float = 0.5) -> LinearSpamModel:
+    """批量梯度下降训练逻辑回归"""
+    rows = [(feature_vector(features), 1.0 if label else 0.0) for features, label in samples]
+    if not rows:
+        raise ValueError('没有训练样本')
+
+    size = len(MODEL_FEATURES)
+    count = len(rows)
+    mean = [sum(row[0][i] for row in rows) / count for i in range(size)]
+    scale = [
+        math.sqrt(sum((row[0][i] - mean[i]) ** 2 for row in rows) / count) or 1.0
+        for i in range(size)
+    ]
+    data = [([(x[i] - mean[i]) / scale[i] for i in range(size)], y) for x, y in rows]
+
+    weights = [0.0] * size
+    bias = 0.0
+    for _ in range(epochs):
+        gradient = [0.0] * size
+        gradient_bias = 0.0
+        for x, y in data:
+            z = bias + sum(w * v for w, v in zip(weights, x))
+            p = 1.0 / (1.0 + math.exp(-max(min(z, 30.0), -30.0)))
+            error = p - y
+            for i in range(size):
+                gradient[i] += error * x[i]
+            gradient_bias += error
+        for i in range(size):
+            weights[i] -= learning_rate * (gradient[i] / count + l2 * weights[i])
+        bias -= learning_rate * gradient_bias / count
+
+    return LinearSpamModel(weights, bias, mean, scale, threshold)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='训练垃圾内容线性模型')
+    parser.add_argument('input', help='标注数据 JSONL，每行 {"text": ..., "label": 0/1}')
+    parser.add_argument('-o', '--output', default='data/spam_model.json')
+    parser.add_argument('--epochs', type=int, default=300)
+    parser.add_argument('--threshold', type=float, default=0.5)
+    parser.add_argument('--holdout', type=float, default=0.2, help='留出验证集比例')
+    args = parser.parse_args()
+
+    from utils.filters import MessageFilter
+    message_filter = MessageFilter(None)
+
+    samples = []
+    with open(args.input, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                samples.append((message_filter.extract_features(item['text']), int(item['label'])))
+
+    random.Random(0).shuffle(samples)
+    split = int(len(samples) * (1 - args.holdout))
+    train, holdout = samples[:split], samples[split:]
+
+    model = train_linear_model(train, epochs=args.epochs, threshold=args.threshold)
+    model.save(args.output)
+
+    if holdout:
+        correct = sum(1 for features, label in holdout if model.is_spam(features) == bool(label))
+        print(f"holdout accuracy: {correct / len(holdout):.3f} ({len(holdout)} samples)")
+    print(f"model saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
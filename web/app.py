@@ -252,6 +252,18 @@ class WebApp:
             except Exception as e:
                 return jsonify({'error': str(e)}), 500
 
+        @self.app.route('/api/dbstats')
+        def api_dbstats():
+            """获取数据库查询统计"""
+            if not self._is_authenticated():
+                return jsonify({'error': 'Unauthorized'}), 401
+            
+            try:
+                top = request.args.get('top', 20, type=int)
+                return jsonify(self.database.get_query_stats(top=top))
+            except Exception as e:
+                return jsonify({'error': str(e)}), 500
+
         @self.app.route('/api/accounts')
         def api_accounts():
             """获取账号列表"""